@@ -0,0 +1,56 @@
+from fastapi import APIRouter
+
+from ..database import estatisticas_pool
+from ..services import analise_service, cache_service, composicao_service, limitador_llm
+
+router = APIRouter(
+    prefix="/monitoramento",
+    tags=["Monitoramento"]
+)
+
+@router.get("/cache-analise")
+async def estatisticas_cache_analise():
+    """
+    Contadores do cache de análises de imagem (acertos em memória, no banco,
+    perceptuais e erros), usados para dimensionar o LRU.
+    """
+    return cache_service.estatisticas()
+
+@router.get("/preprocessamento")
+async def estatisticas_preprocessamento():
+    """
+    Total de imagens reduzidas antes da LLM e bytes economizados no envio.
+    """
+    return analise_service.estatisticas_preprocessamento()
+
+@router.get("/respostas-llm")
+async def estatisticas_respostas_llm():
+    """
+    Qualidade das respostas da IA na análise de imagem: válidas de primeira,
+    consertadas localmente, corrigidas com uma segunda chamada e descartadas.
+    """
+    return analise_service.estatisticas_respostas_llm()
+
+@router.get("/composicao")
+async def estatisticas_composicao():
+    """
+    Itens de refeição calculados pela tabela de composição (TACO): encontrados,
+    sem referência (ficam com os valores da IA) e estimativas da IA divergentes.
+    """
+    return composicao_service.estatisticas()
+
+@router.get("/limitador-llm")
+async def estatisticas_limitador_llm():
+    """
+    Fila de admissão das chamadas ao Gemini: profundidade da fila, tempos de
+    espera, fichas disponíveis e chamadas rejeitadas/repetidas.
+    """
+    return limitador_llm.limitador.estatisticas()
+
+@router.get("/banco")
+async def estatisticas_banco():
+    """
+    Pool de conexões do banco: conexões em uso, livres e em overflow, e o tempo
+    que as requisições esperam por uma conexão (esgotamentos = timeouts do pool).
+    """
+    return estatisticas_pool()
@@ -1,15 +1,24 @@
-import io
-import requests
+import os
+import asyncio
+import httpx
 
 from PIL import Image, UnidentifiedImageError
-# from typing import List
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from datetime import date
+from typing import List, Optional
+from pydantic import ValidationError
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request, Query, Header
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..services import analise_service
-from ..schemas.schemas import ImageUrlAnalysisRequest
-# from ..schemas.schemas import PromptRequest, ImageAnalysisRequest
+from ..executor import executar_em_thread
+from ..services import analise_service, armazenamento_service, download_service, fila_service, idempotencia_service, paginacao, visoes
+from ..schemas import schemas
+from ..schemas.schemas import ImageUrlAnalysisRequest, ImageAnalysisRequest
+# from ..schemas.schemas import PromptRequest
+
+LOTE_MAX_ITENS = int(os.getenv("LOTE_MAX_ITENS", "50"))            # Imagens aceitas por lote
+LOTE_CONCORRENCIA = int(os.getenv("LOTE_CONCORRENCIA", "8"))       # Imagens de um mesmo lote analisadas ao mesmo tempo
 
 router = APIRouter( 
     prefix="/refeicoes",
@@ -21,61 +30,285 @@ router = APIRouter(
 async def analisar_refeicao_upload(
     usuario_id: int,
     db: Session = Depends(get_db),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    assincrono: bool = False,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
+    """
+    Recebe o upload de uma imagem, analisa com a LLM e salva no banco.
+    Com '?assincrono=true', responde 202 logo após salvar a imagem: a análise
+    roda nos workers da fila e o resultado é consultado em /refeicoes/jobs/{job_id}.
+    Com o cabeçalho 'Idempotency-Key', reenvios da mesma imagem com a mesma chave
+    recebem a resposta da primeira requisição (sem nova análise nem nova refeição).
+    """
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="O arquivo enviado não é uma imagem.")
 
+    arquivo = None
     try:
-        contents = await file.read()
-        imagem_pil = Image.open(io.BytesIO(contents))
+        arquivo = await armazenamento_service.receber_upload(file)  # Grava em partes direto em uploads/, calculando o hash
+
+        async def processar(confirmar):
+            arquivo_final = await executar_em_thread(armazenamento_service.finalizar, arquivo)  # Confere só o cabeçalho da imagem
 
-        refeicao_salva = analise_service.analisar_imagem_e_salvar(
-            db=db, 
-            usuario_id=usuario_id, 
-            imagem_pil=imagem_pil
-        )
+            if assincrono:
+                job = await executar_em_thread(
+                    fila_service.enfileirar, db=db, usuario_id=usuario_id, arquivo=arquivo_final,
+                    antes_do_commit=_confirmar_na_transacao(db, confirmar)
+                )
+                return 202, schemas.JobAnaliseCriado(
+                    job_id=job.id,
+                    status=job.status,
+                    status_url=f"/refeicoes/jobs/{job.id}"
+                ).model_dump(mode="json")
 
-        return refeicao_salva                                       # Salva e retorna a refeição analisada
+            refeicao = await executar_em_thread(_analisar_e_salvar, db, usuario_id, arquivo_final, confirmar)  # Roda fora do event loop (PIL, Gemini e DB são bloqueantes)
+            return 201, refeicao
+
+        impressao = idempotencia_service.impressao(arquivo["hash_conteudo"], str(assincrono))
+        return await _responder(usuario_id, "analisar-imagem", idempotency_key, impressao, processar)
 
     except UnidentifiedImageError:
         raise HTTPException(status_code=400, detail="Formato de imagem inválido.")
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Imagem grande demais para ser processada.")
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         print(f"🚨 Erro inesperado no endpoint de análise: {e}")
         raise HTTPException(status_code=500, detail=f"Ocorreu um erro inesperado: {str(e)}")
+    finally:
+        if arquivo is not None:
+            armazenamento_service.descartar(arquivo)                # Reenvio respondido sem análise: o temporário não foi usado
     
 @router.post("/analisar-url/{usuario_id}", status_code=201)
 async def analisar_refeicao_por_url(
     usuario_id: int,
     request: ImageUrlAnalysisRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     Recebe um LINK (URL) de uma imagem, baixa, analisa com a LLM e salva no banco.
+    Aceita o cabeçalho 'Idempotency-Key' (ver analisar-imagem); o reenvio não baixa a imagem de novo.
     """
-    try:
+    image_url = str(request.image_url)
+
+    async def processar(confirmar):
         # --- Lógica para baixar a imagem do link ---
-        response = requests.get(request.image_url)
-        response.raise_for_status() # Lança um erro se a URL for inválida (ex: 404)
-        
-        imagem_pil = Image.open(io.BytesIO(response.content))
+        arquivo = await download_service.baixar_imagem(image_url)
+        arquivo = await executar_em_thread(armazenamento_service.finalizar, arquivo)
         # ---------------------------------------------
 
-        refeicao_salva = analise_service.analisar_imagem_e_salvar(
-            db=db, 
-            usuario_id=usuario_id, 
-            imagem_pil=imagem_pil
-        )
-        return refeicao_salva
+        return 201, await executar_em_thread(_analisar_e_salvar, db, usuario_id, arquivo, confirmar)
+
+    try:
+        impressao = idempotencia_service.impressao(image_url)
+        return await _responder(usuario_id, "analisar-url", idempotency_key, impressao, processar)
 
-    except requests.exceptions.RequestException:
+    except httpx.HTTPError:
         raise HTTPException(status_code=400, detail="Não foi possível baixar a imagem do link fornecido.")
     except UnidentifiedImageError:
         raise HTTPException(status_code=400, detail="O link não continha um formato de imagem válido.")
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Imagem grande demais para ser processada.")
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         print(f"🚨 Erro inesperado no endpoint de URL: {e}")
-        raise HTTPException(status_code=500, detail=f"Ocorreu um erro inesperado: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro inesperado: {str(e)}")
+
+def _analisar_e_salvar(db: Session, usuario_id: int, arquivo: dict, confirmar=None) -> dict:
+    # Roda no executor: a resposta é montada aqui (carrega 'itens' do banco) para poder ser guardada
+    refeicao = analise_service.analisar_imagem_e_salvar(
+        db=db, usuario_id=usuario_id, arquivo=arquivo, antes_do_commit=_confirmar_na_transacao(db, confirmar)
+    )
+    return schemas.Refeicao.model_validate(refeicao).model_dump(mode="json")
+
+def _confirmar_na_transacao(db: Session, confirmar):
+    # Marca a Idempotency-Key como executada no mesmo commit da refeição/job (sem a chave, nada a fazer)
+    if confirmar is None:
+        return None
+    return lambda _ids: confirmar(db)
+
+async def _responder(usuario_id: int, rota: str, idempotency_key: Optional[str], impressao: str, processar) -> ORJSONResponse:
+    if idempotency_key is None:
+        status_code, conteudo = await processar(None)
+        return ORJSONResponse(status_code=status_code, content=conteudo)
+
+    status_code, conteudo, repetida = await idempotencia_service.executar(usuario_id, rota, idempotency_key, impressao, processar)
+    resposta = ORJSONResponse(status_code=status_code, content=conteudo)
+    if repetida:
+        resposta.headers["Idempotent-Replayed"] = "true"
+    return resposta
+
+@router.get("/{usuario_id}", response_model=schemas.PaginaRefeicoes)
+def listar_refeicoes(
+    usuario_id: int,
+    db: Session = Depends(get_db),
+    limite: int = Query(paginacao.LIMITE_PADRAO, ge=1, le=paginacao.LIMITE_MAX),
+    cursor: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    visao: str = Query(visoes.VISAO_COMPLETA, description="'resumo' omite o JSON bruto da IA (llm_raw_response)"),
+    campos: Optional[str] = Query(None, description="Campos de cada refeição, separados por vírgula (ex: id,data_hora,imagem_miniatura_url)")
+):
+    """
+    Histórico de refeições do usuário (mais recentes primeiro), com os itens de cada uma.
+    Paginado por cursor: repita a chamada com '?cursor=<proximo_cursor>' até vir None.
+    Aceita 'data_inicio' e 'data_fim' (formato YYYY-MM-DD) como filtros opcionais.
+    '?visao=resumo' ou '?campos=...' enxugam a lista (o que não é pedido nem é lido do banco).
+    """
+    campos_pedidos = visoes.REFEICAO.resolver(visao, campos)
+
+    pagina = analise_service.listar_refeicoes(
+        db=db,
+        usuario_id=usuario_id,
+        limite=limite,
+        cursor=cursor,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        campos=campos_pedidos
+    )
+    return visoes.responder_pagina(visoes.REFEICAO, pagina, "refeicoes", campos_pedidos, schemas.PaginaRefeicoes)
+
+@router.delete("/{refeicao_id}", status_code=204)
+def remover_refeicao(
+    refeicao_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Remove uma refeição registrada (o resumo nutricional do dia é recalculado).
+    """
+    analise_service.remover_refeicao(db=db, refeicao_id=refeicao_id)
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobAnalise)
+def consultar_job_analise(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Situação de um job do modo assíncrono (PENDENTE, PROCESSANDO, CONCLUIDO ou ERRO).
+    Quando CONCLUIDO, traz a refeição analisada.
+    """
+    return fila_service.buscar_job(db=db, job_id=job_id)
+
+@router.post(
+    "/analisar-lote/{usuario_id}",
+    response_model=schemas.ResultadoLote,
+    openapi_extra={                                                 # O corpo é lido manualmente, então documentamos os dois formatos aqui
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": ImageAnalysisRequest.model_json_schema()},
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}}
+                    }
+                }
+            }
+        }
+    }
+)
+async def analisar_refeicoes_em_lote(
+    usuario_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Analisa várias imagens de uma vez (ex: sincronização de fotos tiradas offline).
+    Aceita JSON no formato ImageAnalysisRequest ({"image_urls": [...]}) ou
+    multipart/form-data com vários campos 'files'.
+    As imagens são baixadas e analisadas em paralelo (com limite), e todas as
+    refeições são gravadas numa única transação. Cada imagem tem seu próprio
+    resultado: uma imagem ruim não derruba o lote.
+    """
+    tipo_conteudo = request.headers.get("content-type", "")
+
+    if tipo_conteudo.startswith("multipart/form-data"):
+        formulario = await request.form(max_files=LOTE_MAX_ITENS)
+        arquivos = [f for f in formulario.getlist("files") if not isinstance(f, str)]
+        itens = [(f.filename or f"arquivo-{i}", _receber_arquivo_do_lote(f)) for i, f in enumerate(arquivos)]
+    else:
+        try:
+            corpo = ImageAnalysisRequest.model_validate_json(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        itens = [(str(url), download_service.baixar_imagem(str(url))) for url in corpo.image_urls]
+
+    if not itens:
+        raise HTTPException(status_code=400, detail="Nenhuma imagem enviada.")
+    if len(itens) > LOTE_MAX_ITENS:
+        for _, corrotina in itens:
+            corrotina.close()
+        raise HTTPException(status_code=413, detail=f"O lote aceita no máximo {LOTE_MAX_ITENS} imagens.")
+
+    semaforo = asyncio.Semaphore(LOTE_CONCORRENCIA)
+    resultados = await asyncio.gather(*[
+        _analisar_item_do_lote(semaforo, indice, origem, obter_arquivo)
+        for indice, (origem, obter_arquivo) in enumerate(itens)
+    ])
+
+    try:
+        return await executar_em_thread(_persistir_lote, db, usuario_id, resultados)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        print(f"🚨 Erro inesperado ao gravar o lote: {e}")
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro inesperado: {str(e)}")
+
+async def _receber_arquivo_do_lote(file: UploadFile) -> dict:
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(status_code=400, detail="O arquivo enviado não é uma imagem.")
+    return await armazenamento_service.receber_upload(file)
+
+async def _analisar_item_do_lote(semaforo: asyncio.Semaphore, indice: int, origem: str, obter_arquivo) -> dict:
+    resultado = {"indice": indice, "origem": origem, "analise": None, "erro": None}
+
+    async with semaforo:
+        try:
+            arquivo = await obter_arquivo
+            arquivo = await executar_em_thread(armazenamento_service.finalizar, arquivo)
+            resultado["analise"] = await executar_em_thread(analise_service.obter_analise_isolada, arquivo)
+        except HTTPException as e:
+            resultado["erro"] = str(e.detail)
+        except httpx.HTTPError:
+            resultado["erro"] = "Não foi possível baixar a imagem do link fornecido."
+        except UnidentifiedImageError:
+            resultado["erro"] = "Formato de imagem inválido."
+        except Image.DecompressionBombError:
+            resultado["erro"] = "Imagem grande demais para ser processada."
+        except Exception as e:
+            print(f"🚨 Erro inesperado no item {indice} do lote: {e}")
+            resultado["erro"] = f"Ocorreu um erro inesperado: {str(e)}"
+
+    return resultado
+
+def _persistir_lote(db: Session, usuario_id: int, resultados: List[dict]) -> schemas.ResultadoLote:
+    # Roda no executor: grava tudo numa transação e já monta a resposta (acessa 'itens' no banco)
+    analises = [r["analise"] for r in resultados if r["analise"] is not None]
+
+    try:
+        refeicoes = iter(analise_service.persistir_refeicoes(db, usuario_id, analises, carregar_itens=True))
+    except Exception:
+        db.rollback()
+        raise
+
+    itens_resposta = []
+    for r in resultados:
+        sucesso = r["analise"] is not None
+        itens_resposta.append(schemas.ResultadoAnaliseLote(
+            indice=r["indice"],
+            origem=r["origem"],
+            sucesso=sucesso,
+            refeicao=schemas.Refeicao.model_validate(next(refeicoes)) if sucesso else None,
+            erro=r["erro"]
+        ))
+
+    return schemas.ResultadoLote(
+        total=len(resultados),
+        sucessos=len(analises),
+        falhas=len(resultados) - len(analises),
+        resultados=itens_resposta
+    )
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import FrozenSet, List, Optional, Union
 from datetime import date
 
-from ..database import get_db
-from ..services import relatorio_service
+from .. import metricas
+from ..database import SessionLocal, get_db
+from ..executor import executar_em_thread, executar_em_thread_coalescido, executor_analise
+from ..services import paginacao, relatorio_service, visoes
 from ..schemas import schemas
 from ..models import models
 
@@ -16,7 +22,6 @@ router = APIRouter(
 @router.get("/{usuario_id}", response_model=schemas.Relatorio)
 async def gerar_ou_buscar_relatorio_para_nutricionista(
     usuario_id: int,
-    db: Session = Depends(get_db),
     data_inicio: Optional[date] = None,
     data_fim: Optional[date] = None
 ):
@@ -27,35 +32,126 @@ async def gerar_ou_buscar_relatorio_para_nutricionista(
     4. Retorna o relatório (com o resumo automático).
     """
     try:
-        relatorio = relatorio_service.criar_relatorio(
-            db=db, 
-            usuario_id=usuario_id,
-            data_inicio=data_inicio,
-            data_fim=data_fim
+        # Pedidos simultâneos do mesmo relatório neste worker esperam uma única criação
+        periodo_inicio, periodo_fim = relatorio_service.processar_periodo(data_inicio, data_fim)
+        return await executar_em_thread_coalescido(
+            ("relatorio", usuario_id, periodo_inicio, periodo_fim),
+            _buscar_ou_criar_relatorio,
+            usuario_id, periodo_inicio, periodo_fim
         )
-        return relatorio
+    except HTTPException as e:
+        raise e # Repassa erros 400, 409, etc.
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+def _buscar_ou_criar_relatorio(usuario_id: int, periodo_inicio: date, periodo_fim: date) -> schemas.Relatorio:
+    # Sessão própria: a execução é compartilhada e não pode depender da sessão (get_db) de
+    # quem chegou primeiro, que é fechada se esse cliente desconectar. Só o schema sai daqui.
+    db = SessionLocal()
+    try:
+        relatorio = relatorio_service.criar_relatorio(db=db, usuario_id=usuario_id, data_inicio=periodo_inicio, data_fim=periodo_fim)
+        return schemas.Relatorio.model_validate(relatorio)
+    finally:
+        db.close()
+
 @router.get("/{relatorio_id}/sugestao-ia", response_model=schemas.SugestaoRelatorioResponse)
 async def gerar_sugestao_para_nutricionista(
     relatorio_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    regenerar: bool = False
 ):
     """
     Endpoint para o Nutricionista.
     1. Pega o resumo de um relatório PENDENTE.
-    2. Envia para a LLM gerar um comentário de sugestão.
+    2. Envia para a LLM gerar um comentário de sugestão (ou reaproveita a já gerada).
     3. Retorna o texto da sugestão para o nutricionista editar.
+    Use '?regenerar=true' para forçar uma nova sugestão.
     """
     try:
-        sugestao = relatorio_service.gerar_sugestao_llm(db=db, relatorio_id=relatorio_id)
+        sugestao = await executar_em_thread(                            # Pode esperar pela cota da IA: fora do event loop
+            relatorio_service.gerar_sugestao_llm, db=db, relatorio_id=relatorio_id, regenerar=regenerar
+        )
         return sugestao
     except HTTPException as e:
         raise e # Repassa erros 404, 400, etc.
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     
+@router.get("/{relatorio_id}/sugestao-ia/stream")
+async def transmitir_sugestao_para_nutricionista(
+    relatorio_id: int,
+    db: Session = Depends(get_db),
+    regenerar: bool = False
+):
+    """
+    Mesma sugestão de '/sugestao-ia', entregue via Server-Sent Events à medida que a IA escreve.
+    Eventos: 'parte' ({"texto"}), 'fim' ({"sugestao_texto", "do_cache"}) e 'erro' ({"detail", "status_code"}).
+    Se a sugestão já estiver guardada, vem direto um único evento 'fim'.
+    """
+    try:
+        # Validações (404, 400...) acontecem antes de abrir o stream, com o status HTTP correto
+        preparo = await executar_em_thread(
+            relatorio_service.preparar_sugestao, db=db, relatorio_id=relatorio_id, regenerar=regenerar
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    return StreamingResponse(
+        _eventos_da_sugestao(preparo),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",                                  # Desliga o buffer do nginx
+        }
+    )
+
+def _evento_sse(evento: str, dados: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+async def _eventos_da_sugestao(preparo: dict):
+    if preparo["sugestao_guardada"] is not None:
+        yield _evento_sse("fim", {"sugestao_texto": preparo["sugestao_guardada"], "do_cache": True})
+        return
+
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue()
+
+    def _enviar(evento: str, dados: dict):
+        try:
+            loop.call_soon_threadsafe(fila.put_nowait, (evento, dados))
+        except RuntimeError:
+            pass # Event loop já encerrado (desligamento do servidor)
+
+    def _produzir():
+        # Roda numa thread do executor e vai até o fim mesmo se o cliente desconectar,
+        # para que a sugestão gerada (e já paga) fique guardada no relatório
+        partes = []
+        try:
+            with metricas.medir_etapa("geracao_sugestao"):
+                for texto in relatorio_service.gerar_sugestao_em_partes(preparo["prompt"]):
+                    partes.append(texto)
+                    _enviar("parte", {"texto": texto})
+
+            sugestao_limpa = relatorio_service.limpar_sugestao("".join(partes))
+            relatorio_service.guardar_sugestao_isolada(preparo["relatorio_id"], preparo["chave"], sugestao_limpa)
+            _enviar("fim", {"sugestao_texto": sugestao_limpa, "do_cache": False})
+        except HTTPException as e:
+            _enviar("erro", {"detail": e.detail, "status_code": e.status_code})
+        except Exception as e:
+            print(f"🚨 Erro no streaming da sugestão do relatório {preparo['relatorio_id']}: {e}")
+            _enviar("erro", {"detail": str(e), "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR})
+
+    loop.run_in_executor(executor_analise, _produzir)
+
+    yield ": conectado\n\n"                                            # Comentário SSE: envia os cabeçalhos imediatamente
+    while True:
+        evento, dados = await fila.get()
+        yield _evento_sse(evento, dados)
+        if evento != "parte":
+            break
+
 @router.put("/{relatorio_id}/aprovar", response_model=schemas.Relatorio)
 async def aprovar_relatorio(
     relatorio_id: int,
@@ -83,21 +179,45 @@ async def aprovar_relatorio(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
-@router.get("/aprovados/{usuario_id}", response_model=List[schemas.Relatorio])
+@router.get("/aprovados/{usuario_id}", response_model=Union[List[schemas.Relatorio], schemas.PaginaRelatorios])
 async def buscar_relatorios_aprovados(
     usuario_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    limite: Optional[int] = Query(None, ge=1, le=paginacao.LIMITE_MAX, description=f"Liga a paginação (padrão {paginacao.LIMITE_PADRAO} com 'cursor')"),
+    cursor: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    visao: str = Query(visoes.VISAO_COMPLETA, description="'resumo' omite o resumo automático e os comentários"),
+    campos: Optional[str] = Query(None, description="Campos de cada relatório, separados por vírgula (ex: id,periodo_inicio,status)")
 ):
     """
     Endpoint para o Usuário Comum.
-    1. Busca no banco todos os relatórios do usuario_id com status 'APROVADO'.
-    2. Retorna a lista de relatórios (com os comentários do nutricionista).
+    1. Busca no banco os relatórios do usuario_id com status 'APROVADO' (mais recentes primeiro).
+    2. Retorna a lista de relatórios (com os comentários do nutricionista). Com 'limite' ou 'cursor',
+       retorna uma página: {"relatorios": [...], "proximo_cursor"}.
+    3. Aceita 'data_inicio' e 'data_fim' (data de aprovação, formato YYYY-MM-DD) como filtros.
+    4. '?visao=resumo' ou '?campos=...' enxugam a lista (os textos nem são lidos do banco).
     """
+    campos_pedidos = visoes.RELATORIO.resolver(visao, campos)
+
     try:
-        relatorios = relatorio_service.get_relatorios_aprovados_usuario(
-            db=db, 
-            usuario_id=usuario_id
-        )
-        return relatorios
+        return await executar_em_thread(_buscar_aprovados, db, usuario_id, limite, cursor, data_inicio, data_fim, campos_pedidos)
+    except HTTPException as e:
+        raise e # Repassa o 400 de cursor inválido
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+def _buscar_aprovados(db: Session, usuario_id: int, limite: Optional[int], cursor: Optional[str], data_inicio: Optional[date], data_fim: Optional[date], campos: FrozenSet[str]) -> Response:
+    # Roda no executor: consulta e serialização (a parte pesada em CPU) fora do event loop
+    pagina = relatorio_service.get_relatorios_aprovados_usuario(
+        db=db,
+        usuario_id=usuario_id,
+        limite=limite,
+        cursor=cursor,
+        data_inicio=data_inicio,
+        data_fim=data_fim,
+        campos=campos
+    )
+    if limite is None and cursor is None:
+        return visoes.responder_lista(visoes.RELATORIO, pagina["relatorios"], campos)  # Sem paginação: a lista de antes
+    return visoes.responder_pagina(visoes.RELATORIO, pagina, "relatorios", campos, schemas.PaginaRelatorios)
@@ -0,0 +1,25 @@
+import re
+
+from typing import Optional
+
+# --- Caminhos das imagens armazenadas (endereçadas pelo SHA-256 do conteúdo) ---
+# Usado tanto pelo armazenamento (onde gravar) quanto pelos schemas (URLs das variantes).
+_URL_FRAGMENTADA = re.compile(r"^(.*/)([0-9a-f]{2})/([0-9a-f]{2})/(\2\3[0-9a-f]{60})\.[a-z0-9]+$")
+
+def chave_original(hash_conteudo: str, extensao: str) -> str:
+    # Layout fragmentado: ab/cd/abcd...<sha256>.ext (no máximo 256 arquivos-pasta por nível)
+    return f"{hash_conteudo[:2]}/{hash_conteudo[2:4]}/{hash_conteudo}.{extensao}"
+
+def chave_variante(hash_conteudo: str, variante: str) -> str:
+    return f"{hash_conteudo[:2]}/{hash_conteudo[2:4]}/{hash_conteudo}_{variante}.webp"
+
+def url_variante(imagem_url: Optional[str], variante: str) -> Optional[str]:
+    """
+    URL da variante a partir da URL da original. Imagens salvas antes do
+    layout fragmentado (uploads/<arquivo> direto) não têm variantes: retorna None.
+    """
+    encontrado = _URL_FRAGMENTADA.match(imagem_url or "")
+    if not encontrado:
+        return None
+    prefixo, _, _, hash_conteudo = encontrado.groups()
+    return f"{prefixo}{chave_variante(hash_conteudo, variante)}"
@@ -0,0 +1,39 @@
+"""
+Remove as chaves de idempotência expiradas (respostas guardadas há mais de
+IDEMPOTENCIA_TTL_HORAS e reservas abandonadas), em lotes com um commit cada,
+para não segurar a tabela numa única transação longa.
+
+Uso (a partir da raiz do projeto), agendado por exemplo a cada hora:
+    python -m app.comandos.limpar_idempotencia [--lote 5000]
+"""
+import sys
+import time
+import argparse
+
+from ..database import SessionLocal
+from ..services import idempotencia_service
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove as chaves de idempotência expiradas.")
+    parser.add_argument("--lote", type=int, default=5000, help="Chaves removidas por transação")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    total = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            removidas = idempotencia_service.limpar_expiradas(db, lote=args.lote)
+            if not removidas:
+                break
+            total += removidas
+            print(f"   ... {total} chaves removidas")
+    finally:
+        db.close()
+
+    print(f"🧹 {total} chaves de idempotência expiradas removidas em {time.perf_counter() - inicio:.2f}s.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Recalcula pela tabela de composição (app/dados/taco.csv ou COMPOSICAO_ARQUIVO)
+os nutrientes dos itens de refeição já gravados, e o resumo diário dos dias afetados.
+Use depois de trocar ou ampliar a tabela, ou para corrigir refeições antigas
+(gravadas antes da tabela, com as calorias zeradas).
+
+Uso (a partir da raiz do projeto):
+    python -m app.comandos.recalcular_nutrientes [--usuario ID] [--desde AAAA-MM-DD] [--lote 1000] [--simular]
+
+'--simular' só conta quantos itens mudariam, sem gravar nada.
+Relatórios já gerados não são alterados.
+"""
+import sys
+import time
+import argparse
+
+from datetime import date
+from ..database import SessionLocal
+from ..services import composicao_service
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula os nutrientes dos itens de refeição pela tabela de composição.")
+    parser.add_argument("--usuario", type=int, default=None, help="Restringe a um usuário comum")
+    parser.add_argument("--desde", type=date.fromisoformat, default=None, help="Só refeições a partir deste dia (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=1000, help="Itens por transação")
+    parser.add_argument("--simular", action="store_true", help="Não grava, só conta as alterações")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    ultimo_id, lidos, alterados = 0, 0, 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            ultimo_id, lidos_lote, alterados_lote = composicao_service.recalcular_itens(
+                db, apos_id=ultimo_id, limite=args.lote, usuario_id=args.usuario, desde=args.desde, simular=args.simular
+            )
+            if ultimo_id is None:
+                break
+            lidos += lidos_lote
+            alterados += alterados_lote
+            print(f"   ... {lidos} itens lidos, {alterados} alterados (até o item {ultimo_id})")
+    finally:
+        db.close()
+
+    total = time.perf_counter() - inicio
+    estatisticas = composicao_service.estatisticas()
+    acao = "mudariam" if args.simular else "recalculados"
+    print(
+        f"✅ {alterados} de {lidos} itens {acao} em {total:.2f}s ({lidos / total if total else 0:.0f} itens/s). "
+        f"Na tabela: {estatisticas['encontrados']}, só aproximados: {estatisticas['aproximados']}, sem referência: {estatisticas['sem_referencia']}, "
+        f"estimativas divergentes: {estatisticas['divergentes']}."
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
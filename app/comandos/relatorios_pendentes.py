@@ -0,0 +1,79 @@
+"""
+Pré-calcula os relatórios PENDENTE de todos os usuários ativos (com refeições
+no período), para que o GET /relatorios/{usuario_id} do nutricionista só
+precise buscar o relatório pronto.
+
+Uso (a partir da raiz do projeto; agende, por exemplo, diariamente no cron):
+    python -m app.comandos.relatorios_pendentes [--processos 4] [--data-fim AAAA-MM-DD]
+
+Período: os mesmos 14 dias padrão da API, terminando em --data-fim (padrão: hoje).
+Usuários que já têm relatório PENDENTE para o período são ignorados.
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+from datetime import date
+from ..database import SessionLocal
+from ..services import relatorio_service
+
+RELATORIOS_LOTE_GRAVACAO = int(os.getenv("RELATORIOS_LOTE_GRAVACAO", "1000"))   # Relatórios por INSERT/commit
+
+def _montar(tarefa) -> tuple:
+    # Roda nos processos do pool: só recebe dados simples, não usa o banco
+    usuario_id, periodo_inicio, periodo_fim, dias = tarefa
+    return usuario_id, relatorio_service.montar_resumo(periodo_inicio, periodo_fim, dias)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-calcula os relatórios PENDENTE de todos os usuários ativos.")
+    parser.add_argument("--processos", type=int, default=int(os.getenv("RELATORIOS_PROCESSOS", "2")))
+    parser.add_argument("--data-fim", type=date.fromisoformat, default=None, help="Último dia do período (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    periodo_inicio, periodo_fim = relatorio_service.processar_periodo(None, args.data_fim)
+    inicio = time.perf_counter()
+
+    db = SessionLocal()
+    try:
+        # 1. Agregação de todos os usuários numa única consulta ao resumo diário
+        por_usuario = relatorio_service.agregar_periodo_todos(db, periodo_inicio, periodo_fim)
+        fim_agregacao = time.perf_counter()
+        db.commit() # Libera a conexão enquanto os resumos são montados
+
+        tarefas = [(usuario_id, periodo_inicio, periodo_fim, dias) for usuario_id, dias in por_usuario.items()]
+
+        # 2. Montagem dos resumos em vários processos ('spawn': nada de conexões herdadas)
+        if args.processos > 1 and len(tarefas) > 1:
+            contexto = multiprocessing.get_context("spawn")
+            with contexto.Pool(args.processos) as pool:
+                tamanho_bloco = max(1, len(tarefas) // (args.processos * 4))
+                resumos = dict(pool.imap_unordered(_montar, tarefas, chunksize=tamanho_bloco))
+        else:
+            resumos = dict(map(_montar, tarefas))
+        fim_montagem = time.perf_counter()
+
+        # 3. Gravação em lotes
+        gravados = 0
+        usuario_ids = list(resumos)
+        for posicao in range(0, len(usuario_ids), RELATORIOS_LOTE_GRAVACAO):
+            lote = {usuario_id: resumos[usuario_id] for usuario_id in usuario_ids[posicao:posicao + RELATORIOS_LOTE_GRAVACAO]}
+            gravados += relatorio_service.inserir_relatorios_pendentes(db, periodo_inicio, periodo_fim, lote)
+        fim = time.perf_counter()
+    finally:
+        db.close()
+
+    total = fim - inicio
+    print(
+        f"✅ {gravados} relatórios PENDENTE criados para {periodo_inicio:%d/%m/%Y} a {periodo_fim:%d/%m/%Y} "
+        f"em {total:.2f}s ({gravados / total if total else 0:.1f} usuários/s)."
+    )
+    print(
+        f"   Agregação {fim_agregacao - inicio:.2f}s | montagem {fim_montagem - fim_agregacao:.2f}s "
+        f"({args.processos} processos) | gravação {fim - fim_montagem:.2f}s"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""
+Manutenção do resumo nutricional diário.
+
+Uso (a partir da raiz do projeto):
+    python -m app.comandos.resumo_diario reconstruir [--usuario ID]
+    python -m app.comandos.resumo_diario verificar [--usuario ID]
+
+'reconstruir' faz o backfill/reconstrução a partir de 'refeicoes' e 'refeicao_itens'.
+'verificar' compara o resumo com as tabelas brutas e sai com código 1 se houver divergências.
+"""
+import sys
+import time
+import argparse
+
+from ..database import SessionLocal
+from ..services import resumo_diario_service
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutenção do resumo nutricional diário.")
+    parser.add_argument("acao", choices=["reconstruir", "verificar"])
+    parser.add_argument("--usuario", type=int, default=None, help="Restringe a um usuário comum")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    inicio = time.perf_counter()
+
+    try:
+        if args.acao == "reconstruir":
+            linhas = resumo_diario_service.reconstruir(db, usuario_id=args.usuario)
+            print(f"✅ Resumo diário reconstruído: {linhas} linhas em {time.perf_counter() - inicio:.2f}s.")
+            return 0
+
+        divergencias = resumo_diario_service.verificar(db, usuario_id=args.usuario)
+        for d in divergencias:
+            print(f"❌ Usuário {d['usuario_comum_id']} em {d['dia']}: esperado {d['esperado']}, gravado {d['gravado']}")
+
+        if divergencias:
+            print(f"{len(divergencias)} divergências encontradas. Rode 'reconstruir' para corrigir.")
+            return 1
+
+        print(f"✅ Resumo diário consistente ({time.perf_counter() - inicio:.2f}s).")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:                                                                # Opcional: sem o pacote 'brotli', só gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Compressão das respostas (gzip ou brotli, conforme o Accept-Encoding) ---
+# Só JSON e texto: imagens já são comprimidas e streams SSE não podem ficar em buffer.
+COMPRESSAO_RESPOSTAS = os.getenv("COMPRESSAO_RESPOSTAS", "true").lower() == "true"
+COMPRESSAO_MINIMO_BYTES = int(os.getenv("COMPRESSAO_MINIMO_BYTES", "1000"))          # Respostas menores saem sem compressão
+COMPRESSAO_NIVEL_GZIP = int(os.getenv("COMPRESSAO_NIVEL_GZIP", "6"))
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv("COMPRESSAO_NIVEL_BROTLI", "5"))             # 0 a 11; acima de ~6 gasta CPU demais por requisição
+
+TIPOS_COMPRIMIVEIS = ("application/json", "text/")
+
+class _SoTexto:
+    # Troca a regra de exclusão do Starlette (só SSE) por uma lista de tipos permitidos
+    async def send_with_compression(self, message: Message) -> None:
+        await super().send_with_compression(message)
+        if message["type"] == "http.response.start":
+            tipo = Headers(raw=message["headers"]).get("content-type", "")
+            self.content_type_is_excluded = not tipo.startswith(TIPOS_COMPRIMIVEIS) or tipo.startswith(DEFAULT_EXCLUDED_CONTENT_TYPES)
+
+class _RespostaGzip(_SoTexto, GZipResponder):
+    pass
+
+class _RespostaBrotli(_SoTexto, IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, qualidade: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=qualidade)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        saida = self.compressor.process(body)
+        return saida + (self.compressor.flush() if more_body else self.compressor.finish())
+
+class CompressaoMiddleware:
+    """
+    Comprime as respostas com brotli (se o pacote estiver instalado e o cliente aceitar)
+    ou gzip. Respostas que já têm Content-Encoding passam intactas.
+    """
+
+    def __init__(self, app: ASGIApp, minimo_bytes: int = COMPRESSAO_MINIMO_BYTES) -> None:
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        aceitas = {
+            codificacao.split(";")[0].strip()
+            for codificacao in Headers(scope=scope).get("accept-encoding", "").lower().split(",")
+        }
+
+        if brotli is not None and "br" in aceitas:
+            resposta = _RespostaBrotli(self.app, self.minimo_bytes, COMPRESSAO_NIVEL_BROTLI)
+        elif "gzip" in aceitas:
+            resposta = _RespostaGzip(self.app, self.minimo_bytes, compresslevel=COMPRESSAO_NIVEL_GZIP)
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        await resposta(scope, receive, send)
@@ -1,14 +1,88 @@
 import os
-from sqlalchemy import create_engine
+import time
+import threading
+from sqlalchemy import create_engine, event, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, NullPool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Sem DATABASE_URL a aplicação ainda pode ser importada (testes, benchmarks, --help dos
+# comandos), mas a primeira conexão falha com um erro claro, em vez de cair num banco
+# qualquer em localhost
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_CRIAR_TABELAS = os.getenv("DB_CRIAR_TABELAS", "false").lower() == "true"   # create_all na inicialização (o normal é usar o Alembic)
 
-engine = create_engine(DATABASE_URL)
+# --- Pool de conexões (configurável pelo .env) ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                          # Conexões mantidas abertas por processo
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))                   # Conexões extras em picos (fechadas ao devolver)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))                 # Espera máxima (s) por uma conexão livre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))                 # Recria conexões mais velhas que isso (s)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"  # Testa a conexão antes de usar
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))    # statement_timeout do PostgreSQL (0 = sem limite)
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"         # Pool externo (pgbouncer em modo transação)
+
+_estatisticas_pool = {"checkouts": 0, "esgotamentos": 0, "espera_total_s": 0.0, "espera_max_s": 0.0}
+_estatisticas_lock = threading.Lock()
+
+class _MedicaoCheckout:
+    """
+    Mede quanto cada requisição espera para conseguir uma conexão do pool
+    (inclui o pre-ping e, no modo pgbouncer, a abertura da conexão).
+    """
+
+    def connect(self):
+        inicio = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with _estatisticas_lock:
+                _estatisticas_pool["esgotamentos"] += 1
+            raise
+        finally:
+            espera = time.monotonic() - inicio
+            with _estatisticas_lock:
+                _estatisticas_pool["checkouts"] += 1
+                _estatisticas_pool["espera_total_s"] += espera
+                _estatisticas_pool["espera_max_s"] = max(_estatisticas_pool["espera_max_s"], espera)
+
+class PoolMedido(_MedicaoCheckout, QueuePool):
+    pass
+
+class PoolExternoMedido(_MedicaoCheckout, NullPool):
+    pass
+
+def _sem_database_url():
+    raise RuntimeError("DATABASE_URL não configurada: defina a conexão com o PostgreSQL no ambiente ou no .env.")
+
+# Engine sem URL: mesmo dialeto, mas toda conexão cai em _sem_database_url
+_url_engine = DATABASE_URL or "postgresql+psycopg2://"
+_argumentos_sem_url = {} if DATABASE_URL else {"creator": _sem_database_url}
+
+if DB_PGBOUNCER:
+    # Quem faz o pool é o pgbouncer: aqui cada sessão abre e fecha a sua conexão.
+    # Parâmetros de sessão ('options') não são aceitos em modo transação, por isso
+    # o statement_timeout vai com SET LOCAL no início de cada transação.
+    engine = create_engine(_url_engine, poolclass=PoolExternoMedido, **_argumentos_sem_url)
+
+    if DB_STATEMENT_TIMEOUT_MS:
+        @event.listens_for(engine, "begin")
+        def _definir_statement_timeout(conexao):
+            conexao.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+else:
+    engine = create_engine(
+        _url_engine,
+        poolclass=PoolMedido,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"} if DB_STATEMENT_TIMEOUT_MS else {},
+        **_argumentos_sem_url
+    )
 
 # Cria uma SessionLocal que usaremos para interagir com o banco
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -16,10 +90,28 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base para nossos modelos declarativos do SQLAlchemy
 Base = declarative_base()
 
-# Função para injetar a dependência da sessão do banco de dados nos endpoints
+# Função para injetar a dependência da sessão do banco de dados nos endpoints.
+# A Session só pega uma conexão do pool na primeira consulta e a devolve a cada
+# commit/rollback: os serviços encerram a transação antes de chamar a IA.
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def estatisticas_pool() -> dict:
+    with _estatisticas_lock:
+        estatisticas = dict(_estatisticas_pool)
+
+    pool = engine.pool
+    estatisticas.update({
+        "espera_media_s": round(estatisticas["espera_total_s"] / estatisticas["checkouts"], 4) if estatisticas["checkouts"] else 0.0,
+        "modo": "pgbouncer" if DB_PGBOUNCER else "pool_local",
+        "tamanho": DB_POOL_SIZE if not DB_PGBOUNCER else None,
+        "max_overflow": DB_MAX_OVERFLOW if not DB_PGBOUNCER else None,
+        "em_uso": pool.checkedout() if isinstance(pool, QueuePool) else None,
+        "livres": pool.checkedin() if isinstance(pool, QueuePool) else None,
+        "overflow": max(0, pool.overflow()) if isinstance(pool, QueuePool) else None,   # overflow() é negativo enquanto o pool não enche
+    })
+    return estatisticas
@@ -0,0 +1,55 @@
+import os
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Executor compartilhado para trabalho bloqueante ---
+# A análise de imagem faz decode/encode com PIL, chamada síncrona ao Gemini e
+# commits do SQLAlchemy. Nada disso pode rodar dentro do event loop, senão uma
+# única resposta lenta da IA trava todas as outras requisições do worker.
+ANALISE_MAX_WORKERS = int(os.getenv("ANALISE_MAX_WORKERS", "32"))      # Quantas análises podem ficar "em voo" por worker
+
+executor_analise = ThreadPoolExecutor(
+    max_workers=ANALISE_MAX_WORKERS,
+    thread_name_prefix="analise"
+)
+
+async def executar_em_thread(funcao, *args, **kwargs):
+    """
+    Executa uma função bloqueante no executor limitado e aguarda o resultado
+    sem bloquear o event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor_analise, functools.partial(funcao, *args, **kwargs))
+
+# Executor separado para E/S de arquivos (gravação dos uploads em partes): curta e
+# frequente, não pode ficar na fila atrás das análises que esperam pelo Gemini
+ARQUIVOS_MAX_WORKERS = int(os.getenv("ARQUIVOS_MAX_WORKERS", "8"))
+
+executor_arquivos = ThreadPoolExecutor(
+    max_workers=ARQUIVOS_MAX_WORKERS,
+    thread_name_prefix="arquivos"
+)
+
+async def executar_em_thread_arquivos(funcao, *args, **kwargs):
+    """
+    Como executar_em_thread, no executor de E/S de arquivos.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor_arquivos, functools.partial(funcao, *args, **kwargs))
+
+_em_andamento = {}
+
+async def executar_em_thread_coalescido(chave, funcao, *args, **kwargs):
+    """
+    Como executar_em_thread, mas chamadas simultâneas com a mesma 'chave' (neste
+    processo) compartilham uma única execução e o seu resultado ou erro.
+    """
+    tarefa = _em_andamento.get(chave)
+    if tarefa is None:
+        tarefa = asyncio.ensure_future(executar_em_thread(funcao, *args, **kwargs))
+        _em_andamento[chave] = tarefa
+        tarefa.add_done_callback(lambda _: _em_andamento.pop(chave, None))
+
+    return await asyncio.shield(tarefa)                                 # Quem desistir de esperar não cancela os outros
@@ -4,28 +4,76 @@
 #   from pydantic import BaseModel, HttpUrl
 
 import os
+import time
 
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
-from .database import engine
+from . import metricas
+from .compressao import CompressaoMiddleware, COMPRESSAO_RESPOSTAS
+from .database import engine, DB_CRIAR_TABELAS
+from .executor import executar_em_thread
 from .models import models as models_db
-from .api import refeicoes, relatorios
+from .api import refeicoes, relatorios, monitoramento
+from .services import armazenamento_service, download_service, provedor_llm
 
-models_db.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada disso roda no import: importar a aplicação não exige banco nem credenciais
+    os.makedirs(armazenamento_service.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(armazenamento_service.UPLOAD_DIR_TEMPORARIO, exist_ok=True)
 
-os.makedirs("uploads", exist_ok=True)
+    if DB_CRIAR_TABELAS:
+        await executar_em_thread(models_db.Base.metadata.create_all, bind=engine)
+
+    if provedor_llm.LLM_AQUECER:
+        await executar_em_thread(provedor_llm.aquecer)              # Configura o Gemini e abre a conexão antes da 1ª requisição
+
+    yield
+    await download_service.fechar_cliente()                     # Fecha as conexões keep-alive do cliente HTTP compartilhado
 
 app = FastAPI(                                                  # Inicializa a aplicação FastAPI com metadados para a documentação
     title="Sistema de Acompanhamento Alimentar Inteligente",
     description="Backend para o TCC de Análise e Desenvolvimento de Sistemas.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse                       # orjson: serialização bem mais rápida que o json da biblioteca padrão
 )
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+if COMPRESSAO_RESPOSTAS:
+    app.add_middleware(CompressaoMiddleware)                    # gzip/brotli para JSON e texto, conforme o Accept-Encoding
+
+app.mount("/uploads", armazenamento_service.armazenamento.aplicativo_estatico(), name="uploads")  # Cache imutável + ETag pelo hash
+
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    # Conta e cronometra cada requisição pelo "molde" da rota (ex: /refeicoes/{usuario_id}),
+    # para não criar uma série por ID
+    inicio = time.perf_counter()
+    status_code = 500
+    try:
+        with metricas.requisicoes_em_andamento.em_andamento():
+            resposta = await call_next(request)
+        status_code = resposta.status_code
+        return resposta
+    finally:
+        rota = getattr(request.scope.get("route"), "path", "desconhecida")
+        metricas.requisicoes.incrementar(metodo=request.method, rota=rota, status=status_code)
+        metricas.duracao_requisicao.observar(time.perf_counter() - inicio, metodo=request.method, rota=rota)
 
 app.include_router(refeicoes.router)
 app.include_router(relatorios.router)
+app.include_router(monitoramento.router)
+
+@app.get("/metrics", tags=["Monitoramento"], response_class=PlainTextResponse)
+async def metricas_prometheus():
+    """
+    Métricas no formato texto do Prometheus: duração por etapa dos pipelines
+    (upload, decodificação, arquivo, Gemini, JSON, banco, relatório, sugestão),
+    requisições por rota e status, e medidores de trabalho em andamento.
+    """
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 @app.get("/", tags=["Health Check"])                            # Endpoint de verificação de saúde (health check) para confirmar que a API está online.
 async def root():
@@ -0,0 +1,144 @@
+import time
+import threading
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# --- Métricas no formato texto do Prometheus (GET /metrics) ---
+# Tudo fica em memória, por processo: com vários workers do uvicorn, cada
+# processo expõe os seus números e o Prometheus soma pelas séries.
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _rotulos_texto(nomes, valores) -> str:
+    if not nomes:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)) + "}"
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self._valores = {}
+        self._lock = threading.Lock()
+        _registro.append(self)
+
+    def _chave(self, rotulos: dict) -> tuple:
+        return tuple(rotulos.get(nome, "") for nome in self.rotulos)
+
+    def exportar(self) -> str:
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        with self._lock:
+            for chave, valor in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_rotulos_texto(self.rotulos, chave)} {valor}")
+        return "\n".join(linhas)
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+class Medidor(_Metrica):
+    """Gauge: valor que sobe e desce (ex: requisições em andamento)."""
+    tipo = "gauge"
+
+    def somar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    @contextmanager
+    def em_andamento(self, **rotulos):
+        self.somar(1, **rotulos)
+        try:
+            yield
+        finally:
+            self.somar(-1, **rotulos)
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, descricao: str, rotulos: tuple = (), limites: tuple = LIMITES_SEGUNDOS):
+        super().__init__(nome, descricao, rotulos)
+        self.limites = limites
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                serie = self._valores[chave] = {"baldes": [0] * len(self.limites), "soma": 0.0, "total": 0}
+            indice = bisect_left(self.limites, valor)
+            if indice < len(self.limites):
+                serie["baldes"][indice] += 1                        # Acumulado só na exportação
+            serie["soma"] += valor
+            serie["total"] += 1
+
+    @contextmanager
+    def medir(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def exportar(self) -> str:
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        nomes_le = self.rotulos + ("le",)
+        with self._lock:
+            for chave, serie in sorted(self._valores.items()):
+                acumulado = 0
+                for limite, quantidade in zip(self.limites, serie["baldes"]):
+                    acumulado += quantidade
+                    linhas.append(f"{self.nome}_bucket{_rotulos_texto(nomes_le, chave + (limite,))} {acumulado}")
+                linhas.append(f"{self.nome}_bucket{_rotulos_texto(nomes_le, chave + ('+Inf',))} {serie['total']}")
+                linhas.append(f"{self.nome}_sum{_rotulos_texto(self.rotulos, chave)} {serie['soma']}")
+                linhas.append(f"{self.nome}_count{_rotulos_texto(self.rotulos, chave)} {serie['total']}")
+        return "\n".join(linhas)
+
+_registro = []
+
+def exportar() -> str:
+    return "\n".join(metrica.exportar() for metrica in _registro) + "\n"
+
+# --- Métricas da aplicação ---
+duracao_etapa = Histograma(
+    "saai_etapa_duracao_segundos",
+    "Duração de cada etapa dos pipelines de análise e de relatório.",
+    ("etapa",)
+)
+requisicoes = Contador(
+    "saai_requisicoes_total",
+    "Requisições HTTP atendidas, por rota e status.",
+    ("metodo", "rota", "status")
+)
+duracao_requisicao = Histograma(
+    "saai_requisicao_duracao_segundos",
+    "Duração das requisições HTTP (até o envio dos cabeçalhos), por rota.",
+    ("metodo", "rota")
+)
+requisicoes_em_andamento = Medidor(
+    "saai_requisicoes_em_andamento",
+    "Requisições HTTP sendo atendidas neste processo."
+)
+chamadas_llm = Contador(
+    "saai_chamadas_gemini_total",
+    "Chamadas à API do Gemini, por resultado (sucesso, erro_temporario, erro).",
+    ("resultado",)
+)
+chamadas_llm_em_andamento = Medidor(
+    "saai_chamadas_gemini_em_andamento",
+    "Chamadas à API do Gemini aguardando resposta neste processo."
+)
+
+def medir_etapa(etapa: str):
+    """Uso: 'with metricas.medir_etapa("chamada_gemini"): ...'"""
+    return duracao_etapa.medir(etapa=etapa)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Enum, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, Enum, ForeignKey, Text, Index, Boolean, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -16,6 +16,12 @@ class StatusRelatorioEnum(str, enum.Enum):
     REVISADO = "REVISADO"
     APROVADO = "APROVADO"
 
+class StatusJobEnum(str, enum.Enum):
+    PENDENTE = "PENDENTE"
+    PROCESSANDO = "PROCESSANDO"
+    CONCLUIDO = "CONCLUIDO"
+    ERRO = "ERRO"
+
 class Relatorio(Base):
     __tablename__ = "relatorios"
 
@@ -31,6 +37,11 @@ class Relatorio(Base):
     
     # Este é o campo que o nutricionista edita
     comentarios_nutricionista = Column(Text, nullable=True)
+
+    # Última sugestão gerada pela IA e a chave (hash de resumo + prompt + modelo) usada para gerá-la
+    sugestao_ia = Column(Text, nullable=True)
+    sugestao_ia_chave = Column(String(64), nullable=True)
+    sugestao_ia_gerada_em = Column(DateTime, nullable=True)
     
     status = Column(Enum(StatusRelatorioEnum), default=StatusRelatorioEnum.PENDENTE)
     data_criacao = Column(DateTime, default=datetime.utcnow)
@@ -40,6 +51,18 @@ class Relatorio(Base):
     usuario_comum = relationship("UsuarioComum", back_populates="relatorios")
     nutricionista = relationship("Nutricionista", back_populates="relatorios_gerados")
 
+    __table_args__ = (
+        # Busca do relatório PENDENTE de um período (criar_relatorio)
+        Index("ix_relatorios_usuario_periodo_status", "usuario_comum_id", "periodo_inicio", "periodo_fim", "status"),
+        # Relatórios APROVADOS de um usuário, mais recentes primeiro
+        Index("ix_relatorios_usuario_status_aprovacao", "usuario_comum_id", "status", "data_aprovacao"),
+        # No máximo um relatório PENDENTE por usuário e período (vários workers criando ao mesmo tempo)
+        Index(
+            "uq_relatorios_pendente_usuario_periodo", "usuario_comum_id", "periodo_inicio", "periodo_fim",
+            unique=True, postgresql_where=text("status = 'PENDENTE'")
+        ),
+    )
+
 class Usuario(Base):
     __tablename__ = "usuarios"
 
@@ -91,16 +114,84 @@ class Refeicao(Base):
     usuario_comum = relationship("UsuarioComum", back_populates="refeicoes")
     itens = relationship("RefeicaoItem", back_populates="refeicao", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Refeições de um usuário num período (relatórios e histórico)
+        Index("ix_refeicoes_usuario_data_hora", "usuario_comum_id", "data_hora"),
+    )
+
 class RefeicaoItem(Base):
     __tablename__ = "refeicao_itens"
 
     id = Column(Integer, primary_key=True, index=True)
-    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"))
+    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), index=True)   # Usado no join com 'refeicoes'
     nome_alimento = Column(String, index=True)
     quantidade = Column(Float)
     calorias = Column(Float)
     proteinas = Column(Float)
     carboidratos = Column(Float)
     gordura = Column(Float)
+    alimento_referencia = Column(String, nullable=True)             # Alimento da tabela de composição usado nos nutrientes (None: valores da IA)
+    divergencia_ia = Column(Boolean, nullable=False, default=False, server_default="false")   # Estimativa da IA muito longe da tabela
     
-    refeicao = relationship("Refeicao", back_populates="itens")
\ No newline at end of file
+    refeicao = relationship("Refeicao", back_populates="itens")
+class AnaliseCache(Base):
+    __tablename__ = "analises_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    hash_conteudo = Column(String(64), nullable=False)                           # SHA-256 dos bytes da imagem
+    versao_analise = Column(String(16), nullable=False)                          # Prompt/formato/modelo que gerou a resposta
+    hash_perceptual = Column(String(16), index=True, nullable=True)              # dHash de 64 bits (quase-duplicatas)
+    imagem_url = Column(String, nullable=True)                                   # Arquivo já salvo em uploads/
+    llm_raw_response = Column(JSONB, nullable=False)                             # Resposta da IA reaproveitada nos acertos
+    acessos = Column(Integer, default=0)
+    data_criacao = Column(DateTime, default=datetime.utcnow)
+    ultimo_acesso = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Uma análise por imagem e versão (ON CONFLICT em cache_service.armazenar)
+        Index("uq_analises_cache_hash_versao", "hash_conteudo", "versao_analise", unique=True),
+    )
+
+class AnaliseJob(Base):
+    __tablename__ = "analise_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_comum_id = Column(Integer, ForeignKey("usuarios_comuns.id"))
+    arquivo = Column(JSONB, nullable=False)                     # Imagem já salva em uploads/ (caminho, hash, tamanho...)
+    status = Column(Enum(StatusJobEnum), default=StatusJobEnum.PENDENTE, index=True)
+    tentativas = Column(Integer, default=0)
+    erro = Column(Text, nullable=True)
+    refeicao_id = Column(Integer, ForeignKey("refeicoes.id"), nullable=True)
+
+    data_criacao = Column(DateTime, default=datetime.utcnow)
+    data_inicio = Column(DateTime, nullable=True)               # Quando um worker pegou o job (usado para recuperar jobs travados)
+    disponivel_em = Column(DateTime, nullable=True)             # Depois de uma falha temporária, só volta a ser pego a partir daqui (backoff)
+    data_conclusao = Column(DateTime, nullable=True)
+
+    refeicao = relationship("Refeicao")
+
+class ResumoNutricionalDiario(Base):
+    # Totais pré-agregados por usuário e dia (mantidos junto com as refeições)
+    __tablename__ = "resumos_nutricionais_diarios"
+
+    usuario_comum_id = Column(Integer, ForeignKey("usuarios_comuns.id"), primary_key=True)
+    dia = Column(Date, primary_key=True, index=True)                # index: lote de relatórios lê um período de todos os usuários
+    refeicoes = Column(Integer, nullable=False, default=0)
+    calorias = Column(Float, nullable=False, default=0)
+    proteinas = Column(Float, nullable=False, default=0)
+    carboidratos = Column(Float, nullable=False, default=0)
+    gordura = Column(Float, nullable=False, default=0)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ChaveIdempotencia(Base):
+    # Resposta guardada por Idempotency-Key: reenvios do mesmo POST recebem a mesma resposta
+    __tablename__ = "chaves_idempotencia"
+
+    usuario_comum_id = Column(Integer, primary_key=True)
+    rota = Column(String(64), primary_key=True)
+    chave = Column(String(255), primary_key=True)
+    impressao = Column(String(64), nullable=False)                  # SHA-256 do conteúdo da requisição (mesma chave, outro pedido = erro)
+    status_code = Column(Integer, nullable=True)                    # None enquanto a primeira requisição está em andamento
+    resposta = Column(JSONB, nullable=True)
+    data_criacao = Column(DateTime, default=datetime.utcnow)
+    expira_em = Column(DateTime, nullable=False, index=True)
@@ -1,7 +1,10 @@
-from pydantic import BaseModel, HttpUrl, ConfigDict
+from pydantic import BaseModel, HttpUrl, ConfigDict, computed_field, field_validator
 from typing import List, Optional
 from datetime import datetime, date
 import enum
+import re
+
+from ..caminhos_imagens import url_variante
 
 # --- Enums (para validação de dados) ---
 # É uma boa prática redefinir os Enums aqui para 
@@ -11,6 +14,12 @@ class StatusRelatorioEnum(str, enum.Enum):
     REVISADO = "REVISADO"
     APROVADO = "APROVADO"
 
+class StatusJobEnum(str, enum.Enum):
+    PENDENTE = "PENDENTE"
+    PROCESSANDO = "PROCESSANDO"
+    CONCLUIDO = "CONCLUIDO"
+    ERRO = "ERRO"
+
 # --- Schemas de Input (O que você já tinha) ---
 
 class ImageUrlAnalysisRequest(BaseModel):
@@ -23,6 +32,37 @@ class PromptRequest(BaseModel):
 class ImageAnalysisRequest(BaseModel):
     image_urls: List[HttpUrl]
 
+# --- Resposta da IA (análise de imagem) ---
+# O Gemini é instruído a seguir este formato (response_schema) e a resposta é
+# validada aqui antes de ir para o banco. Os nomes seguem o JSON da IA (em inglês).
+
+class AlimentoIA(BaseModel):
+    name: str
+    amount: float = 0.0
+    calories: float = 0.0
+    proteins: float = 0.0
+    carbohydrates: float = 0.0
+    fats: float = 0.0
+
+    @field_validator("amount", "calories", "proteins", "carbohydrates", "fats", mode="before")
+    @classmethod
+    def _numero(cls, valor):
+        # Conserta formatos comuns de texto ("12 g", "3,5", null) em vez de rejeitar
+        if valor is None:
+            return 0
+        if isinstance(valor, str):
+            encontrado = re.search(r"-?\d+(?:[.,]\d+)?", valor)
+            return float(encontrado.group().replace(",", ".")) if encontrado else 0
+        return valor
+
+    @field_validator("amount", "calories", "proteins", "carbohydrates", "fats")
+    @classmethod
+    def _nao_negativo(cls, valor):
+        return max(0.0, valor)
+
+class AnaliseIA(BaseModel):
+    food: List[AlimentoIA] = []
+
 # --- Schemas de Output (Novos) ---
 # Estes são para ENVIAR dados do banco para o frontend (ex: em um GET)
 
@@ -34,6 +74,8 @@ class RefeicaoItem(BaseModel):
     proteinas: float
     carboidratos: float
     gordura: float
+    alimento_referencia: Optional[str] = None # Alimento da tabela de composição (None: valores estimados pela IA)
+    divergencia_ia: bool = False # A estimativa da IA ficou muito longe da tabela
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -46,10 +88,59 @@ class Refeicao(BaseModel):
     itens: List[RefeicaoItem] = [] # Uma lista de alimentos
 
     model_config = ConfigDict(from_attributes=True)
+
+    # Versões WebP reduzidas, para listas (miniatura) e detalhe (prévia); None em imagens antigas
+    @computed_field
+    @property
+    def imagem_miniatura_url(self) -> Optional[str]:
+        return url_variante(self.imagem_url, "miniatura")
+
+    @computed_field
+    @property
+    def imagem_previa_url(self) -> Optional[str]:
+        return url_variante(self.imagem_url, "previa")
     
+class PaginaRefeicoes(BaseModel):
+    # Página do histórico; envie 'proximo_cursor' como '?cursor=' para continuar
+    refeicoes: List[Refeicao]
+    proximo_cursor: Optional[str] = None # None: não há mais páginas
+
+class ResultadoAnaliseLote(BaseModel):
+    # Resultado de uma imagem dentro de um lote (falhas não derrubam o lote)
+    indice: int
+    origem: str # URL ou nome do arquivo enviado
+    sucesso: bool
+    refeicao: Optional[Refeicao] = None
+    erro: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    total: int
+    sucessos: int
+    falhas: int
+    resultados: List[ResultadoAnaliseLote]
+
+class JobAnaliseCriado(BaseModel):
+    # Resposta 202 do modo assíncrono de análise
+    job_id: int
+    status: StatusJobEnum
+    status_url: str
+
+class JobAnalise(BaseModel):
+    # Situação de um job de análise na fila
+    id: int
+    status: StatusJobEnum
+    tentativas: int
+    erro: Optional[str] = None
+    data_criacao: datetime
+    data_conclusao: Optional[datetime] = None
+    refeicao: Optional[Refeicao] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class SugestaoRelatorioResponse(BaseModel):
     # O texto de sugestão gerado pela IA
     sugestao_texto: str
+    do_cache: bool = False # True quando reaproveitada do relatório, sem nova chamada à IA
 
 class Relatorio(BaseModel):
     # Dita como um objeto de relatório deve ser enviado
@@ -66,6 +157,11 @@ class Relatorio(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class PaginaRelatorios(BaseModel):
+    # Página dos relatórios aprovados; envie 'proximo_cursor' como '?cursor=' para continuar
+    relatorios: List[Relatorio]
+    proximo_cursor: Optional[str] = None # None: não há mais páginas
+
 # --- Schemas de Input (Novos) ---
 # Estes são para RECEBER dados do frontend (ex: em um PUT ou POST)
 
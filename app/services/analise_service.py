@@ -1,25 +1,35 @@
 import os
+import io
+import re
 import json
-import uuid
-import google.generativeai as genai
+import time
+import hashlib
+import threading
 
+from datetime import date, datetime
+from typing import Callable, FrozenSet, List, Optional
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from PIL import Image
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
+from PIL import Image, ImageOps
+from .. import metricas
+from ..database import SessionLocal
 from ..models import models as db_models
+from ..schemas import schemas
+from . import cache_service, composicao_service, limitador_llm, paginacao, provedor_llm, resumo_diario_service, visoes
 
-# --- Inicialização do Modelo Generativo (Gemini) ---
-try:
-    api_key = os.getenv("GEMINI_API_KEY")                           # Busca a chave da API a partir das variáveis de ambiente
-    if not api_key:
-        raise ValueError("Chave da API do Google não encontrada no .env")
-    
-    genai.configure(api_key=api_key)                                # Configura a biblioteca do Google AI com a chave fornecida
-    model = genai.GenerativeModel('gemini-2.5-flash')          # Instancia o modelo generativo que será utilizado nas requisições
+# --- Pré-processamento das imagens enviadas à IA ---
+IMAGEM_LADO_MAX = int(os.getenv("IMAGEM_LADO_MAX", "1024"))                  # Maior lado (px) da imagem enviada ao Gemini
+IMAGEM_QUALIDADE_JPEG = int(os.getenv("IMAGEM_QUALIDADE_JPEG", "85"))
+IMAGEM_MAX_PIXELS = int(os.getenv("IMAGEM_MAX_PIXELS", "40000000"))          # Proteção contra "decompression bombs"
+
+Image.MAX_IMAGE_PIXELS = IMAGEM_MAX_PIXELS                                    # O próprio PIL recusa imagens muito acima do limite
 
-except Exception as e:                                              # Em caso de falha na inicialização, a API não funcionará corretamente.
-    print(f"ERRO CRÍTICO ao inicializar o modelo Gemini: {e}")      # Loga um erro crítico e define o modelo como None.
-    model = None
+_estatisticas_preprocessamento = {"imagens": 0, "bytes_originais": 0, "bytes_enviados": 0}
+_estatisticas_lock = threading.Lock()
+
+# Modelo usado na análise de imagem (criado sob demanda pelo provedor_llm)
+MODELO_IMAGEM = provedor_llm.MODELO_PADRAO
 
 # Define um prompt padrão e detalhado para guiar a IA a retornar um JSON estruturado.
 prompt_padrao_imagem = """
@@ -36,6 +46,51 @@ If a macronutrient is not applicable, cannot be estimated or has none, return a
 If the image contains no food, return an empty 'food' list.
 """
 
+# Formato exigido do Gemini (modo JSON): o mesmo de schemas.AnaliseIA
+_esquema_alimento = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "amount": {"type": "number"},
+        "carbohydrates": {"type": "number"},
+        "proteins": {"type": "number"},
+        "fats": {"type": "number"},
+    },
+    "required": ["name", "amount", "carbohydrates", "proteins", "fats"],
+}
+configuracao_geracao = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "object",
+        "properties": {"food": {"type": "array", "items": _esquema_alimento}},
+        "required": ["food"],
+    },
+}
+
+# Último recurso quando nem o conserto local salva a resposta: só texto, sem reenviar a imagem
+prompt_correcao_json = """
+The text below should be a JSON object with a list named 'food', where each item has
+'name' (string) and 'amount', 'carbohydrates', 'proteins', 'fats' (numbers).
+It failed validation with this error: {erro}
+
+Return ONLY the corrected JSON object, keeping the original values.
+
+TEXT:
+{texto}
+"""
+
+# Versão da análise (prompt + formato + modelo), gravada no cache: ao mudar qualquer um
+# deles, as respostas antigas param de ser reaproveitadas
+VERSAO_ANALISE = hashlib.sha256(
+    json.dumps([prompt_padrao_imagem, configuracao_geracao, MODELO_IMAGEM], sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
+
+# Estimativa de tokens por análise (imagem reduzida + prompt + resposta); corrigida pelo uso real
+TOKENS_ESTIMADOS_IMAGEM = 1500
+TOKENS_ESTIMADOS_CORRECAO = 800
+
+_estatisticas_respostas = {"respostas": 0, "validas": 0, "consertadas_localmente": 0, "corrigidas_pela_ia": 0, "invalidas": 0}
+
 # Configuração de segurança usando Strings
 safety_settings = [
     {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
@@ -44,99 +99,385 @@ safety_settings = [
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
 ]
 
-def analisar_imagem_e_salvar(db: Session, usuario_id: int, imagem_pil: Image.Image):
+def analisar_imagem_e_salvar(
+    db: Session,
+    usuario_id: int,
+    arquivo: dict,
+    antes_do_commit: Optional[Callable[[List[int]], None]] = None
+):
     """
-    Serviço principal:
-    1. Salva a imagem no disco.
-    2. Envia para a LLM.
-    3. Salva o resultado completo no banco de dados.
+    Serviço principal ('arquivo' já foi gravado em uploads/ por armazenamento_service):
+    1. Consulta o cache de análises pelo hash da imagem.
+    2. Em caso de erro no cache: reduz a imagem e envia para a LLM.
+    3. Salva o resultado completo no banco de dados ('antes_do_commit' como em persistir_refeicoes).
     """
-    
-    if not model:
-        raise HTTPException(status_code=500, detail="Modelo de IA não inicializado.")
-    
     try:
-        # Normaliza extensões de arquivo
-        file_extension = imagem_pil.format.lower() if imagem_pil.format else 'jpg'
-        if file_extension == 'jpeg':
-            file_extension = 'jpg'
-
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"        # Gera um nome de arquivo único para evitar sobreposição
-        
-        filepath = os.path.join("uploads", unique_filename)         # Define o caminho de salvamento no sistema de arquivos
-        
-        imagem_pil.save(filepath)                                   # Salva a imagem no disco
-        
-        image_url_path = f"uploads/{unique_filename}"               # Define o caminho da URL que será salvo no banco
-        
-        # Envia Imagem para a LLM (Com tratamento de erro)
-        try:
-            response = model.generate_content(
-                [prompt_padrao_imagem, imagem_pil],
-                safety_settings=safety_settings
-            )
-        except Exception as api_error:
-            print(f"❌ ERRO NA CHAMADA DA API DO GOOGLE: {api_error}")
-            # Verifica se é erro de cota (429)
-            if "429" in str(api_error):
-                raise HTTPException(status_code=429, detail="Limite de requisições excedido. Tente mais devagar.")
-            raise api_error
-
-        # Validar Resposta da IA
-        print(f"   Feedback da IA: {response.prompt_feedback}")
-        
-        try:
-            texto_resposta = response.text
-        except ValueError:
-            # Se cair aqui, a IA bloqueou por segurança e não retornou texto
-            print("❌ ERRO: A IA bloqueou a resposta (response.text inválido).")
-            print(f"Motivo do bloqueio: {response.prompt_feedback}")
-            raise HTTPException(status_code=400, detail="A IA recusou processar esta imagem por motivos de segurança.")
-
-        print(f"   Texto bruto recebido: {texto_resposta[:50]}...") # Mostra só o começo
-        
-        # "Limpa" a Resposta JSON
-        cleaned_text = texto_resposta.strip().strip('```json').strip('```').strip()
-                                    
-        try:
-            data = json.loads(cleaned_text)                         # 'data' é o nosso objeto JSON (dicionário Python)
-        except json.JSONDecodeError:
-            print(f"❌ ERRO JSON: Não foi possível converter o texto: {cleaned_text}")
-            raise HTTPException(status_code=500, detail="IA retornou um formato inválido.")
-        
-        # Cria a "Refeição" principal
-        nova_refeicao = db_models.Refeicao(
-            usuario_comum_id=usuario_id,
-            llm_raw_response=data,                                  # Salva o JSON bruto da IA
-            imagem_url=image_url_path                               # Salva o caminho para a imagem
-        )
-        db.add(nova_refeicao)
-        db.flush()                                                  # Necessário para que 'nova_refeicao' obtenha um ID
-        
-        # Cria os "Itens da Refeição" (os alimentos)
-        for item in data.get("food", []):
-            novo_item = db_models.RefeicaoItem(
-                refeicao_id=nova_refeicao.id,                       # Vincula ao ID da refeição
-                nome_alimento=item.get("name"),
-                quantidade=item.get("amount", 0),
-                calorias=item.get("calories", 0),                   # Mesmo que o prompt não peça,
-                proteinas=item.get("proteins", 0),
-                carboidratos=item.get("carbohydrates", 0),
-                gordura=item.get("fats", 0)                         # O JSON tem 'fats', o DB tem 'gordura'
-            )
-            db.add(novo_item)
-        
-        # Confirma todas as mudanças no banco de dados
-        db.commit()
-        db.refresh(nova_refeicao) # Atualiza o objeto com os dados do DB
-        
-        print(f"✅ Refeição ID {nova_refeicao.id} salva. Imagem em: {image_url_path}")
-        return nova_refeicao
+        analise = obter_analise(db, arquivo)
+        return persistir_refeicoes(db, usuario_id, [analise], antes_do_commit=antes_do_commit)[0]
         
     except json.JSONDecodeError:
         db.rollback() # Desfaz qualquer mudança no banco se o JSON falhar
         raise HTTPException(status_code=500, detail="A resposta da IA não era um JSON válido.")
+    except HTTPException:
+        db.rollback() # Erros já tratados (413, 429, 400...) seguem com o status original
+        raise
     except Exception as e:
         db.rollback() # Desfaz qualquer mudança se qualquer outro erro ocorrer
         print(f"❌ Erro no serviço de análise: {e}")
-        raise HTTPException(status_code=500, detail=f"Erro interno ao processar a análise: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro interno ao processar a análise: {str(e)}")
+
+def obter_analise(db: Session, arquivo: dict) -> dict:
+    """
+    Etapa de análise (não grava a refeição):
+    devolve o JSON da IA, vindo do cache ou de uma nova chamada à LLM.
+    """
+    if not provedor_llm.obter_modelo(MODELO_IMAGEM):
+        raise HTTPException(status_code=500, detail="Modelo de IA não inicializado.")
+
+    hash_conteudo = arquivo["hash_conteudo"]
+
+    imagem_modelo = None
+    hash_perceptual = None
+    if cache_service.CACHE_PERCEPTUAL:
+        # O hash perceptual é calculado sobre a versão reduzida (bem mais barato)
+        imagem_modelo = _preprocessar_arquivo(arquivo)
+        hash_perceptual = cache_service.calcular_hash_perceptual(imagem_modelo["imagem"])
+
+    entrada_cache = cache_service.buscar(db, VERSAO_ANALISE, hash_conteudo, hash_perceptual)
+
+    if entrada_cache:
+        # Mesma imagem (ou quase idêntica) já analisada: reaproveita só a resposta da IA;
+        # a refeição fica com a imagem desta requisição (a do cache pode ser de outro usuário)
+        print(f"♻️  Cache de análise: reaproveitando a análise de {entrada_cache['hash_conteudo']}")
+        return {
+            "hash_conteudo": hash_conteudo,
+            "hash_perceptual": hash_perceptual,
+            "imagem_url": arquivo["imagem_url"],
+            "llm_raw_response": entrada_cache["llm_raw_response"],
+            "do_cache": True,
+        }
+
+    # Encerra a transação da consulta ao cache: a conexão volta ao pool
+    # em vez de ficar presa durante o pré-processamento e a chamada à IA
+    db.commit()
+
+    if imagem_modelo is None:
+        imagem_modelo = _preprocessar_arquivo(arquivo)
+
+    return {
+        "hash_conteudo": hash_conteudo,
+        "hash_perceptual": hash_perceptual,
+        "imagem_url": arquivo["imagem_url"],
+        "llm_raw_response": _analisar_com_llm(imagem_modelo["blob"]),
+        "do_cache": False,
+    }
+
+def obter_analise_isolada(arquivo: dict) -> dict:
+    """
+    Igual a obter_analise, mas com uma sessão própria e curta: usada quando várias
+    análises rodam em paralelo (lote), já que uma Session não é thread-safe.
+    """
+    db = SessionLocal()
+    try:
+        analise = obter_analise(db, arquivo)
+        db.commit()                                                 # Grava o contador de acessos do cache
+        return analise
+    finally:
+        db.close()
+
+def persistir_refeicoes(
+    db: Session,
+    usuario_id: int,
+    analises: List[dict],
+    carregar_itens: bool = False,
+    antes_do_commit: Optional[Callable[[List[int]], None]] = None
+) -> List[db_models.Refeicao]:
+    """
+    Etapa de persistência: grava todas as refeições e seus itens numa única
+    transação, com inserts em lote (uma instrução para refeições, outra para itens).
+    Com 'carregar_itens', os itens voltam já carregados numa única consulta extra.
+    'antes_do_commit' recebe os IDs criados e pode gravar mais coisas na mesma transação.
+    """
+    if not analises:
+        return []
+
+    inicio = time.perf_counter()
+    agora = datetime.utcnow()
+
+    # Cria as "Refeições" principais (RETURNING devolve os IDs na ordem enviada)
+    refeicao_ids = db.execute(
+        insert(db_models.Refeicao).returning(db_models.Refeicao.id, sort_by_parameter_order=True),
+        [
+            {
+                "usuario_comum_id": usuario_id,
+                "data_hora": agora,
+                "llm_raw_response": analise["llm_raw_response"],    # Salva o JSON bruto da IA
+                "imagem_url": analise["imagem_url"],                # Salva o caminho para a imagem
+            }
+            for analise in analises
+        ]
+    ).scalars().all()
+
+    # Cria os "Itens da Refeição" (os alimentos); os nutrientes saem da tabela de composição
+    itens = [
+        {
+            "refeicao_id": refeicao_id,                             # Vincula ao ID da refeição
+            "nome_alimento": item.get("name"),
+            "quantidade": item.get("amount", 0),
+            **composicao_service.calcular_nutrientes(item.get("name"), item.get("amount", 0), {
+                "calorias": item.get("calories", 0),
+                "proteinas": item.get("proteins", 0),
+                "carboidratos": item.get("carbohydrates", 0),
+                "gordura": item.get("fats", 0),                     # O JSON tem 'fats', o DB tem 'gordura'
+            }),
+        }
+        for refeicao_id, analise in zip(refeicao_ids, analises)
+        for item in analise["llm_raw_response"].get("food", [])
+    ]
+    if itens:
+        db.execute(insert(db_models.RefeicaoItem), itens)
+
+    # Atualiza o resumo nutricional diário na mesma transação
+    resumo_diario_service.registrar_refeicoes(db, usuario_id, [
+        {"dia": agora.date(), "itens": [item for item in itens if item["refeicao_id"] == refeicao_id]}
+        for refeicao_id in refeicao_ids
+    ])
+
+    entradas_novas = [
+        cache_service.armazenar(db, VERSAO_ANALISE, a["hash_conteudo"], a["hash_perceptual"], a["imagem_url"], a["llm_raw_response"])
+        for a in analises if not a["do_cache"]
+    ]
+
+    if antes_do_commit:
+        antes_do_commit(refeicao_ids)
+
+    # Confirma todas as mudanças no banco de dados
+    db.commit()
+    metricas.duracao_etapa.observar(time.perf_counter() - inicio, etapa="gravacao_banco")
+
+    for entrada in entradas_novas:
+        cache_service.guardar_em_memoria(entrada)                  # Só entra no LRU depois do commit
+
+    consulta = db.query(db_models.Refeicao).filter(db_models.Refeicao.id.in_(refeicao_ids))
+    if carregar_itens:
+        consulta = consulta.options(selectinload(db_models.Refeicao.itens))
+    refeicoes = consulta.all()
+    por_id = {refeicao.id: refeicao for refeicao in refeicoes}
+
+    for refeicao_id, analise in zip(refeicao_ids, analises):
+        print(f"✅ Refeição ID {refeicao_id} salva. Imagem em: {analise['imagem_url']}")
+
+    return [por_id[refeicao_id] for refeicao_id in refeicao_ids]
+
+def remover_refeicao(db: Session, refeicao_id: int):
+    """
+    Remove uma refeição (e seus itens) e recalcula o resumo diário do dia dela.
+    """
+    refeicao = db.query(db_models.Refeicao).filter(db_models.Refeicao.id == refeicao_id).first()
+
+    if not refeicao:
+        raise HTTPException(status_code=404, detail="Refeição não encontrada")
+
+    dia_afetado = (refeicao.usuario_comum_id, refeicao.data_hora.date())
+
+    # Jobs da fila que apontam para a refeição perdem a referência (a FK não permitiria remover)
+    db.query(db_models.AnaliseJob).filter(
+        db_models.AnaliseJob.refeicao_id == refeicao_id
+    ).update({db_models.AnaliseJob.refeicao_id: None}, synchronize_session=False)
+
+    db.delete(refeicao)                                             # 'cascade' remove os itens junto
+    db.flush()
+
+    resumo_diario_service.recalcular_dias(db, [dia_afetado])
+    db.commit()
+
+    print(f"🗑️  Refeição ID {refeicao_id} removida.")
+
+def listar_refeicoes(
+    db: Session,
+    usuario_id: int,
+    limite: int = paginacao.LIMITE_PADRAO,
+    cursor: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    campos: FrozenSet[str] = visoes.REFEICAO.campos
+) -> dict:
+    """
+    Histórico de refeições do usuário, das mais recentes para as mais antigas.
+    Os itens de todas as refeições da página vêm numa única consulta (selectinload).
+    Só carrega o JSON bruto da IA e os itens se estiverem em 'campos'.
+    """
+    consulta = db.query(db_models.Refeicao).options(
+        *visoes.REFEICAO.opcoes_consulta(campos)
+    ).filter(db_models.Refeicao.usuario_comum_id == usuario_id)
+
+    consulta = paginacao.filtrar_periodo(consulta, db_models.Refeicao.data_hora, data_inicio, data_fim)
+    refeicoes, proximo_cursor = paginacao.paginar(
+        consulta, db_models.Refeicao.data_hora, db_models.Refeicao.id, limite, cursor
+    )
+
+    return {"refeicoes": refeicoes, "proximo_cursor": proximo_cursor}
+
+def _preprocessar_arquivo(arquivo: dict) -> dict:
+    # Abre o arquivo já salvo; só a miniatura destinada à IA é decodificada
+    with metricas.medir_etapa("decodificacao_imagem"), Image.open(arquivo["caminho"]) as imagem_pil:
+        return preprocessar_imagem(imagem_pil, arquivo["tamanho"])
+
+def preprocessar_imagem(imagem_pil: Image.Image, bytes_originais: int) -> dict:
+    """
+    Prepara a imagem que vai para a LLM:
+    1. Recusa imagens com pixels demais (decompression bomb).
+    2. Em JPEG, usa o modo 'draft' para decodificar já reduzido (1/2, 1/4, 1/8).
+    3. Corrige a orientação EXIF e reduz ao lado máximo configurado.
+    4. Re-codifica em JPEG sem metadados.
+    Retorna a imagem reduzida, o blob enviado ao Gemini e os bytes economizados.
+    """
+    largura, altura = imagem_pil.size                                # Vem do cabeçalho, sem decodificar a imagem
+    if largura * altura > IMAGEM_MAX_PIXELS:
+        raise HTTPException(status_code=413, detail="Imagem grande demais para ser processada.")
+
+    if imagem_pil.format == "JPEG":
+        imagem_pil.draft("RGB", (IMAGEM_LADO_MAX, IMAGEM_LADO_MAX))  # Só funciona antes do load()
+
+    imagem = ImageOps.exif_transpose(imagem_pil)                      # Aplica a orientação e descarta a tag EXIF
+    imagem.thumbnail((IMAGEM_LADO_MAX, IMAGEM_LADO_MAX), Image.Resampling.LANCZOS)
+
+    if imagem.mode != "RGB":
+        imagem = imagem.convert("RGB")
+
+    buffer = io.BytesIO()
+    imagem.save(buffer, format="JPEG", quality=IMAGEM_QUALIDADE_JPEG, optimize=True)  # Sem 'exif=': metadados ficam de fora
+    dados = buffer.getvalue()
+
+    bytes_economizados = bytes_originais - len(dados)
+    with _estatisticas_lock:
+        _estatisticas_preprocessamento["imagens"] += 1
+        _estatisticas_preprocessamento["bytes_originais"] += bytes_originais
+        _estatisticas_preprocessamento["bytes_enviados"] += len(dados)
+
+    print(f"   Pré-processamento: {largura}x{altura} -> {imagem.width}x{imagem.height}, "
+          f"{bytes_originais} -> {len(dados)} bytes (economia de {bytes_economizados} bytes)")
+
+    return {
+        "imagem": imagem,
+        "blob": {"mime_type": "image/jpeg", "data": dados},
+        "bytes_economizados": bytes_economizados,
+    }
+
+def estatisticas_preprocessamento() -> dict:
+    with _estatisticas_lock:
+        estatisticas = dict(_estatisticas_preprocessamento)
+    estatisticas["bytes_economizados"] = estatisticas["bytes_originais"] - estatisticas["bytes_enviados"]
+    return estatisticas
+
+def _analisar_com_llm(imagem_modelo: dict) -> dict:
+    """
+    Envia a versão reduzida da imagem para a LLM e devolve o JSON da IA.
+    """
+    # Envia Imagem para a LLM (passando pelo limitador de cota compartilhado)
+    try:
+        response = limitador_llm.executar(
+            provedor_llm.obter_modelo(MODELO_IMAGEM).generate_content,
+            [prompt_padrao_imagem, imagem_modelo],
+            safety_settings=safety_settings,
+            generation_config=configuracao_geracao,                 # Modo JSON com o formato exigido
+            tokens_estimados=TOKENS_ESTIMADOS_IMAGEM
+        )
+    except limitador_llm.FilaLLMEsgotada:
+        raise HTTPException(status_code=429, detail="Limite de requisições excedido. Tente mais devagar.")
+    except Exception as api_error:
+        print(f"❌ ERRO NA CHAMADA DA API DO GOOGLE: {api_error}")
+        # Erro de cota que persistiu mesmo após as novas tentativas
+        if limitador_llm.eh_erro_temporario(api_error):
+            raise HTTPException(status_code=429, detail="Limite de requisições excedido. Tente mais devagar.")
+        raise api_error
+
+    # Validar Resposta da IA
+    print(f"   Feedback da IA: {response.prompt_feedback}")
+    
+    try:
+        texto_resposta = response.text
+    except ValueError:
+        # Se cair aqui, a IA bloqueou por segurança e não retornou texto
+        print("❌ ERRO: A IA bloqueou a resposta (response.text inválido).")
+        print(f"Motivo do bloqueio: {response.prompt_feedback}")
+        raise HTTPException(status_code=400, detail="A IA recusou processar esta imagem por motivos de segurança.")
+
+    print(f"   Texto bruto recebido: {texto_resposta[:50]}...") # Mostra só o começo
+
+    with metricas.medir_etapa("interpretacao_json"):
+        return _interpretar_resposta(texto_resposta)
+
+def _validar_json(texto: str) -> dict:
+    # Lança json.JSONDecodeError ou pydantic.ValidationError (ambos ValueError)
+    dados = json.loads(texto)
+    if isinstance(dados, list):
+        dados = {"food": dados}                                     # Lista solta de alimentos
+    return schemas.AnaliseIA.model_validate(dados).model_dump()
+
+def _consertar_json(texto: str) -> str:
+    """
+    Consertos baratos para os defeitos mais comuns de JSON vindo de LLM:
+    cercas de markdown, texto antes/depois do objeto e vírgulas sobrando.
+    """
+    texto = texto.strip().strip('```json').strip('```').strip()
+    inicio, fim = texto.find("{"), texto.rfind("}")
+    if inicio != -1 and fim > inicio:
+        texto = texto[inicio:fim + 1]
+    return re.sub(r",\s*([}\]])", r"\1", texto)
+
+def _interpretar_resposta(texto_resposta: str) -> dict:
+    """
+    Valida a resposta no formato de schemas.AnaliseIA, nesta ordem:
+    como veio -> conserto local -> uma única correção pedida à IA (só texto).
+    """
+    _contar("respostas")
+
+    try:
+        dados = _validar_json(texto_resposta)
+        _contar("validas")
+        return dados
+    except ValueError:
+        pass
+
+    try:
+        dados = _validar_json(_consertar_json(texto_resposta))
+        _contar("consertadas_localmente")
+        print("🩹 Resposta da IA consertada localmente.")
+        return dados
+    except ValueError as e:
+        erro = e
+
+    print(f"⚠️  Resposta da IA inválida ({erro}), pedindo correção...")
+    try:
+        correcao = limitador_llm.executar(
+            provedor_llm.obter_modelo(MODELO_IMAGEM).generate_content,
+            prompt_correcao_json.format(erro=str(erro)[:500], texto=texto_resposta[:4000]),
+            generation_config=configuracao_geracao,
+            tokens_estimados=TOKENS_ESTIMADOS_CORRECAO
+        )
+        dados = _validar_json(_consertar_json(correcao.text))
+        _contar("corrigidas_pela_ia")
+        return dados
+    except limitador_llm.FilaLLMEsgotada:
+        _contar("invalidas")
+        raise HTTPException(status_code=429, detail="Limite de requisições excedido. Tente mais devagar.")
+    except Exception as e:
+        _contar("invalidas")
+        print(f"❌ ERRO JSON: Não foi possível aproveitar a resposta da IA ({e}): {texto_resposta}")
+        raise HTTPException(status_code=500, detail="IA retornou um formato inválido.")
+
+def _contar(chave: str):
+    with _estatisticas_lock:
+        _estatisticas_respostas[chave] += 1
+
+def estatisticas_respostas_llm() -> dict:
+    with _estatisticas_lock:
+        estatisticas = dict(_estatisticas_respostas)
+
+    total = estatisticas["respostas"]
+    estatisticas.update({
+        "taxa_falha_parse": round((total - estatisticas["validas"]) / total, 4) if total else 0.0,
+        "taxa_conserto": round((estatisticas["consertadas_localmente"] + estatisticas["corrigidas_pela_ia"]) / total, 4) if total else 0.0,
+    })
+    return estatisticas
@@ -0,0 +1,212 @@
+import io
+import os
+import re
+import uuid
+import hashlib
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from PIL import Image, ImageOps
+from .. import metricas
+from ..executor import executar_em_thread_arquivos
+from ..caminhos_imagens import chave_original, chave_variante
+from .analise_service import IMAGEM_MAX_PIXELS
+
+# --- Armazenamento das imagens enviadas ---
+UPLOAD_DIR = "uploads"
+# Arquivos ainda sendo recebidos ficam fora de UPLOAD_DIR (servida publicamente em /uploads).
+# Precisa estar no mesmo sistema de arquivos, para o os.replace final ser atômico.
+UPLOAD_DIR_TEMPORARIO = os.getenv("UPLOAD_DIR_TEMPORARIO", "uploads_parciais")
+UPLOAD_TAMANHO_MAX = int(os.getenv("UPLOAD_TAMANHO_MAX", str(15 * 1024 * 1024)))    # Limite por imagem (bytes)
+UPLOAD_TAMANHO_PARTE = 256 * 1024                                                  # Tamanho de cada leitura do upload
+ARMAZENAMENTO_BACKEND = os.getenv("ARMAZENAMENTO_BACKEND", "local")
+
+# Variantes WebP geradas ao salvar (nome -> maior lado em px), para listas e telas de detalhe
+VARIANTES = {
+    "miniatura": int(os.getenv("IMAGEM_MINIATURA_LADO", "256")),
+    "previa": int(os.getenv("IMAGEM_PREVIA_LADO", "1024")),
+}
+VARIANTE_QUALIDADE_WEBP = int(os.getenv("VARIANTE_QUALIDADE_WEBP", "80"))
+
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"                              # O nome muda se o conteúdo mudar
+_NOME_ENDERECADO = re.compile(r"^([0-9a-f]{64})(_[a-z]+)?\.[a-z0-9]+$")
+
+class ArquivosImutaveis(StaticFiles):
+    """
+    StaticFiles para arquivos endereçados pelo conteúdo: o próprio hash vira o
+    ETag (forte) e o navegador/CDN pode guardar o arquivo para sempre.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        encontrado = _NOME_ENDERECADO.match(os.path.basename(full_path))
+        if encontrado:
+            response.headers["etag"] = f'"{encontrado.group(1)}{encontrado.group(2) or ""}"'
+            response.headers["cache-control"] = CACHE_IMUTAVEL
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+class ArmazenamentoLocal:
+    """
+    Backend em disco local (pasta uploads/), servido pela própria API em /uploads.
+    Outro backend (ex: bucket S3) precisa oferecer os mesmos métodos.
+    """
+
+    def __init__(self, raiz: str):
+        self.raiz = raiz
+
+    def caminho(self, chave: str) -> str:
+        return os.path.join(self.raiz, *chave.split("/"))
+
+    def existe(self, chave: str) -> bool:
+        return os.path.exists(self.caminho(chave))
+
+    def mover(self, caminho_origem: str, chave: str):
+        destino = self.caminho(chave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(caminho_origem, destino)                                     # Atômico; mesma imagem = mesmo arquivo
+
+    def gravar(self, chave: str, dados: bytes):
+        destino = self.caminho(chave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = os.path.join(UPLOAD_DIR_TEMPORARIO, f"{uuid.uuid4()}.parcial")
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(dados)
+        os.replace(temporario, destino)
+
+    def url(self, chave: str) -> str:
+        return f"{UPLOAD_DIR}/{chave}"
+
+    def aplicativo_estatico(self):
+        # A pasta é criada no lifespan da API
+        return ArquivosImutaveis(directory=self.raiz, check_dir=False)
+
+BACKENDS = {
+    "local": ArmazenamentoLocal,
+}
+
+armazenamento = BACKENDS[ARMAZENAMENTO_BACKEND](UPLOAD_DIR)
+
+async def _ler_upload(file: UploadFile):
+    while True:
+        parte = await file.read(UPLOAD_TAMANHO_PARTE)
+        if not parte:
+            break
+        yield parte
+
+async def receber_em_partes(partes) -> dict:
+    """
+    Grava um fluxo de bytes (upload ou download) num arquivo temporário (fora da
+    pasta pública), calculando o SHA-256 e o tamanho durante a cópia.
+    Nunca mantém a imagem inteira em memória, e as gravações rodam fora do event loop.
+    """
+    caminho_temporario = os.path.join(UPLOAD_DIR_TEMPORARIO, f"{uuid.uuid4()}.parcial")
+    sha256 = hashlib.sha256()
+    tamanho = 0
+
+    try:
+        destino = await executar_em_thread_arquivos(open, caminho_temporario, "wb")
+        try:
+            async for parte in partes:
+                tamanho += len(parte)
+                if tamanho > UPLOAD_TAMANHO_MAX:
+                    raise HTTPException(status_code=413, detail="Imagem maior que o limite permitido.")
+                sha256.update(parte)
+                await executar_em_thread_arquivos(destino.write, parte)
+        finally:
+            destino.close()                                                     # Só libera o descritor (os dados já foram escritos)
+    except BaseException:
+        descartar({"caminho_temporario": caminho_temporario})
+        raise
+
+    if tamanho == 0:
+        descartar({"caminho_temporario": caminho_temporario})
+        raise HTTPException(status_code=400, detail="O arquivo enviado está vazio.")
+
+    return {
+        "caminho_temporario": caminho_temporario,
+        "hash_conteudo": sha256.hexdigest(),
+        "tamanho": tamanho,
+    }
+
+async def receber_upload(file: UploadFile) -> dict:
+    with metricas.medir_etapa("leitura_upload"):
+        return await receber_em_partes(_ler_upload(file))
+
+def finalizar(arquivo: dict) -> dict:
+    """
+    Confere o cabeçalho da imagem (sem decodificar os pixels) e o limite de
+    pixels antes de qualquer decodificação, move o arquivo
+    temporário para o nome definitivo, endereçado pelo conteúdo
+    (uploads/ab/cd/<sha256>.<ext>), e gera as variantes WebP.
+    """
+    with metricas.medir_etapa("gravacao_arquivo"):
+        return _finalizar(arquivo)
+
+def _finalizar(arquivo: dict) -> dict:
+    try:
+        with Image.open(arquivo["caminho_temporario"]) as imagem:          # Lê só o cabeçalho
+            formato = imagem.format
+            largura, altura = imagem.size
+        if largura * altura > IMAGEM_MAX_PIXELS:                            # Antes das variantes, que decodificam a imagem
+            raise HTTPException(status_code=413, detail="Imagem grande demais para ser processada.")
+    except BaseException:
+        descartar(arquivo)
+        raise
+
+    extensao = formato.lower() if formato else 'jpg'
+    if extensao == 'jpeg':
+        extensao = 'jpg'
+
+    hash_conteudo = arquivo["hash_conteudo"]
+    chave = chave_original(hash_conteudo, extensao)
+    armazenamento.mover(arquivo["caminho_temporario"], chave)
+
+    _gerar_variantes(armazenamento.caminho(chave), hash_conteudo)
+
+    return {
+        **arquivo,
+        "caminho_temporario": None,
+        "caminho": armazenamento.caminho(chave),
+        "imagem_url": armazenamento.url(chave),
+        "formato": formato,
+    }
+
+def _gerar_variantes(caminho: str, hash_conteudo: str):
+    """
+    Gera as versões WebP reduzidas (miniatura e prévia). Mesma imagem, mesmas
+    variantes: se já existem, nada é refeito. Falhas não impedem o upload.
+    """
+    pendentes = {nome: lado for nome, lado in VARIANTES.items() if not armazenamento.existe(chave_variante(hash_conteudo, nome))}
+    if not pendentes:
+        return
+
+    try:
+        with Image.open(caminho) as imagem_pil:
+            maior_lado = max(pendentes.values())
+            if imagem_pil.format == "JPEG":
+                imagem_pil.draft("RGB", (maior_lado, maior_lado))              # Decodifica já reduzida
+            imagem = ImageOps.exif_transpose(imagem_pil)
+            if imagem.mode not in ("RGB", "RGBA"):
+                imagem = imagem.convert("RGBA" if "A" in imagem.getbands() else "RGB")
+
+            # Da maior para a menor: cada variante parte da anterior (mais barato)
+            for nome, lado in sorted(pendentes.items(), key=lambda item: -item[1]):
+                imagem.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                imagem.save(buffer, format="WEBP", quality=VARIANTE_QUALIDADE_WEBP, method=4)
+                armazenamento.gravar(chave_variante(hash_conteudo, nome), buffer.getvalue())
+
+    except Exception as e:
+        print(f"⚠️  Não foi possível gerar as variantes de {caminho}: {e}")
+
+def descartar(arquivo: dict):
+    caminho_temporario = arquivo.get("caminho_temporario")
+    if caminho_temporario and os.path.exists(caminho_temporario):
+        os.remove(caminho_temporario)
@@ -0,0 +1,194 @@
+import os
+import threading
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from PIL import Image
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..models import models as db_models
+
+# --- Configuração do Cache de Análises ---
+# Camada 1: LRU em memória (por processo). Camada 2: tabela 'analises_cache' no banco.
+# Cada entrada é da versão da análise (prompt/formato/modelo) que a gerou; só entradas
+# da versão atual são reaproveitadas.
+CACHE_LRU_TAMANHO = int(os.getenv("ANALISE_CACHE_LRU_TAMANHO", "1024"))
+CACHE_PERCEPTUAL = os.getenv("ANALISE_CACHE_PERCEPTUAL", "false").lower() in ("1", "true", "sim")
+CACHE_DISTANCIA_MAX = int(os.getenv("ANALISE_CACHE_DISTANCIA_MAX", "4"))   # Distância de Hamming máxima para quase-duplicatas
+
+class CacheLRU:
+    """
+    Cache LRU simples e thread-safe (as análises rodam no executor de threads).
+    """
+
+    def __init__(self, tamanho_max: int):
+        self.tamanho_max = tamanho_max
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is not None:
+                self._itens.move_to_end(chave)
+            return entrada
+
+    def obter_por_hash_perceptual(self, versao: str, hash_perceptual: str, distancia_max: int) -> Optional[dict]:
+        # Varredura linear: o LRU é limitado, então o custo é previsível
+        alvo = int(hash_perceptual, 16)
+        with self._lock:
+            for chave, entrada in reversed(self._itens.items()):
+                candidato = entrada.get("hash_perceptual")
+                if candidato and entrada["versao"] == versao and bin(alvo ^ int(candidato, 16)).count("1") <= distancia_max:
+                    self._itens.move_to_end(chave)
+                    return entrada
+        return None
+
+    def guardar(self, chave: str, entrada: dict):
+        with self._lock:
+            self._itens[chave] = entrada
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_max:
+                self._itens.popitem(last=False)
+
+    def __len__(self):
+        return len(self._itens)
+
+cache_memoria = CacheLRU(CACHE_LRU_TAMANHO)
+
+# Contadores de acerto/erro para dimensionar o cache
+_contadores = {
+    "acertos_memoria": 0,
+    "acertos_banco": 0,
+    "acertos_perceptuais": 0,
+    "erros": 0,
+}
+_contadores_lock = threading.Lock()
+
+def _incrementar(contador: str):
+    with _contadores_lock:
+        _contadores[contador] += 1
+
+def calcular_hash_perceptual(imagem_pil: Image.Image) -> str:
+    """
+    dHash de 64 bits: compara o brilho de pixels vizinhos numa miniatura 9x8.
+    Fotos re-comprimidas ou levemente redimensionadas geram hashes próximos.
+    """
+    miniatura = imagem_pil.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(miniatura.getdata())
+
+    valor = 0
+    for linha in range(8):
+        for coluna in range(8):
+            esquerda = pixels[linha * 9 + coluna]
+            direita = pixels[linha * 9 + coluna + 1]
+            valor = (valor << 1) | (1 if esquerda > direita else 0)
+
+    return f"{valor:016x}"
+
+def _chave_memoria(versao: str, hash_conteudo: str) -> str:
+    return f"{versao}:{hash_conteudo}"
+
+def guardar_em_memoria(entrada: dict):
+    cache_memoria.guardar(_chave_memoria(entrada["versao"], entrada["hash_conteudo"]), entrada)
+
+def _entrada_do_banco(registro: db_models.AnaliseCache) -> dict:
+    return {
+        "versao": registro.versao_analise,
+        "hash_conteudo": registro.hash_conteudo,
+        "hash_perceptual": registro.hash_perceptual,
+        "imagem_url": registro.imagem_url,
+        "llm_raw_response": registro.llm_raw_response,
+    }
+
+def buscar(db: Session, versao: str, hash_conteudo: str, hash_perceptual: Optional[str] = None) -> Optional[dict]:
+    """
+    Procura uma análise já feita, na versão 'versao', para a mesma imagem.
+    Ordem: LRU (exato) -> LRU (perceptual) -> banco (exato) -> banco (perceptual exato).
+    """
+    entrada = cache_memoria.obter(_chave_memoria(versao, hash_conteudo))
+    if entrada:
+        _incrementar("acertos_memoria")
+        return entrada
+
+    if hash_perceptual and CACHE_PERCEPTUAL:
+        entrada = cache_memoria.obter_por_hash_perceptual(versao, hash_perceptual, CACHE_DISTANCIA_MAX)
+        if entrada:
+            _incrementar("acertos_perceptuais")
+            return entrada
+
+    registro = db.query(db_models.AnaliseCache).filter(
+        db_models.AnaliseCache.hash_conteudo == hash_conteudo,
+        db_models.AnaliseCache.versao_analise == versao
+    ).first()
+    contador = "acertos_banco"
+
+    if not registro and hash_perceptual and CACHE_PERCEPTUAL:
+        # No banco só buscamos o hash perceptual idêntico (consulta indexada)
+        registro = db.query(db_models.AnaliseCache).filter(
+            db_models.AnaliseCache.hash_perceptual == hash_perceptual,
+            db_models.AnaliseCache.versao_analise == versao
+        ).first()
+        contador = "acertos_perceptuais"
+
+    if not registro:
+        _incrementar("erros")
+        return None
+
+    db.execute(
+        update(db_models.AnaliseCache)
+        .where(db_models.AnaliseCache.id == registro.id)
+        .values(acessos=db_models.AnaliseCache.acessos + 1, ultimo_acesso=datetime.utcnow())
+    )
+
+    entrada = _entrada_do_banco(registro)
+    cache_memoria.guardar(_chave_memoria(versao, hash_conteudo), entrada)
+    _incrementar(contador)
+    return entrada
+
+def armazenar(db: Session, versao: str, hash_conteudo: str, hash_perceptual: Optional[str], imagem_url: str, llm_raw_response: dict) -> dict:
+    """
+    Registra a análise no banco (na mesma transação da refeição).
+    Se outra requisição salvou o mesmo hash na mesma versão antes, mantém o registro existente.
+    """
+    db.execute(
+        insert(db_models.AnaliseCache)
+        .values(
+            versao_analise=versao,
+            hash_conteudo=hash_conteudo,
+            hash_perceptual=hash_perceptual,
+            imagem_url=imagem_url,
+            llm_raw_response=llm_raw_response,
+            acessos=0,
+        )
+        .on_conflict_do_nothing(index_elements=["hash_conteudo", "versao_analise"])
+    )
+
+    return {
+        "versao": versao,
+        "hash_conteudo": hash_conteudo,
+        "hash_perceptual": hash_perceptual,
+        "imagem_url": imagem_url,
+        "llm_raw_response": llm_raw_response,
+    }
+
+def estatisticas() -> dict:
+    """
+    Contadores de acerto do cache, para dimensionar o LRU.
+    """
+    with _contadores_lock:
+        contadores = dict(_contadores)
+
+    acertos = contadores["acertos_memoria"] + contadores["acertos_banco"] + contadores["acertos_perceptuais"]
+    total = acertos + contadores["erros"]
+
+    return {
+        **contadores,
+        "total_consultas": total,
+        "taxa_acerto": round(acertos / total, 4) if total else 0.0,
+        "itens_em_memoria": len(cache_memoria),
+        "capacidade_memoria": cache_memoria.tamanho_max,
+    }
@@ -0,0 +1,243 @@
+import os
+import re
+import csv
+import difflib
+import threading
+import unicodedata
+
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from ..models import models as db_models
+from . import resumo_diario_service
+
+# --- Tabela de composição de alimentos (por 100 g) ---
+# Índice em memória sobre um subconjunto da Tabela Brasileira de Composição de
+# Alimentos (TACO, NEPA/UNICAMP). A IA identifica o alimento, a quantidade e estima
+# os macros; quando o nome bate exatamente com um alimento (ou apelido) da tabela,
+# os nutrientes saem dela, escalados pela quantidade, em microssegundos por item.
+# Correspondências aproximadas e estimativas divergentes mantêm os valores da IA. Para usar a tabela completa, aponte COMPOSICAO_ARQUIVO
+# para um CSV no mesmo formato (nome;apelidos;calorias;proteinas;carboidratos;gordura).
+COMPOSICAO_ARQUIVO = os.getenv("COMPOSICAO_ARQUIVO", os.path.join(os.path.dirname(__file__), "..", "dados", "taco.csv"))
+COMPOSICAO_MODO = os.getenv("COMPOSICAO_MODO", "tabela").lower()                       # tabela | completar | desligado
+COMPOSICAO_SIMILARIDADE_MIN = float(os.getenv("COMPOSICAO_SIMILARIDADE_MIN", "0.6"))   # Nota mínima (0 a 1) da busca aproximada (que também exige todas as palavras)
+COMPOSICAO_DIVERGENCIA_MAX = float(os.getenv("COMPOSICAO_DIVERGENCIA_MAX", "0.5"))     # Diferença relativa de energia que marca a estimativa da IA como divergente
+COMPOSICAO_SIMILARIDADE_PALAVRA = 0.8                                                   # Tolerância a erros de digitação e plurais ("ovos" ~ "ovo")
+
+NUTRIENTES = ("calorias", "proteinas", "carboidratos", "gordura")
+
+# Palavras que não ajudam a identificar o alimento
+_PALAVRAS_IGNORADAS = {
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "com", "em", "na", "no", "ao", "tipo",
+    "porcao", "pedaco", "pedacos", "fatia", "fatias", "unidade", "unidades", "colher", "colheres",
+}
+
+def normalizar(nome: str) -> Tuple[str, ...]:
+    """
+    "Feijão Carioca (cozido)" -> ("feijao", "carioca", "cozido"): sem acentos,
+    minúsculo, sem pontuação e sem palavras vazias.
+    """
+    sem_acentos = unicodedata.normalize("NFKD", nome or "").encode("ascii", "ignore").decode("ascii")
+    return tuple(p for p in re.split(r"[^a-z0-9]+", sem_acentos.lower()) if p and p not in _PALAVRAS_IGNORADAS)
+
+def energia_dos_macros(proteinas: float, carboidratos: float, gordura: float) -> float:
+    # Fatores de Atwater (4/4/9 kcal por grama)
+    return 4 * proteinas + 4 * carboidratos + 9 * gordura
+
+class IndiceComposicao:
+    """
+    Busca exata (nome ou apelido normalizado) e aproximada (todas as palavras do
+    nome presentes no alimento, tolerando erros de digitação) sobre a tabela.
+    Os resultados ficam memorizados por nome.
+    """
+
+    def __init__(self, alimentos: List[dict]):
+        self.alimentos = alimentos
+        self._exatos: Dict[Tuple[str, ...], dict] = {}
+        self._chaves: List[Tuple[Tuple[str, ...], dict]] = []
+        self._por_palavra: Dict[str, List[int]] = {}
+
+        for alimento in alimentos:
+            for texto in [alimento["nome"], *alimento["apelidos"]]:
+                palavras = normalizar(texto)
+                if not palavras or palavras in self._exatos:
+                    continue
+                self._exatos[palavras] = alimento
+                for palavra in set(palavras):
+                    self._por_palavra.setdefault(palavra, []).append(len(self._chaves))
+                self._chaves.append((palavras, alimento))
+
+        self._vocabulario = list(self._por_palavra)
+        self.buscar = lru_cache(maxsize=4096)(self._buscar)
+
+    @classmethod
+    def do_arquivo(cls, caminho: str) -> "IndiceComposicao":
+        alimentos = []
+        with open(caminho, encoding="utf-8", newline="") as arquivo:
+            for linha in csv.DictReader(arquivo, delimiter=";"):
+                alimentos.append({
+                    "nome": linha["nome"],
+                    "apelidos": [a for a in (linha.get("apelidos") or "").split("|") if a],
+                    **{nutriente: float(linha[nutriente]) for nutriente in NUTRIENTES},
+                })
+        return cls(alimentos)
+
+    def _palavras_parecidas(self, palavra: str) -> Dict[str, float]:
+        if palavra in self._por_palavra:
+            return {palavra: 1.0}
+        return {
+            parecida: difflib.SequenceMatcher(None, palavra, parecida).ratio()
+            for parecida in difflib.get_close_matches(palavra, self._vocabulario, n=3, cutoff=COMPOSICAO_SIMILARIDADE_PALAVRA)
+        }
+
+    def _buscar(self, nome: str) -> Tuple[Optional[dict], bool]:
+        """
+        Retorna (alimento ou None, exato). Na busca aproximada, toda palavra do nome
+        precisa aparecer no alimento: "arroz doce" não vira "arroz" e "café com leite"
+        não vira "café".
+        """
+        palavras = normalizar(nome)
+        if not palavras:
+            return None, False
+
+        exato = self._exatos.get(palavras)
+        if exato is not None:
+            return exato, True
+
+        parecidas = [self._palavras_parecidas(p) for p in palavras]
+        if not all(parecidas):
+            return None, False
+
+        # Só alimentos que contêm (algo parecido com) cada uma das palavras
+        candidatos = set.intersection(*(
+            {indice for parecida in mapa for indice in self._por_palavra[parecida]}
+            for mapa in parecidas
+        ))
+
+        melhor, melhor_nota = None, 0.0
+        for indice in sorted(candidatos):
+            chave, alimento = self._chaves[indice]
+            # Coeficiente de Dice ponderado pela semelhança de cada palavra
+            soma = sum(max(s for parecida, s in mapa.items() if parecida in chave) for mapa in parecidas)
+            nota = 2 * soma / (len(palavras) + len(chave))
+            if nota > melhor_nota:
+                melhor, melhor_nota = alimento, nota
+
+        return (melhor, False) if melhor_nota >= COMPOSICAO_SIMILARIDADE_MIN else (None, False)
+
+_indice: Optional[IndiceComposicao] = None
+_indice_lock = threading.Lock()
+_estatisticas = {"itens": 0, "encontrados": 0, "aproximados": 0, "sem_referencia": 0, "divergentes": 0}
+_estatisticas_lock = threading.Lock()
+
+def obter_indice() -> IndiceComposicao:
+    global _indice
+
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                _indice = IndiceComposicao.do_arquivo(COMPOSICAO_ARQUIVO)
+                print(f"🥗 Tabela de composição carregada: {len(_indice.alimentos)} alimentos.")
+    return _indice
+
+def calcular_nutrientes(nome: str, quantidade: float, estimativa: dict) -> dict:
+    """
+    Nutrientes de um item a partir da tabela (por 100 g, escalados pela quantidade).
+    'estimativa' traz os valores da IA ({"calorias", "proteinas", "carboidratos", "gordura"}).
+    A tabela só substitui a estimativa quando o nome bate exatamente e a energia não
+    diverge; nos outros casos ficam os valores da IA. Retorna os quatro nutrientes,
+    'alimento_referencia' (nome na tabela, se os valores vieram dela) e 'divergencia_ia'
+    (a energia estimada pela IA está longe da do alimento encontrado).
+    """
+    resultado = {nutriente: float(estimativa.get(nutriente) or 0) for nutriente in NUTRIENTES}
+    resultado.update(alimento_referencia=None, divergencia_ia=False)
+
+    alimento, exato = obter_indice().buscar(nome or "") if COMPOSICAO_MODO != "desligado" else (None, False)
+
+    if alimento is not None:
+        fator = (quantidade or 0) / 100
+        da_tabela = {nutriente: round(alimento[nutriente] * fator, 1) for nutriente in NUTRIENTES}
+
+        energia_ia = resultado["calorias"] or energia_dos_macros(resultado["proteinas"], resultado["carboidratos"], resultado["gordura"])
+        if energia_ia and da_tabela["calorias"]:
+            resultado["divergencia_ia"] = abs(energia_ia - da_tabela["calorias"]) / da_tabela["calorias"] > COMPOSICAO_DIVERGENCIA_MAX
+
+        if exato and not resultado["divergencia_ia"]:
+            for nutriente in NUTRIENTES:
+                if COMPOSICAO_MODO == "tabela" or not resultado[nutriente]:  # 'completar': só preenche o que a IA deixou zerado
+                    resultado[nutriente] = da_tabela[nutriente]
+            resultado["alimento_referencia"] = alimento["nome"]
+            _contar("encontrados", divergente=False)
+            return resultado
+
+    # Sem referência confiável: a energia vem dos macros quando a IA não informou
+    if not resultado["calorias"]:
+        resultado["calorias"] = round(energia_dos_macros(resultado["proteinas"], resultado["carboidratos"], resultado["gordura"]), 1)
+    _contar("sem_referencia" if alimento is None else "aproximados", divergente=resultado["divergencia_ia"])
+    return resultado
+
+def recalcular_itens(
+    db: Session,
+    apos_id: int = 0,
+    limite: int = 1000,
+    usuario_id: Optional[int] = None,
+    desde: Optional[date] = None,
+    simular: bool = False
+) -> Tuple[Optional[int], int, int]:
+    """
+    Recalcula pela tabela os nutrientes de um lote de itens já gravados (id > apos_id),
+    usando os valores atuais como estimativa da IA, e recalcula o resumo diário dos
+    dias afetados na mesma transação. Retorna (último id lido ou None no fim, lidos, alterados).
+    """
+    item, refeicao = db_models.RefeicaoItem, db_models.Refeicao
+
+    consulta = select(
+        item.id, item.nome_alimento, item.quantidade, item.alimento_referencia, item.divergencia_ia,
+        *[getattr(item, nutriente) for nutriente in NUTRIENTES],
+        refeicao.usuario_comum_id, refeicao.data_hora
+    ).join(refeicao, item.refeicao_id == refeicao.id).where(item.id > apos_id).order_by(item.id).limit(limite)
+
+    if usuario_id is not None:
+        consulta = consulta.where(refeicao.usuario_comum_id == usuario_id)
+    if desde is not None:
+        consulta = consulta.where(refeicao.data_hora >= datetime.combine(desde, datetime.min.time()))
+
+    linhas = db.execute(consulta).all()
+    if not linhas:
+        return None, 0, 0
+
+    alterados, dias_afetados = [], set()
+    for linha in linhas:
+        novo = calcular_nutrientes(linha.nome_alimento, linha.quantidade, {n: getattr(linha, n) for n in NUTRIENTES})
+        if linha.alimento_referencia is not None and linha.alimento_referencia == novo["alimento_referencia"]:
+            novo["divergencia_ia"] = linha.divergencia_ia           # Os valores atuais já são da tabela: a estimativa original da IA não está mais aqui
+        atual = {n: getattr(linha, n) for n in (*NUTRIENTES, "alimento_referencia", "divergencia_ia")}
+        if novo != atual:
+            alterados.append({"id": linha.id, **novo})
+            if linha.usuario_comum_id is not None:
+                dias_afetados.add((linha.usuario_comum_id, linha.data_hora.date()))
+
+    if alterados and not simular:
+        db.execute(update(item), alterados)                        # UPDATE em lote pela chave primária
+        resumo_diario_service.recalcular_dias(db, dias_afetados)
+        db.commit()
+    else:
+        db.rollback()
+
+    return linhas[-1].id, len(linhas), len(alterados)
+
+def _contar(resultado: str, divergente: bool):
+    with _estatisticas_lock:
+        _estatisticas["itens"] += 1
+        _estatisticas[resultado] += 1
+        if divergente:
+            _estatisticas["divergentes"] += 1
+
+def estatisticas() -> dict:
+    with _estatisticas_lock:
+        resultado = dict(_estatisticas)
+    resultado["modo"] = COMPOSICAO_MODO
+    resultado["taxa_encontrados"] = round(resultado["encontrados"] / resultado["itens"], 4) if resultado["itens"] else 0.0
+    return resultado
@@ -0,0 +1,99 @@
+import os
+import asyncio
+import httpx
+
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from .. import metricas
+from . import armazenamento_service
+
+# --- Configuração do download de imagens por URL ---
+DOWNLOAD_TIMEOUT_CONEXAO = float(os.getenv("DOWNLOAD_TIMEOUT_CONEXAO", "5"))    # segundos
+DOWNLOAD_TIMEOUT_LEITURA = float(os.getenv("DOWNLOAD_TIMEOUT_LEITURA", "10"))   # segundos entre pacotes
+DOWNLOAD_TIMEOUT_TOTAL = float(os.getenv("DOWNLOAD_TIMEOUT_TOTAL", "30"))       # segundos para o download inteiro
+DOWNLOAD_MAX_CONEXOES = int(os.getenv("DOWNLOAD_MAX_CONEXOES", "100"))
+DOWNLOAD_MAX_POR_HOST = int(os.getenv("DOWNLOAD_MAX_POR_HOST", "4"))             # Downloads simultâneos por servidor remoto
+
+_cliente: Optional[httpx.AsyncClient] = None
+# Só os hosts com downloads em andamento (ou na fila): a entrada sai quando o último termina,
+# então o dicionário não cresce com cada host diferente enviado pelos usuários
+_hosts_ativos: Dict[str, List] = {}                                              # host -> [semáforo, downloads usando]
+
+def obter_cliente() -> httpx.AsyncClient:
+    """
+    Cliente HTTP compartilhado entre as requisições (mantém conexões keep-alive abertas).
+    """
+    global _cliente
+    if _cliente is None:
+        _cliente = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                DOWNLOAD_TIMEOUT_LEITURA,
+                connect=DOWNLOAD_TIMEOUT_CONEXAO
+            ),
+            limits=httpx.Limits(
+                max_connections=DOWNLOAD_MAX_CONEXOES,
+                max_keepalive_connections=DOWNLOAD_MAX_CONEXOES // 2
+            ),
+            follow_redirects=True,
+            max_redirects=3,
+            headers={"Accept": "image/*"}
+        )
+    return _cliente
+
+async def fechar_cliente():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+@asynccontextmanager
+async def _vaga_no_host(host: str):
+    entrada = _hosts_ativos.get(host)
+    if entrada is None:
+        entrada = _hosts_ativos[host] = [asyncio.Semaphore(DOWNLOAD_MAX_POR_HOST), 0]
+    entrada[1] += 1
+
+    try:
+        async with entrada[0]:
+            yield
+    finally:
+        entrada[1] -= 1
+        if entrada[1] == 0:
+            del _hosts_ativos[host]
+
+async def _baixar(url: str) -> dict:
+    async with obter_cliente().stream("GET", url) as resposta:
+        resposta.raise_for_status()                                             # Lança um erro se a URL for inválida (ex: 404)
+
+        # Confere os cabeçalhos antes de baixar o corpo
+        tipo_conteudo = resposta.headers.get("content-type", "")
+        if not tipo_conteudo.startswith("image/"):
+            raise HTTPException(status_code=400, detail="O link fornecido não aponta para uma imagem.")
+
+        tamanho_declarado = resposta.headers.get("content-length")
+        if tamanho_declarado and tamanho_declarado.isdigit() and int(tamanho_declarado) > armazenamento_service.UPLOAD_TAMANHO_MAX:
+            raise HTTPException(status_code=413, detail="Imagem maior que o limite permitido.")
+
+        # O corpo vai em partes direto para uploads/ (com corte ao passar do limite)
+        return await armazenamento_service.receber_em_partes(
+            resposta.aiter_bytes(armazenamento_service.UPLOAD_TAMANHO_PARTE)
+        )
+
+async def _baixar_na_vez(host: str, url: str) -> dict:
+    async with _vaga_no_host(host):
+        return await _baixar(url)
+
+async def baixar_imagem(url: str) -> dict:
+    """
+    Baixa a imagem de uma URL sem bloquear o event loop, respeitando
+    o limite de downloads simultâneos por host e um tempo máximo total
+    (que inclui a espera na fila do host).
+    """
+    host = httpx.URL(url).host
+
+    try:
+        with metricas.medir_etapa("download_imagem"):
+            return await asyncio.wait_for(_baixar_na_vez(host, url), timeout=DOWNLOAD_TIMEOUT_TOTAL)
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        raise HTTPException(status_code=504, detail="Tempo esgotado ao baixar a imagem do link fornecido.")
@@ -0,0 +1,146 @@
+import os
+
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import or_, and_, update
+from sqlalchemy.orm import Session
+from ..models import models as db_models
+from . import analise_service
+
+# --- Fila persistente de análises (tabela 'analise_jobs') ---
+JOB_MAX_TENTATIVAS = int(os.getenv("JOB_MAX_TENTATIVAS", "3"))
+JOB_TIMEOUT_SEGUNDOS = int(os.getenv("JOB_TIMEOUT_SEGUNDOS", "300"))    # Job em PROCESSANDO há mais tempo que isso volta para a fila
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "10"))           # Espera (s) antes de repetir um job que falhou; dobra a cada tentativa
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "300"))
+
+def _espera_nova_tentativa(tentativas: int) -> timedelta:
+    return timedelta(seconds=min(JOB_BACKOFF_BASE * 2 ** max(tentativas - 1, 0), JOB_BACKOFF_MAX))
+
+def enfileirar(
+    db: Session,
+    usuario_id: int,
+    arquivo: dict,
+    antes_do_commit: Optional[Callable[[List[int]], None]] = None
+) -> db_models.AnaliseJob:
+    """
+    Registra um job de análise para uma imagem que já foi salva em uploads/.
+    'antes_do_commit' recebe [job.id] e pode gravar mais coisas na mesma transação.
+    """
+    job = db_models.AnaliseJob(
+        usuario_comum_id=usuario_id,
+        arquivo=arquivo,
+        status=db_models.StatusJobEnum.PENDENTE
+    )
+    db.add(job)
+    if antes_do_commit:
+        db.flush()
+        antes_do_commit([job.id])
+    db.commit()
+    db.refresh(job)
+
+    print(f"📥 Job {job.id} enfileirado para o usuário {usuario_id}.")
+    return job
+
+def buscar_job(db: Session, job_id: int) -> db_models.AnaliseJob:
+    job = db.query(db_models.AnaliseJob).filter(db_models.AnaliseJob.id == job_id).first()
+
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job não encontrado")
+
+    return job
+
+def reservar_proximo(db: Session) -> Optional[db_models.AnaliseJob]:
+    """
+    Pega o próximo job da fila. 'FOR UPDATE SKIP LOCKED' garante que dois workers
+    nunca peguem o mesmo job; jobs travados (worker caiu no meio) são retomados
+    depois de JOB_TIMEOUT_SEGUNDOS, até JOB_MAX_TENTATIVAS vezes. Jobs que falharam
+    e voltaram para a fila só são pegos de novo depois de 'disponivel_em'.
+    """
+    agora = datetime.utcnow()
+    limite_travado = agora - timedelta(seconds=JOB_TIMEOUT_SEGUNDOS)
+    travado = and_(
+        db_models.AnaliseJob.status == db_models.StatusJobEnum.PROCESSANDO,
+        db_models.AnaliseJob.data_inicio < limite_travado
+    )
+
+    # Travado sem tentativas restantes: provavelmente derruba o worker (ex: imagem que estoura a memória)
+    abandonados = db.execute(
+        update(db_models.AnaliseJob).where(
+            travado,
+            db_models.AnaliseJob.tentativas >= JOB_MAX_TENTATIVAS
+        ).values(
+            status=db_models.StatusJobEnum.ERRO,
+            erro="O processamento foi interrompido em todas as tentativas.",
+            data_conclusao=agora
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    if abandonados:
+        db.commit()
+        print(f"❌ {abandonados} job(s) travado(s) sem tentativas restantes marcado(s) como ERRO.")
+
+    job = db.query(db_models.AnaliseJob).filter(
+        or_(
+            and_(
+                db_models.AnaliseJob.status == db_models.StatusJobEnum.PENDENTE,
+                or_(db_models.AnaliseJob.disponivel_em.is_(None), db_models.AnaliseJob.disponivel_em <= agora)
+            ),
+            and_(travado, db_models.AnaliseJob.tentativas < JOB_MAX_TENTATIVAS)
+        )
+    ).order_by(db_models.AnaliseJob.id).with_for_update(skip_locked=True).first()
+
+    if not job:
+        db.rollback()
+        return None
+
+    job.status = db_models.StatusJobEnum.PROCESSANDO
+    job.data_inicio = datetime.utcnow()
+    job.tentativas = (job.tentativas or 0) + 1
+    db.commit()
+
+    return job
+
+def processar(db: Session, job: db_models.AnaliseJob):
+    """
+    Executa a análise do job com a mesma lógica do endpoint síncrono.
+    A refeição e o status CONCLUIDO são gravados na mesma transação.
+    """
+    job_id = job.id
+
+    def _concluir(refeicao_ids):
+        job.status = db_models.StatusJobEnum.CONCLUIDO
+        job.disponivel_em = None
+        job.refeicao_id = refeicao_ids[0]
+        job.erro = None
+        job.data_conclusao = datetime.utcnow()
+
+    try:
+        analise = analise_service.obter_analise(db, job.arquivo)
+        analise_service.persistir_refeicoes(db, job.usuario_comum_id, [analise], antes_do_commit=_concluir)
+        print(f"✅ Job {job_id} concluído.")
+
+    except Exception as e:
+        db.rollback()
+
+        if isinstance(e, HTTPException):
+            mensagem = str(e.detail)
+            # Erros do cliente (imagem inválida, bloqueio da IA...) não adiantam repetir; cota (429) e 5xx sim
+            pode_repetir = e.status_code == 429 or e.status_code >= 500
+        else:
+            mensagem = f"Erro interno ao processar a análise: {str(e)}"
+            pode_repetir = True
+
+        job = db.query(db_models.AnaliseJob).filter(db_models.AnaliseJob.id == job_id).first()
+
+        if pode_repetir and job.tentativas < JOB_MAX_TENTATIVAS:
+            espera = _espera_nova_tentativa(job.tentativas)
+            job.status = db_models.StatusJobEnum.PENDENTE
+            job.disponivel_em = datetime.utcnow() + espera                  # Não repete na hora (cota, IA fora do ar...)
+            print(f"🔁 Job {job_id} falhou (tentativa {job.tentativas}), volta para a fila em {espera.total_seconds():.0f}s: {mensagem}")
+        else:
+            job.status = db_models.StatusJobEnum.ERRO
+            job.data_conclusao = datetime.utcnow()
+            print(f"❌ Job {job_id} falhou definitivamente: {mensagem}")
+
+        job.erro = mensagem
+        db.commit()
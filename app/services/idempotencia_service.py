@@ -0,0 +1,239 @@
+import os
+import time
+import asyncio
+import hashlib
+
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import delete, null, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from ..executor import executar_em_thread, executor_analise
+from ..models import models as db_models
+
+# --- Idempotency-Key nos POSTs de análise ---
+# O cliente manda o mesmo 'Idempotency-Key' ao reenviar um pedido (ex: depois de
+# um timeout na rede móvel). A primeira requisição reserva a chave na tabela
+# 'chaves_idempotencia' e, ao terminar, guarda a resposta; os reenvios recebem
+# essa mesma resposta, sem nova chamada ao Gemini nem nova refeição.
+# As chaves expiradas são removidas por 'python -m app.comandos.limpar_idempotencia'.
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv("IDEMPOTENCIA_TTL_HORAS", "24"))                    # Por quanto tempo a resposta é guardada
+IDEMPOTENCIA_TRAVA_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TRAVA_SEGUNDOS", "300"))         # Reserva sem resposta há mais tempo que isso é considerada abandonada
+IDEMPOTENCIA_ESPERA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_ESPERA_SEGUNDOS", "120"))     # Quanto um reenvio espera a requisição original (em outro worker)
+IDEMPOTENCIA_INTERVALO_CONSULTA = 0.5                                                      # Segundos entre consultas à reserva de outro worker
+IDEMPOTENCIA_TENTATIVAS_GUARDAR = 3                                                        # Tentativas de guardar a resposta depois que a refeição foi gravada
+
+# 'processar' recebe 'confirmar' (ou None, sem Idempotency-Key): uma função que deve ser chamada
+# com a sessão dentro da transação que grava a refeição/job, antes do commit
+Confirmar = Callable[[Session], None]
+Processar = Callable[[Optional[Confirmar]], Awaitable[Tuple[int, object]]]
+
+# Requisições em andamento neste worker: os reenvios simultâneos esperam o mesmo
+# Future em vez de consultar o banco. O Future recebe (resultado, erro), nunca uma
+# exceção, para não gerar avisos quando ninguém está esperando.
+_em_andamento: Dict[tuple, Tuple[str, asyncio.Future]] = {}
+
+def impressao(*partes: str) -> str:
+    """
+    Resume o conteúdo da requisição: a mesma chave com um pedido diferente é rejeitada.
+    """
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+async def executar(usuario_id: int, rota: str, chave: str, impressao_requisicao: str, processar: Processar) -> Tuple[int, object, bool]:
+    """
+    Roda 'processar' (que devolve (status_code, conteudo JSON)) uma única vez por chave.
+    Retorna (status_code, conteudo, repetida); 'repetida' indica resposta reaproveitada.
+    """
+    identificador = (usuario_id, rota, chave)
+
+    em_andamento = _em_andamento.get(identificador)
+    if em_andamento is not None:
+        impressao_original, futuro = em_andamento
+        _conferir_impressao(impressao_original, impressao_requisicao)
+
+        resultado, erro = await asyncio.shield(futuro)
+        if erro is not None:
+            raise erro
+        status_code, conteudo, _ = resultado
+        return status_code, conteudo, True
+
+    # Registrado antes de qualquer await: um reenvio que chegue agora já espera este Future
+    futuro = asyncio.get_running_loop().create_future()
+    _em_andamento[identificador] = (impressao_requisicao, futuro)
+
+    try:
+        resultado = await _executar_com_reserva(usuario_id, rota, chave, impressao_requisicao, processar)
+        futuro.set_result((resultado, None))
+        return resultado
+    except Exception as e:
+        futuro.set_result((None, e))
+        raise
+    except BaseException:                                          # Cancelada: quem espera tenta de novo depois
+        futuro.set_result((None, HTTPException(status_code=409, detail="A requisição original foi interrompida. Tente novamente.")))
+        raise
+    finally:
+        _em_andamento.pop(identificador, None)
+
+async def _executar_com_reserva(usuario_id: int, rota: str, chave: str, impressao_requisicao: str, processar: Processar) -> Tuple[int, object, bool]:
+    prazo = time.monotonic() + IDEMPOTENCIA_ESPERA_SEGUNDOS
+
+    while True:
+        reservada, registro = await executar_em_thread(_reservar, usuario_id, rota, chave, impressao_requisicao)
+
+        if reservada:
+            break
+
+        if registro is not None:
+            _conferir_impressao(registro["impressao"], impressao_requisicao)
+            if registro["status_code"] is not None:                # Já concluída: devolve a resposta guardada
+                return registro["status_code"], registro["resposta"], True
+            if time.monotonic() >= prazo:
+                raise HTTPException(status_code=409, detail="Uma requisição com esta Idempotency-Key ainda está em andamento.")
+            await asyncio.sleep(IDEMPOTENCIA_INTERVALO_CONSULTA)
+        # registro None: a reserva acabou de ser liberada, tenta reservar de novo
+
+    confirmada = False
+
+    def confirmar(db: Session):
+        # Na mesma transação da refeição: depois do commit, a reserva não é mais tratada como
+        # abandonada (nem liberada), mesmo que a resposta não chegue a ser guardada
+        nonlocal confirmada
+        _marcar_executada(db, usuario_id, rota, chave)
+        confirmada = True
+
+    try:
+        status_code, conteudo = await processar(confirmar)
+    except BaseException:
+        # Falhou (ou foi cancelada) antes de gravar: libera a chave para o cliente poder tentar de novo
+        if not confirmada:
+            asyncio.get_running_loop().run_in_executor(executor_analise, _liberar, usuario_id, rota, chave)
+        raise
+
+    for tentativa in range(1, IDEMPOTENCIA_TENTATIVAS_GUARDAR + 1):
+        try:
+            await executar_em_thread(_guardar, usuario_id, rota, chave, status_code, conteudo)
+            break
+        except Exception as e:
+            if tentativa == IDEMPOTENCIA_TENTATIVAS_GUARDAR:
+                # A refeição já foi gravada: responde mesmo assim; os reenvios recebem 409 até a chave expirar
+                print(f"⚠️  Falha ao guardar a resposta da Idempotency-Key {chave}: {e}")
+                break
+            await asyncio.sleep(IDEMPOTENCIA_INTERVALO_CONSULTA * tentativa)
+
+    return status_code, conteudo, False
+
+def _conferir_impressao(impressao_original: str, impressao_requisicao: str):
+    if impressao_original != impressao_requisicao:
+        raise HTTPException(status_code=422, detail="Esta Idempotency-Key já foi usada com outra requisição.")
+
+def _reservar(usuario_id: int, rota: str, chave: str, impressao_requisicao: str) -> Tuple[bool, Optional[dict]]:
+    """
+    Tenta reservar a chave (ou assumir uma reserva expirada). Se outra requisição
+    já tem a chave, devolve (False, registro) com a situação dela.
+    """
+    tabela = db_models.ChaveIdempotencia
+    agora = datetime.utcnow()
+
+    consulta = pg_insert(tabela).values(
+        usuario_comum_id=usuario_id,
+        rota=rota,
+        chave=chave,
+        impressao=impressao_requisicao,
+        status_code=None,
+        resposta=null(),                                           # SQL NULL (None viraria o JSON null)
+        data_criacao=agora,
+        expira_em=agora + timedelta(seconds=IDEMPOTENCIA_TRAVA_SEGUNDOS),
+    )
+    consulta = consulta.on_conflict_do_update(
+        index_elements=[tabela.usuario_comum_id, tabela.rota, tabela.chave],
+        set_={
+            "impressao": consulta.excluded.impressao,
+            "status_code": None,
+            "resposta": null(),
+            "data_criacao": consulta.excluded.data_criacao,
+            "expira_em": consulta.excluded.expira_em,
+        },
+        where=tabela.expira_em < agora,
+    ).returning(tabela.chave)
+
+    db = SessionLocal()
+    try:
+        if db.execute(consulta).first() is not None:
+            db.commit()
+            return True, None
+
+        registro = db.execute(
+            select(tabela.impressao, tabela.status_code, tabela.resposta).where(
+                tabela.usuario_comum_id == usuario_id,
+                tabela.rota == rota,
+                tabela.chave == chave,
+            )
+        ).mappings().first()
+        db.commit()
+        return False, dict(registro) if registro is not None else None
+    finally:
+        db.close()
+
+def _marcar_executada(db: Session, usuario_id: int, rota: str, chave: str):
+    tabela = db_models.ChaveIdempotencia
+
+    db.execute(
+        update(tabela).where(
+            tabela.usuario_comum_id == usuario_id,
+            tabela.rota == rota,
+            tabela.chave == chave,
+            tabela.status_code.is_(None),
+        ).values(expira_em=datetime.utcnow() + timedelta(hours=IDEMPOTENCIA_TTL_HORAS))
+    )
+
+def _guardar(usuario_id: int, rota: str, chave: str, status_code: int, conteudo: object):
+    tabela = db_models.ChaveIdempotencia
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(tabela).where(
+                tabela.usuario_comum_id == usuario_id,
+                tabela.rota == rota,
+                tabela.chave == chave,
+            ).values(status_code=status_code, resposta=conteudo, expira_em=datetime.utcnow() + timedelta(hours=IDEMPOTENCIA_TTL_HORAS))
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def _liberar(usuario_id: int, rota: str, chave: str):
+    tabela = db_models.ChaveIdempotencia
+
+    db = SessionLocal()
+    try:
+        db.execute(
+            delete(tabela).where(
+                tabela.usuario_comum_id == usuario_id,
+                tabela.rota == rota,
+                tabela.chave == chave,
+                tabela.status_code.is_(None),
+            )
+        )
+        db.commit()
+    except Exception as e:
+        print(f"⚠️  Falha ao liberar a chave de idempotência {chave}: {e}")   # Expira sozinha em IDEMPOTENCIA_TRAVA_SEGUNDOS
+    finally:
+        db.close()
+
+def limpar_expiradas(db: Session, lote: int = 5000) -> int:
+    """
+    Remove um lote de chaves expiradas (respostas vencidas e reservas abandonadas).
+    Retorna quantas foram removidas; chame de novo até voltar 0.
+    """
+    tabela = db_models.ChaveIdempotencia
+    colunas = (tabela.usuario_comum_id, tabela.rota, tabela.chave)
+
+    expiradas = select(*colunas).where(tabela.expira_em < datetime.utcnow()).limit(lote)
+    removidas = db.execute(
+        delete(tabela).where(tuple_(*colunas).in_(expiradas)).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return removidas
@@ -0,0 +1,227 @@
+import os
+import time
+import random
+import threading
+
+from collections import deque
+from typing import Iterator
+from google.api_core import exceptions as google_exceptions
+from .. import metricas
+
+# --- Controle de admissão das chamadas ao Gemini ---
+# Compartilhado por analise_service e relatorio_service: todas as chamadas do
+# processo passam pelos mesmos baldes de fichas (requisições e tokens por minuto).
+# Os baldes ficam na memória de cada processo; a cota da conta é dividida entre os
+# LLM_PROCESSOS processos que chamam o Gemini (workers do uvicorn + worker da fila).
+LLM_LIMITE_RPM = int(os.getenv("LLM_LIMITE_RPM", "60"))                 # Requisições por minuto (da conta, somando todos os processos)
+LLM_LIMITE_TPM = int(os.getenv("LLM_LIMITE_TPM", "250000"))             # Tokens por minuto (da conta, somando todos os processos)
+LLM_PROCESSOS = max(1, int(os.getenv("LLM_PROCESSOS", "1")))            # Quantos processos dividem a cota acima
+LLM_ESPERA_MAX = float(os.getenv("LLM_ESPERA_MAX", "20"))               # Tempo máximo (s) esperando vaga na fila
+LLM_TENTATIVAS = int(os.getenv("LLM_TENTATIVAS", "4"))                  # Tentativas para erros temporários (429, 503...)
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))            # Espera base (s) do backoff exponencial
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+
+_ERROS_TEMPORARIOS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+class FilaLLMEsgotada(Exception):
+    """A chamada esperou mais que LLM_ESPERA_MAX por uma vaga na cota."""
+
+class BaldeDeFichas:
+    """
+    Token bucket: enche continuamente até 'capacidade', a 'capacidade' por minuto.
+    Não é thread-safe sozinho; o LimitadorLLM protege o acesso.
+    """
+
+    def __init__(self, capacidade: int):
+        self.capacidade = float(capacidade)
+        self.por_segundo = capacidade / 60.0
+        self.fichas = float(capacidade)
+        self._atualizado_em = time.monotonic()
+
+    def _repor(self, agora: float):
+        self.fichas = min(self.capacidade, self.fichas + (agora - self._atualizado_em) * self.por_segundo)
+        self._atualizado_em = agora
+
+    def tempo_ate(self, quantidade: float, agora: float) -> float:
+        self._repor(agora)
+        falta = min(quantidade, self.capacidade) - self.fichas
+        return max(0.0, falta / self.por_segundo)
+
+    def disponiveis(self, agora: float) -> float:
+        self._repor(agora)
+        return self.fichas
+
+    def consumir(self, quantidade: float):
+        # Pode ficar negativo quando o consumo real supera o estimado (a diferença é "paga" depois)
+        self.fichas -= quantidade
+
+class LimitadorLLM:
+    """
+    Fila FIFO na frente dos baldes de requisições e de tokens. Cada chamada espera
+    a sua vez e a reposição dos baldes, até no máximo 'espera_max' segundos.
+    """
+
+    def __init__(self, rpm: int, tpm: int, espera_max: float):
+        self.requisicoes = BaldeDeFichas(rpm)
+        self.tokens = BaldeDeFichas(tpm)
+        self.espera_max = espera_max
+
+        self._condicao = threading.Condition()
+        self._fila = deque()
+        self._estatisticas = {
+            "admitidas": 0,
+            "rejeitadas": 0,
+            "retentativas": 0,
+            "espera_total_s": 0.0,
+            "espera_max_s": 0.0,
+        }
+
+    def adquirir(self, tokens_estimados: int) -> float:
+        """
+        Bloqueia até haver cota para uma requisição com 'tokens_estimados'.
+        Retorna o tempo esperado (s) ou lança FilaLLMEsgotada.
+        """
+        inicio = time.monotonic()
+        prazo = inicio + self.espera_max
+        ticket = object()
+
+        with self._condicao:
+            self._fila.append(ticket)
+            try:
+                while True:
+                    agora = time.monotonic()
+                    espera = None
+
+                    if self._fila[0] is ticket:
+                        espera = max(
+                            self.requisicoes.tempo_ate(1, agora),
+                            self.tokens.tempo_ate(tokens_estimados, agora)
+                        )
+                        if espera <= 0:
+                            self.requisicoes.consumir(1)
+                            self.tokens.consumir(tokens_estimados)
+                            break
+
+                    restante = prazo - agora
+                    if restante <= 0:
+                        self._estatisticas["rejeitadas"] += 1
+                        raise FilaLLMEsgotada("Tempo máximo de espera pela cota da IA excedido.")
+
+                    self._condicao.wait(timeout=min(espera, restante) if espera is not None else restante)
+            finally:
+                self._fila.remove(ticket)
+                self._condicao.notify_all()                              # O próximo da fila pode tentar
+
+            tempo_espera = time.monotonic() - inicio
+            self._estatisticas["admitidas"] += 1
+            self._estatisticas["espera_total_s"] += tempo_espera
+            self._estatisticas["espera_max_s"] = max(self._estatisticas["espera_max_s"], tempo_espera)
+
+        return tempo_espera
+
+    def ajustar_tokens(self, tokens_estimados: int, tokens_reais: int):
+        # Corrige o balde com o uso real informado pela API
+        with self._condicao:
+            self.tokens.consumir(tokens_reais - tokens_estimados)
+
+    def registrar_retentativa(self):
+        with self._condicao:
+            self._estatisticas["retentativas"] += 1
+
+    def estatisticas(self) -> dict:
+        with self._condicao:
+            agora = time.monotonic()
+            estatisticas = dict(self._estatisticas)
+            estatisticas.update({
+                "profundidade_fila": len(self._fila),
+                "espera_media_s": round(estatisticas["espera_total_s"] / estatisticas["admitidas"], 4) if estatisticas["admitidas"] else 0.0,
+                "fichas_requisicoes": round(self.requisicoes.disponiveis(agora), 2),
+                "fichas_tokens": round(self.tokens.disponiveis(agora), 2),
+                "limite_rpm": int(self.requisicoes.capacidade),
+                "limite_tpm": int(self.tokens.capacidade),
+                "espera_max_configurada_s": self.espera_max,
+            })
+        return estatisticas
+
+limitador = LimitadorLLM(max(1, LLM_LIMITE_RPM // LLM_PROCESSOS), max(1, LLM_LIMITE_TPM // LLM_PROCESSOS), LLM_ESPERA_MAX)
+
+def eh_erro_temporario(erro: Exception) -> bool:
+    if isinstance(erro, _ERROS_TEMPORARIOS):
+        return True
+    texto = str(erro)
+    return "429" in texto or "503" in texto
+
+def _tokens_da_resposta(resposta) -> int:
+    uso = getattr(resposta, "usage_metadata", None)
+    return getattr(uso, "total_token_count", 0) or 0
+
+def _tratar_erro(erro: Exception, tentativa: int):
+    # Relança erros definitivos (ou a última tentativa); nos temporários espera o backoff
+    temporario = eh_erro_temporario(erro)
+    metricas.chamadas_llm.incrementar(resultado="erro_temporario" if temporario else "erro")
+    if not temporario or tentativa == LLM_TENTATIVAS:
+        raise erro
+
+    espera = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (tentativa - 1)))  # "Full jitter"
+    limitador.registrar_retentativa()
+    print(f"⏳ Erro temporário da IA (tentativa {tentativa}/{LLM_TENTATIVAS}), nova tentativa em {espera:.1f}s: {erro}")
+    time.sleep(espera)
+
+def _registrar_sucesso(resposta, tokens_estimados: int):
+    metricas.chamadas_llm.incrementar(resultado="sucesso")
+    tokens_reais = _tokens_da_resposta(resposta)
+    if tokens_reais:
+        limitador.ajustar_tokens(tokens_estimados, tokens_reais)
+
+def executar(funcao, *args, tokens_estimados: int = 1000, **kwargs):
+    """
+    Executa uma chamada ao Gemini respeitando a cota compartilhada.
+    Erros temporários são repetidos com backoff exponencial e jitter.
+    Para respostas em streaming, use executar_em_partes.
+    """
+    for tentativa in range(1, LLM_TENTATIVAS + 1):
+        with metricas.medir_etapa("espera_cota_gemini"):
+            limitador.adquirir(tokens_estimados)
+
+        try:
+            with metricas.chamadas_llm_em_andamento.em_andamento(), metricas.medir_etapa("chamada_gemini"):
+                resposta = funcao(*args, **kwargs)
+        except Exception as e:
+            _tratar_erro(e, tentativa)
+            continue
+
+        _registrar_sucesso(resposta, tokens_estimados)
+        return resposta
+
+def executar_em_partes(funcao, *args, tokens_estimados: int = 1000, **kwargs) -> Iterator:
+    """
+    Versão de 'executar' para streaming: chama 'funcao' com stream=True e devolve os pedaços.
+    Erros temporários ao abrir o stream ou antes do primeiro pedaço são repetidos com
+    backoff; depois que algum pedaço foi entregue o erro sobe, pois repetir duplicaria o texto.
+    """
+    for tentativa in range(1, LLM_TENTATIVAS + 1):
+        with metricas.medir_etapa("espera_cota_gemini"):
+            limitador.adquirir(tokens_estimados)
+
+        entregou = False
+        try:
+            with metricas.chamadas_llm_em_andamento.em_andamento(), metricas.medir_etapa("chamada_gemini"):
+                resposta = funcao(*args, stream=True, **kwargs)
+                for parte in resposta:
+                    entregou = True
+                    yield parte
+        except Exception as e:
+            if entregou:
+                metricas.chamadas_llm.incrementar(resultado="erro")
+                raise
+            _tratar_erro(e, tentativa)
+            continue
+
+        _registrar_sucesso(resposta, tokens_estimados)               # O uso de tokens só vem no fim do stream
+        return
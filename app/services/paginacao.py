@@ -0,0 +1,55 @@
+import base64
+import binascii
+
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+# --- Paginação por cursor (keyset) ---
+# O cursor guarda (data, id) do último registro da página. A próxima página
+# continua a partir dele com "WHERE (data, id) < (:data, :id)", que o índice
+# composto resolve sem OFFSET: o custo por página não cresce com o histórico.
+LIMITE_PADRAO = 20
+LIMITE_MAX = 100
+
+def codificar_cursor(momento: datetime, id: int) -> str:
+    texto = f"{momento.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        momento, id = texto.split("|")
+        return datetime.fromisoformat(momento), int(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginação inválido.")
+
+def filtrar_periodo(consulta, coluna, data_inicio: Optional[date], data_fim: Optional[date]):
+    # Datas inclusivas, como nos relatórios
+    if data_inicio is not None:
+        consulta = consulta.filter(coluna >= datetime.combine(data_inicio, datetime.min.time()))
+    if data_fim is not None:
+        consulta = consulta.filter(coluna <= datetime.combine(data_fim, datetime.max.time()))
+    return consulta
+
+def paginar(consulta, coluna_data, coluna_id, limite: int, cursor: Optional[str]) -> Tuple[List, Optional[str]]:
+    """
+    Aplica o keyset (mais recentes primeiro) e retorna (registros, próximo cursor).
+    Busca um registro a mais só para saber se existe próxima página.
+    """
+    consulta = consulta.filter(coluna_data.isnot(None))                # Sem data não há posição no cursor
+
+    if cursor:
+        momento, id = decodificar_cursor(cursor)
+        consulta = consulta.filter(tuple_(coluna_data, coluna_id) < tuple_(momento, id))
+
+    registros = consulta.order_by(coluna_data.desc(), coluna_id.desc()).limit(limite + 1).all()
+
+    proximo_cursor = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        ultimo = registros[-1]
+        proximo_cursor = codificar_cursor(getattr(ultimo, coluna_data.key), getattr(ultimo, coluna_id.key))
+
+    return registros, proximo_cursor
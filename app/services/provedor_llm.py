@@ -0,0 +1,88 @@
+import os
+import time
+import threading
+
+# --- Provedor único dos modelos do Gemini ---
+# A biblioteca do Google só é importada e configurada na primeira chamada (ou no
+# aquecimento do lifespan), nunca no import: subir a API ou um worker não faz
+# trabalho de rede, e a aplicação pode ser importada sem credenciais.
+MODELO_PADRAO = os.getenv("LLM_MODELO", "gemini-2.5-flash")
+LLM_AQUECER = os.getenv("LLM_AQUECER", "false").lower() == "true"      # Abre a conexão com o Gemini já na inicialização
+LLM_RECRIAR_APOS = float(os.getenv("LLM_RECRIAR_APOS", "30"))           # Segundos até tentar criar de novo um modelo que falhou
+
+_modelos = {}                                                           # Só modelos criados com sucesso
+_falhas = {}                                                            # nome -> instante (monotonic) da última falha na criação
+_substituto = None
+_configurado = False
+_lock = threading.Lock()
+
+def obter_modelo(nome: str = MODELO_PADRAO):
+    """
+    Devolve o GenerativeModel compartilhado para 'nome', criando na primeira vez.
+    Retorna None se não foi possível criar (ex: chave da API ausente); a criação
+    é tentada de novo depois de LLM_RECRIAR_APOS segundos.
+    """
+    if _substituto is not None:
+        return _substituto
+
+    modelo = _modelos.get(nome)
+    if modelo is not None:
+        return modelo
+
+    if time.monotonic() - _falhas.get(nome, float("-inf")) < LLM_RECRIAR_APOS:
+        return None                                                 # Falhou há pouco: não disputa o lock a cada chamada
+
+    with _lock:
+        modelo = _modelos.get(nome)
+        if modelo is None and time.monotonic() - _falhas.get(nome, float("-inf")) >= LLM_RECRIAR_APOS:
+            modelo = _criar_modelo(nome)
+            if modelo is not None:
+                _modelos[nome] = modelo
+                _falhas.pop(nome, None)
+            else:
+                _falhas[nome] = time.monotonic()
+        return modelo
+
+def _criar_modelo(nome: str):
+    global _configurado
+
+    try:
+        import google.generativeai as genai
+
+        if not _configurado:
+            api_key = os.getenv("GEMINI_API_KEY")                   # Busca a chave da API a partir das variáveis de ambiente
+            if not api_key:
+                raise ValueError("Chave da API do Google não encontrada no .env")
+            genai.configure(api_key=api_key)                        # Configura a biblioteca do Google AI com a chave fornecida
+            _configurado = True
+
+        return genai.GenerativeModel(nome)
+
+    except Exception as e:                                          # Sem modelo, os endpoints de IA respondem 500
+        print(f"ERRO CRÍTICO ao inicializar o modelo Gemini ({nome}): {e}")
+        return None
+
+def substituir(modelo):
+    """
+    Faz todos os serviços usarem 'modelo' no lugar do Gemini (benchmarks, testes).
+    Passe None para voltar ao Gemini.
+    """
+    global _substituto
+    _substituto = modelo
+
+def aquecer(nome: str = MODELO_PADRAO) -> bool:
+    """
+    Cria o modelo e faz uma chamada barata (count_tokens) para já abrir a conexão.
+    Falhas só são registradas: a API sobe mesmo assim.
+    """
+    modelo = obter_modelo(nome)
+    if modelo is None:
+        return False
+
+    try:
+        modelo.count_tokens("ping")
+        print(f"🔥 Modelo {nome} aquecido.")
+        return True
+    except Exception as e:
+        print(f"⚠️  Falha ao aquecer o modelo {nome}: {e}")
+        return False
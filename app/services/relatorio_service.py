@@ -1,26 +1,20 @@
-import os
+import hashlib
+from sqlalchemy import exists, select, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, date
 from fastapi import HTTPException, status
-from typing import Optional
+from typing import Dict, FrozenSet, Iterator, List, Optional
 
-import google.generativeai as genai
+from .. import metricas
+from ..database import SessionLocal
 from ..models import models as db_models
 from ..schemas import schemas as schemas
+from . import limitador_llm, paginacao, provedor_llm, visoes
 
-try:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("Chave da API do Google não encontrada no .env")
-    
-    genai.configure(api_key=api_key)
-    # Usamos um modelo focado em texto para esta tarefa
-    model_texto = genai.GenerativeModel('gemini-2.5-flash') 
+# Usamos um modelo focado em texto para esta tarefa (criado sob demanda pelo provedor_llm)
+MODELO_TEXTO = provedor_llm.MODELO_PADRAO
 
-except Exception as e:
-    print(f"ERRO CRÍTICO ao inicializar o modelo Gemini (texto): {e}")
-    model_texto = None
-    
 prompt_sugestao_nutricionista = """
 Act like an professional nutricionist and based on the info about his diet, write a very short feedback for the user (in português-BR).
 The feedback must try to reinforce positive behavior and point out what the pacient should do to achieve a healthier diet.
@@ -33,6 +27,9 @@ SUMMARY:
 SUGESTED COMMENT:
 """
 
+TOKENS_ESTIMADOS_SUGESTAO = 400                                    # Resposta curta esperada (somada ao tamanho do prompt)
+RELATORIO_TENTATIVAS_CRIACAO = 3                                   # INSERTs perdidos para relatórios aprovados/removidos em seguida antes de desistir (409)
+
 def processar_periodo(data_inicio, data_fim):
     hoje = date.today()
     
@@ -50,16 +47,19 @@ def processar_periodo(data_inicio, data_fim):
         
     return data_inicio, data_fim
 
-def gerar_sugestao_llm(db: Session, relatorio_id: int) -> schemas.SugestaoRelatorioResponse:
+def calcular_chave_sugestao(resumo: str) -> str:
     """
-    Gera um comentário de sugestão para o nutricionista usando a LLM.
+    Identifica uma sugestão pelo que a define: resumo, prompt e modelo.
+    Se qualquer um deles mudar, a sugestão guardada deixa de valer.
     """
-    if not model_texto:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-            detail="Modelo de IA de texto não inicializado."
-        )
+    conteudo = "\x00".join([resumo, prompt_sugestao_nutricionista, MODELO_TEXTO])
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
 
+def preparar_sugestao(db: Session, relatorio_id: int, regenerar: bool = False) -> dict:
+    """
+    Etapas comuns às versões normal e em streaming da sugestão:
+    busca o relatório, valida o resumo e verifica se já existe sugestão válida guardada.
+    """
     # 1. Buscar o relatório
     db_relatorio = db.query(db_models.Relatorio).filter(db_models.Relatorio.id == relatorio_id).first()
     
@@ -69,23 +69,211 @@ def gerar_sugestao_llm(db: Session, relatorio_id: int) -> schemas.SugestaoRelato
     if not db_relatorio.resumo_automatico:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Relatório não contém resumo para análise.")
 
+    chave = calcular_chave_sugestao(db_relatorio.resumo_automatico)
+
+    sugestao_guardada = None
+    if not regenerar and db_relatorio.sugestao_ia and db_relatorio.sugestao_ia_chave == chave:
+        sugestao_guardada = db_relatorio.sugestao_ia
+    elif not provedor_llm.obter_modelo(MODELO_TEXTO):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+            detail="Modelo de IA de texto não inicializado."
+        )
+
     # 2. Preparar o prompt
-    prompt_completo = prompt_sugestao_nutricionista.format(resumo=db_relatorio.resumo_automatico)
+    preparo = {
+        "relatorio_id": relatorio_id,
+        "chave": chave,
+        "prompt": prompt_sugestao_nutricionista.format(resumo=db_relatorio.resumo_automatico),
+        "sugestao_guardada": sugestao_guardada,
+    }
+
+    db.commit() # Encerra a leitura: a conexão não fica presa durante a chamada à IA
+    return preparo
+
+def limpar_sugestao(sugestao: str) -> str:
+    # Limpa a resposta (remove markdown, etc.)
+    return sugestao.strip().strip("```").strip()
+
+def _erro_da_ia(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, limitador_llm.FilaLLMEsgotada) or limitador_llm.eh_erro_temporario(e):
+        return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Limite de requisições excedido. Tente mais devagar.")
+    print(f"Erro ao chamar a API do Gemini: {e}")
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro da IA: {e}")
+
+def guardar_sugestao(db: Session, relatorio_id: int, chave: str, sugestao: str):
+    # Guarda no relatório para as próximas aberturas
+    db.query(db_models.Relatorio).filter(db_models.Relatorio.id == relatorio_id).update({
+        db_models.Relatorio.sugestao_ia: sugestao,
+        db_models.Relatorio.sugestao_ia_chave: chave,
+        db_models.Relatorio.sugestao_ia_gerada_em: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.commit()
 
-    # 3. Chamar a IA
+def guardar_sugestao_isolada(relatorio_id: int, chave: str, sugestao: str):
+    """
+    Igual a guardar_sugestao, com sessão própria: no streaming, a sessão da
+    requisição pode já ter sido fechada (ex: o cliente desconectou).
+    """
+    db = SessionLocal()
     try:
-        response = model_texto.generate_content(prompt_completo)
-        sugestao = response.text
-        
-        # Limpa a resposta (remove markdown, etc.)
-        sugestao_limpa = sugestao.strip().strip("```").strip()
+        guardar_sugestao(db, relatorio_id, chave, sugestao)
+    finally:
+        db.close()
 
-        return schemas.SugestaoRelatorioResponse(sugestao_texto=sugestao_limpa)
-        
+def gerar_sugestao_llm(db: Session, relatorio_id: int, regenerar: bool = False) -> schemas.SugestaoRelatorioResponse:
+    """
+    Gera um comentário de sugestão para o nutricionista usando a LLM.
+    A sugestão fica guardada no relatório e é reaproveitada enquanto o resumo,
+    o prompt e o modelo forem os mesmos ('regenerar' força uma nova geração).
+    """
+    preparo = preparar_sugestao(db, relatorio_id, regenerar)
+
+    if preparo["sugestao_guardada"] is not None:
+        return schemas.SugestaoRelatorioResponse(sugestao_texto=preparo["sugestao_guardada"], do_cache=True)
+
+    # 3. Chamar a IA (passando pelo limitador de cota compartilhado)
+    try:
+        with metricas.medir_etapa("geracao_sugestao"):
+            response = limitador_llm.executar(
+                provedor_llm.obter_modelo(MODELO_TEXTO).generate_content,
+                preparo["prompt"],
+                tokens_estimados=len(preparo["prompt"]) // 4 + TOKENS_ESTIMADOS_SUGESTAO
+            )
+            sugestao_limpa = limpar_sugestao(response.text)
+    except Exception as e:
+        raise _erro_da_ia(e)
+
+    # 4. Guardar no relatório
+    guardar_sugestao(db, relatorio_id, preparo["chave"], sugestao_limpa)
+
+    return schemas.SugestaoRelatorioResponse(sugestao_texto=sugestao_limpa)
+
+def gerar_sugestao_em_partes(prompt: str) -> Iterator[str]:
+    """
+    Versão em streaming: devolve os pedaços do texto à medida que o Gemini os gera.
+    """
+    try:
+        partes = limitador_llm.executar_em_partes(
+            provedor_llm.obter_modelo(MODELO_TEXTO).generate_content,
+            prompt,
+            tokens_estimados=len(prompt) // 4 + TOKENS_ESTIMADOS_SUGESTAO
+        )
+        for parte in partes:
+            try:
+                texto = parte.text
+            except ValueError:
+                continue # Pedaço sem texto (ex: só metadados de segurança)
+            if texto:
+                yield texto
     except Exception as e:
-        print(f"Erro ao chamar a API do Gemini: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro da IA: {e}")
+        raise _erro_da_ia(e)
     
+def _dia_do_resumo(linha) -> dict:
+    return {
+        "dia": linha.dia,
+        "refeicoes": linha.refeicoes,
+        "calorias": linha.calorias,
+        "proteinas": linha.proteinas,
+        "carboidratos": linha.carboidratos,
+        "gordura": linha.gordura,
+    }
+
+def agregar_periodo(db: Session, usuario_id: int, periodo_inicio: date, periodo_fim: date) -> List[dict]:
+    """
+    Totais por dia do período, lidos do resumo nutricional diário
+    (uma linha por dia, sem percorrer refeições ou itens).
+    """
+    linhas = db.query(db_models.ResumoNutricionalDiario).filter(
+        db_models.ResumoNutricionalDiario.usuario_comum_id == usuario_id,
+        db_models.ResumoNutricionalDiario.dia >= periodo_inicio,
+        db_models.ResumoNutricionalDiario.dia <= periodo_fim
+    ).order_by(db_models.ResumoNutricionalDiario.dia).all()
+
+    return [_dia_do_resumo(linha) for linha in linhas]
+
+def agregar_periodo_todos(db: Session, periodo_inicio: date, periodo_fim: date) -> Dict[int, List[dict]]:
+    """
+    Versão em lote de agregar_periodo: uma única consulta para todos os usuários
+    com refeições no período que ainda não têm relatório PENDENTE para ele.
+    """
+    resumo = db_models.ResumoNutricionalDiario
+    ja_tem_relatorio = exists().where(
+        db_models.Relatorio.usuario_comum_id == resumo.usuario_comum_id,
+        db_models.Relatorio.periodo_inicio == periodo_inicio,
+        db_models.Relatorio.periodo_fim == periodo_fim,
+        db_models.Relatorio.status == db_models.StatusRelatorioEnum.PENDENTE
+    )
+
+    consulta = select(
+        resumo.usuario_comum_id, resumo.dia, resumo.refeicoes,
+        resumo.calorias, resumo.proteinas, resumo.carboidratos, resumo.gordura
+    ).where(
+        resumo.dia >= periodo_inicio,
+        resumo.dia <= periodo_fim,
+        ~ja_tem_relatorio
+    ).order_by(resumo.usuario_comum_id, resumo.dia)
+
+    por_usuario = {}
+    for linha in db.execute(consulta.execution_options(yield_per=5000)):
+        por_usuario.setdefault(linha.usuario_comum_id, []).append(_dia_do_resumo(linha))
+
+    return por_usuario
+
+def inserir_relatorios_pendentes(db: Session, periodo_inicio: date, periodo_fim: date, resumos: Dict[int, str]) -> int:
+    """
+    Grava de uma vez os relatórios PENDENTE pré-calculados ({usuario_id: resumo}).
+    Retorna quantos foram criados (os que já existiam são ignorados).
+    """
+    if not resumos:
+        return 0
+
+    agora = datetime.utcnow()
+    criados = db.execute(_inserir_pendente().returning(db_models.Relatorio.id), [
+        {
+            "usuario_comum_id": usuario_id,
+            "periodo_inicio": periodo_inicio,
+            "periodo_fim": periodo_fim,
+            "resumo_automatico": resumo_automatico,
+            "status": db_models.StatusRelatorioEnum.PENDENTE,
+            "data_criacao": agora,
+        }
+        for usuario_id, resumo_automatico in resumos.items()
+    ]).all()
+    db.commit()
+    return len(criados)                                             # Os que alguém criou no meio do caminho ficam de fora
+
+def montar_resumo(periodo_inicio: date, periodo_fim: date, dias: List[dict]) -> str:
+    """
+    Monta o texto do resumo automático a partir dos totais diários.
+    """
+    total_refeicoes = sum(d["refeicoes"] for d in dias)
+    total_calorias = sum(d["calorias"] for d in dias)
+    total_proteinas = sum(d["proteinas"] for d in dias)
+    total_carboidratos = sum(d["carboidratos"] for d in dias)
+    total_gordura = sum(d["gordura"] for d in dias)
+
+    detalhamento_diario = "\n".join(
+        f"        - {d['dia'].strftime('%d/%m/%Y')}: {d['refeicoes']} refeições, "
+        f"{d['calorias']:.2f} kcal, P {d['proteinas']:.2f} g, C {d['carboidratos']:.2f} g, G {d['gordura']:.2f} g"
+        for d in dias
+    ) or "        - Nenhuma refeição registrada no período."
+
+    return f"""
+        Relatório do período: {periodo_inicio.strftime('%d/%m/%Y')} a {periodo_fim.strftime('%d/%m/%Y')}
+        Total de refeições registradas: {total_refeicoes}
+        Resumo de Macronutrientes (Total):
+        - Calorias Totais: {total_calorias:.2f} kcal
+        - Proteínas Totais: {total_proteinas:.2f} g
+        - Carboidratos Totais: {total_carboidratos:.2f} g
+        - Gorduras Totais: {total_gordura:.2f} g
+        Detalhamento por dia:
+{detalhamento_diario}
+        (Aqui entrariam os gráficos e tabelas gerados)
+        """
+
 def criar_relatorio(
     db: Session, 
     usuario_id: int,
@@ -93,66 +281,70 @@ def criar_relatorio(
     data_fim: Optional[date] = None
     ):      
 
+    """
+    Busca ou cria o relatório PENDENTE do período. A criação é um
+    INSERT ... ON CONFLICT DO NOTHING sobre o índice único parcial: com vários
+    workers pedindo o mesmo relatório, só um grava e os outros recebem o dele.
+    """
     try:
         periodo_inicio, periodo_fim = processar_periodo(data_inicio, data_fim)
     except HTTPException as e:
         raise e
 
-    relatorio_existente = db.query(db_models.Relatorio).filter(
-        db_models.Relatorio.usuario_comum_id == usuario_id,
-        db_models.Relatorio.periodo_inicio == periodo_inicio,
-        db_models.Relatorio.periodo_fim == periodo_fim,
-        db_models.Relatorio.status == db_models.StatusRelatorioEnum.PENDENTE
-    ).first()
+    relatorio_existente = _buscar_pendente(db, usuario_id, periodo_inicio, periodo_fim)
 
     if relatorio_existente:
         print(f"Relatório {relatorio_existente.id} já existe, retornando...")
         return relatorio_existente
 
-    refeicoes = db.query(db_models.Refeicao).filter(
-        db_models.Refeicao.usuario_comum_id == usuario_id,
-        db_models.Refeicao.data_hora >= datetime.combine(periodo_inicio, datetime.min.time()),
-        db_models.Refeicao.data_hora <= datetime.combine(periodo_fim, datetime.max.time())
-    ).all()
-    
-    total_calorias = 0
-    total_proteinas = 0
-    total_carboidratos = 0
-    total_gordura = 0
-    
-    for refeicao in refeicoes:
-        for item in refeicao.itens:
-            total_calorias += item.calorias or 0
-            total_proteinas += item.proteinas or 0
-            total_carboidratos += item.carboidratos or 0
-            total_gordura += item.gordura or 0
-
-    resumo_automatico = f"""
-        Relatório do período: {periodo_inicio.strftime('%d/%m/%Y')} a {periodo_fim.strftime('%d/%m/%Y')}
-        Total de refeições registradas: {len(refeicoes)}
-        Resumo de Macronutrientes (Total):
-        - Calorias Totais: {total_calorias:.2f} kcal
-        - Proteínas Totais: {total_proteinas:.2f} g
-        - Carboidratos Totais: {total_carboidratos:.2f} g
-        - Gorduras Totais: {total_gordura:.2f} g
-        (Aqui entrariam os gráficos e tabelas gerados)
-        """
+    with metricas.medir_etapa("agregacao_relatorio"):
+        dias = agregar_periodo(db, usuario_id, periodo_inicio, periodo_fim)
+        resumo_automatico = montar_resumo(periodo_inicio, periodo_fim, dias)
+
+    for _ in range(RELATORIO_TENTATIVAS_CRIACAO):
+        novo_relatorio = db.scalars(
+            _inserir_pendente().values(
+                usuario_comum_id=usuario_id,
+                periodo_inicio=periodo_inicio,
+                periodo_fim=periodo_fim,
+                resumo_automatico=resumo_automatico,
+                status=db_models.StatusRelatorioEnum.PENDENTE,
+                data_criacao=datetime.utcnow()
+                # nutricionista_id será preenchido quando ele aprovar
+            ).returning(db_models.Relatorio)
+        ).first()
+        db.commit()
 
-    novo_relatorio = db_models.Relatorio(
-        usuario_comum_id=usuario_id,
-        periodo_inicio=periodo_inicio,
-        periodo_fim=periodo_fim,
-        resumo_automatico=resumo_automatico,
-        status=db_models.StatusRelatorioEnum.PENDENTE
-        # nutricionista_id será preenchido quando ele aprovar
+        if novo_relatorio is not None:
+            print(f"Novo relatório {novo_relatorio.id} criado para usuário {usuario_id}.")
+            return novo_relatorio
+
+        # Outro worker (ou o pré-cálculo) criou entre a busca e o INSERT: usa o dele
+        relatorio_existente = _buscar_pendente(db, usuario_id, periodo_inicio, periodo_fim)
+        if relatorio_existente is not None:
+            print(f"Relatório {relatorio_existente.id} criado em paralelo, retornando...")
+            return relatorio_existente
+        # ... que já foi aprovado ou removido antes da releitura: tenta inserir de novo
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="O relatório deste período está sendo alterado por outra requisição. Tente novamente."
+    )
+
+def _buscar_pendente(db: Session, usuario_id: int, periodo_inicio: date, periodo_fim: date) -> Optional[db_models.Relatorio]:
+    return db.query(db_models.Relatorio).filter(
+        db_models.Relatorio.usuario_comum_id == usuario_id,
+        db_models.Relatorio.periodo_inicio == periodo_inicio,
+        db_models.Relatorio.periodo_fim == periodo_fim,
+        db_models.Relatorio.status == db_models.StatusRelatorioEnum.PENDENTE
+    ).first()
+
+def _inserir_pendente():
+    # INSERT que ignora o relatório se já houver um PENDENTE para o usuário/período (índice único parcial)
+    return insert(db_models.Relatorio).on_conflict_do_nothing(
+        index_elements=["usuario_comum_id", "periodo_inicio", "periodo_fim"],
+        index_where=text("status = 'PENDENTE'")                    # Literal, igual ao predicado do índice (a inferência do PostgreSQL compara os dois)
     )
-    
-    db.add(novo_relatorio)
-    db.commit()
-    db.refresh(novo_relatorio)
-    
-    print(f"Novo relatório {novo_relatorio.id} criado para usuário {usuario_id}.")
-    return novo_relatorio
 
 def aprovar_relatorio(db: Session, relatorio_id: int, update_data: schemas.RelatorioUpdate, nutricionista_id: int):
     """
@@ -177,14 +369,36 @@ def aprovar_relatorio(db: Session, relatorio_id: int, update_data: schemas.Relat
     print(f"Relatório {relatorio_id} aprovado pelo nutricionista {nutricionista_id}.")
     return db_relatorio
 
-def get_relatorios_aprovados_usuario(db: Session, usuario_id: int):
+def get_relatorios_aprovados_usuario(
+    db: Session,
+    usuario_id: int,
+    limite: Optional[int] = paginacao.LIMITE_PADRAO,
+    cursor: Optional[str] = None,
+    data_inicio: Optional[date] = None,
+    data_fim: Optional[date] = None,
+    campos: FrozenSet[str] = visoes.RELATORIO.campos
+) -> dict:
     """
-    Busca todos os relatórios APROVADOS de um usuário comum.
+    Busca os relatórios APROVADOS de um usuário comum, paginados por data de aprovação
+    (sem 'limite' nem 'cursor', todos de uma vez, como a rota fazia antes da paginação).
+    Os textos longos (resumo e comentários) só são lidos do banco se estiverem em 'campos'.
     """
     
-    relatorios = db.query(db_models.Relatorio).filter(
+    consulta = db.query(db_models.Relatorio).options(
+        *visoes.RELATORIO.opcoes_consulta(campos)
+    ).filter(
         db_models.Relatorio.usuario_comum_id == usuario_id,
         db_models.Relatorio.status == db_models.StatusRelatorioEnum.APROVADO
-    ).order_by(db_models.Relatorio.data_aprovacao.desc()).all()
+    )
+
+    consulta = paginacao.filtrar_periodo(consulta, db_models.Relatorio.data_aprovacao, data_inicio, data_fim)
+
+    if limite is None and cursor is None:
+        relatorios = consulta.order_by(db_models.Relatorio.data_aprovacao.desc(), db_models.Relatorio.id.desc()).all()
+        return {"relatorios": relatorios, "proximo_cursor": None}
+
+    relatorios, proximo_cursor = paginacao.paginar(
+        consulta, db_models.Relatorio.data_aprovacao, db_models.Relatorio.id, limite or paginacao.LIMITE_PADRAO, cursor
+    )
     
-    return relatorios
\ No newline at end of file
+    return {"relatorios": relatorios, "proximo_cursor": proximo_cursor}
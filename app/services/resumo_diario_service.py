@@ -0,0 +1,152 @@
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, distinct, literal, delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..models import models as db_models
+
+# --- Resumo nutricional diário (tabela 'resumos_nutricionais_diarios') ---
+# Mantido de forma incremental na mesma transação que grava as refeições.
+# Remoções e correções recalculam os dias afetados a partir das tabelas brutas.
+NUTRIENTES = ("calorias", "proteinas", "carboidratos", "gordura")
+TOLERANCIA = 0.01                                                   # Diferença aceita pelo verificador (arredondamento de float)
+
+def registrar_refeicoes(db: Session, usuario_id: int, refeicoes: List[dict]):
+    """
+    Soma novas refeições ao resumo do dia (upsert incremental, atômico por linha).
+    Cada refeição é {"dia": date, "itens": [{"calorias": ..., "proteinas": ..., ...}]}.
+    """
+    por_dia = {}
+    for refeicao in refeicoes:
+        totais = por_dia.setdefault(refeicao["dia"], {"refeicoes": 0, **{n: 0.0 for n in NUTRIENTES}})
+        totais["refeicoes"] += 1
+        for item in refeicao["itens"]:
+            for nutriente in NUTRIENTES:
+                totais[nutriente] += item.get(nutriente) or 0
+
+    if not por_dia:
+        return
+
+    agora = datetime.utcnow()
+    tabela = db_models.ResumoNutricionalDiario.__table__
+
+    comando = insert(tabela).values([
+        {"usuario_comum_id": usuario_id, "dia": dia, "atualizado_em": agora, **totais}
+        for dia, totais in por_dia.items()
+    ])
+    comando = comando.on_conflict_do_update(
+        index_elements=["usuario_comum_id", "dia"],
+        set_={
+            "refeicoes": tabela.c.refeicoes + comando.excluded.refeicoes,
+            **{n: tabela.c[n] + comando.excluded[n] for n in NUTRIENTES},
+            "atualizado_em": agora,
+        }
+    )
+    db.execute(comando)
+
+def consulta_totais_brutos(usuario_id: Optional[int] = None, inicio: Optional[datetime] = None, fim: Optional[datetime] = None):
+    """
+    SELECT agrupado por (usuário, dia) direto de 'refeicoes' + 'refeicao_itens'.
+    É a fonte da verdade usada para reconstruir e verificar o resumo.
+    """
+    dia = func.date(db_models.Refeicao.data_hora)
+
+    consulta = select(
+        db_models.Refeicao.usuario_comum_id.label("usuario_comum_id"),
+        dia.label("dia"),
+        func.count(distinct(db_models.Refeicao.id)).label("refeicoes"),   # DISTINCT: o join repete a refeição por item
+        *[func.coalesce(func.sum(getattr(db_models.RefeicaoItem, n)), 0).label(n) for n in NUTRIENTES],
+    ).outerjoin(
+        db_models.RefeicaoItem, db_models.RefeicaoItem.refeicao_id == db_models.Refeicao.id
+    ).where(
+        db_models.Refeicao.usuario_comum_id.isnot(None)
+    ).group_by(db_models.Refeicao.usuario_comum_id, dia)
+
+    if usuario_id is not None:
+        consulta = consulta.where(db_models.Refeicao.usuario_comum_id == usuario_id)
+    if inicio is not None:
+        consulta = consulta.where(db_models.Refeicao.data_hora >= inicio)
+    if fim is not None:
+        consulta = consulta.where(db_models.Refeicao.data_hora <= fim)
+
+    return consulta
+
+def _regravar(db: Session, usuario_id: Optional[int] = None, inicio: Optional[datetime] = None, fim: Optional[datetime] = None) -> int:
+    # Apaga e recria as linhas do resumo no intervalo, com um único INSERT ... SELECT
+    tabela = db_models.ResumoNutricionalDiario.__table__
+
+    remocao = delete(tabela)
+    if usuario_id is not None:
+        remocao = remocao.where(tabela.c.usuario_comum_id == usuario_id)
+    if inicio is not None:
+        remocao = remocao.where(tabela.c.dia >= inicio.date())
+    if fim is not None:
+        remocao = remocao.where(tabela.c.dia <= fim.date())
+    db.execute(remocao)
+
+    origem = consulta_totais_brutos(usuario_id, inicio, fim).add_columns(literal(datetime.utcnow()).label("atualizado_em"))
+    resultado = db.execute(
+        insert(tabela).from_select(
+            ["usuario_comum_id", "dia", "refeicoes", *NUTRIENTES, "atualizado_em"],
+            origem
+        )
+    )
+    return resultado.rowcount
+
+def recalcular_dias(db: Session, chaves: Iterable[Tuple[int, date]]):
+    """
+    Recalcula do zero os dias informados (após remoções ou correções de itens).
+    Não faz commit: roda dentro da transação de quem alterou os dados.
+    """
+    for usuario_id, dia in set(chaves):
+        _regravar(
+            db,
+            usuario_id=usuario_id,
+            inicio=datetime.combine(dia, datetime.min.time()),
+            fim=datetime.combine(dia, datetime.max.time())
+        )
+
+def reconstruir(db: Session, usuario_id: Optional[int] = None) -> int:
+    """
+    Backfill/reconstrução completa (de um usuário ou de todos). Retorna as linhas gravadas.
+    """
+    linhas = _regravar(db, usuario_id=usuario_id)
+    db.commit()
+    return linhas
+
+def verificar(db: Session, usuario_id: Optional[int] = None) -> List[dict]:
+    """
+    Compara o resumo com as tabelas brutas e devolve as divergências encontradas.
+    """
+    brutos = {
+        (linha.usuario_comum_id, linha.dia): linha._asdict()
+        for linha in db.execute(consulta_totais_brutos(usuario_id))
+    }
+
+    consulta_resumo = db.query(db_models.ResumoNutricionalDiario)
+    if usuario_id is not None:
+        consulta_resumo = consulta_resumo.filter(db_models.ResumoNutricionalDiario.usuario_comum_id == usuario_id)
+    resumos = {(r.usuario_comum_id, r.dia): r for r in consulta_resumo}
+
+    divergencias = []
+    for chave in sorted(set(brutos) | set(resumos)):
+        bruto = brutos.get(chave)
+        resumo = resumos.get(chave)
+
+        esperado = {"refeicoes": bruto["refeicoes"], **{n: float(bruto[n]) for n in NUTRIENTES}} if bruto else None
+        gravado = {"refeicoes": resumo.refeicoes, **{n: getattr(resumo, n) for n in NUTRIENTES}} if resumo else None
+
+        if esperado and gravado and esperado["refeicoes"] == gravado["refeicoes"] and all(
+            abs(esperado[n] - gravado[n]) <= TOLERANCIA for n in NUTRIENTES
+        ):
+            continue
+
+        divergencias.append({
+            "usuario_comum_id": chave[0],
+            "dia": chave[1],
+            "esperado": esperado,
+            "gravado": gravado,
+        })
+
+    return divergencias
@@ -0,0 +1,90 @@
+from typing import FrozenSet, Iterable, List, Optional, Type
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import load_only, selectinload
+from ..models import models as db_models
+from ..schemas import schemas
+
+# --- Visões das listagens ('?visao=resumo' ou '?campos=a,b,c') ---
+# As colunas pesadas (JSON bruto da IA, textos longos, relacionamentos) só saem
+# do banco quando o campo é pedido; os demais campos não pedidos são cortados na
+# serialização. Sem parâmetros, a resposta é a completa, como antes.
+VISAO_COMPLETA = "completa"
+VISAO_RESUMO = "resumo"
+
+class Visao:
+    """
+    Campos de um recurso (os do schema de resposta) e os campos pesados, que
+    ficam fora da visão resumo e só são carregados quando pedidos.
+    """
+
+    def __init__(self, schema: Type[BaseModel], modelo, pesados: Iterable[str]):
+        self.schema = schema
+        self.modelo = modelo
+        self.campos = frozenset(schema.model_fields) | frozenset(schema.model_computed_fields)
+        self.pesados = frozenset(pesados)
+
+        mapeamento = sa_inspect(modelo)
+        self._colunas = {c.key: getattr(modelo, c.key) for c in mapeamento.column_attrs if c.key in self.campos}
+        self._relacionamentos = {r.key: getattr(modelo, r.key) for r in mapeamento.relationships if r.key in self.campos}
+
+    def resolver(self, visao: str = VISAO_COMPLETA, campos: Optional[str] = None) -> FrozenSet[str]:
+        """
+        Campos pedidos: 'campos' (separados por vírgula) tem prioridade sobre 'visao'.
+        """
+        if campos:
+            pedidos = frozenset(c.strip() for c in campos.split(",") if c.strip())
+            desconhecidos = pedidos - self.campos
+            if desconhecidos:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}. Disponíveis: {', '.join(sorted(self.campos))}."
+                )
+            return pedidos
+
+        if visao == VISAO_RESUMO:
+            return self.campos - self.pesados
+        if visao == VISAO_COMPLETA:
+            return self.campos
+
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Visão inválida: use '{VISAO_RESUMO}' ou '{VISAO_COMPLETA}'.")
+
+    def opcoes_consulta(self, campos: FrozenSet[str]) -> list:
+        """
+        Opções da consulta: colunas leves sempre (a paginação e os campos calculados
+        dependem delas), colunas pesadas e relacionamentos só se pedidos.
+        """
+        colunas = [coluna for nome, coluna in self._colunas.items() if nome not in self.pesados or nome in campos]
+        opcoes = [load_only(*colunas)]
+        opcoes += [selectinload(relacionamento) for nome, relacionamento in self._relacionamentos.items() if nome in campos]
+        return opcoes
+
+    def validar(self, registro) -> BaseModel:
+        # Só o que foi carregado: atributos adiados ficam com o padrão do schema, sem consulta extra
+        carregados = {nome: valor for nome, valor in vars(registro).items() if not nome.startswith("_")}
+        return self.schema.model_validate(carregados, from_attributes=True)
+
+REFEICAO = Visao(schemas.Refeicao, db_models.Refeicao, pesados=("llm_raw_response",))
+RELATORIO = Visao(schemas.Relatorio, db_models.Relatorio, pesados=("resumo_automatico", "comentarios_nutricionista"))
+
+def responder_pagina(visao: Visao, pagina: dict, chave_lista: str, campos: FrozenSet[str], schema_pagina: Type[BaseModel]) -> Response:
+    """
+    Serializa uma página (registros em 'chave_lista' + 'proximo_cursor') só com os campos
+    pedidos, direto para bytes pelo serializador do pydantic (sem passar por dicts).
+    """
+    conteudo = schema_pagina.model_construct(**{
+        **pagina,
+        chave_lista: [visao.validar(registro) for registro in pagina[chave_lista]],
+    })
+    corpo = conteudo.model_dump_json(include={chave_lista: {"__all__": set(campos)}, "proximo_cursor": True})
+    return Response(content=corpo, media_type="application/json")
+
+def responder_lista(visao: Visao, registros: list, campos: FrozenSet[str]) -> Response:
+    """
+    Igual a responder_pagina, para as rotas que devolvem uma lista simples (sem envelope).
+    """
+    lista = TypeAdapter(List[visao.schema])
+    corpo = lista.dump_json([visao.validar(registro) for registro in registros], include={"__all__": set(campos)})
+    return Response(content=corpo, media_type="application/json")
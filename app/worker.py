@@ -0,0 +1,63 @@
+"""
+Worker da fila de análises de imagem.
+
+Uso (a partir da raiz do projeto, mesma pasta onde fica 'uploads/'):
+    python -m app.worker --processos 4
+"""
+import os
+import time
+import argparse
+import multiprocessing
+
+from .database import SessionLocal
+from .services import fila_service
+
+WORKER_INTERVALO_SEGUNDOS = float(os.getenv("WORKER_INTERVALO_SEGUNDOS", "1"))  # Espera entre consultas quando a fila está vazia
+
+def executar_worker(numero: int):
+    print(f"👷 Worker {numero} (pid {os.getpid()}) aguardando jobs...")
+
+    while True:
+        db = SessionLocal()
+        try:
+            job = fila_service.reservar_proximo(db)
+
+            if job is None:
+                time.sleep(WORKER_INTERVALO_SEGUNDOS)
+                continue
+
+            print(f"⚙️  Worker {numero} processando job {job.id} (tentativa {job.tentativas})")
+            fila_service.processar(db, job)
+
+        except Exception as e:
+            # Erros de conexão etc.: espera um pouco e tenta de novo
+            print(f"🚨 Erro no worker {numero}: {e}")
+            time.sleep(WORKER_INTERVALO_SEGUNDOS)
+        finally:
+            db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Processa a fila de análises de imagem.")
+    parser.add_argument("--processos", type=int, default=int(os.getenv("WORKER_PROCESSOS", "2")))
+    args = parser.parse_args()
+
+    if args.processos <= 1:
+        executar_worker(1)
+        return
+
+    # 'spawn' garante que cada processo crie suas próprias conexões com o banco
+    contexto = multiprocessing.get_context("spawn")
+    processos = [contexto.Process(target=executar_worker, args=(n,)) for n in range(1, args.processos + 1)]
+
+    for processo in processos:
+        processo.start()
+
+    try:
+        for processo in processos:
+            processo.join()
+    except KeyboardInterrupt:
+        for processo in processos:
+            processo.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Benchmark de carga da API, sem gastar cota do Gemini e sem depender da internet.
+
+Sobe a API (benchmarks/servidor.py, com o Gemini falso) e um servidor local de
+imagens, dispara os cenários com concorrência controlada e mostra vazão,
+latências p50/p95/p99, erros por status e o pico de memória da API.
+
+Uso (a partir da raiz do projeto, com DATABASE_URL apontando para um banco de TESTE):
+    python -m benchmarks.executar --cenarios upload,url,relatorio,sugestao --requisicoes 200 --concorrencia 16
+
+Cenários:
+    upload     POST /refeicoes/analisar-imagem/{usuario_id} (multipart)
+    url        POST /refeicoes/analisar-url/{usuario_id} (imagem servida localmente)
+    relatorio  GET  /relatorios/{usuario_id}
+    sugestao   GET  /relatorios/{relatorio_id}/sugestao-ia?regenerar=true
+
+A latência e a taxa de erro do Gemini falso vêm de BENCH_GEMINI_* (ver benchmarks/gemini_falso.py).
+"""
+import io
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import signal
+import random
+import asyncio
+import argparse
+import resource
+import threading
+import subprocess
+
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+from PIL import Image, ImageDraw
+
+CENARIOS = ("upload", "url", "relatorio", "sugestao")
+IMAGENS_REPETIDAS = 8                                               # Sem --imagens-distintas, o cache de análises entra em jogo
+
+def gerar_imagem(semente: int, lado: int = 1600) -> bytes:
+    """
+    JPEG de "prato" sintético, determinístico pela semente
+    (sementes diferentes geram arquivos diferentes e não acertam o cache).
+    """
+    aleatorio = random.Random(semente)
+    imagem = Image.new("RGB", (lado, lado), (235, 235, 230))
+    desenho = ImageDraw.Draw(imagem)
+    desenho.ellipse((lado * 0.1, lado * 0.1, lado * 0.9, lado * 0.9), fill=(250, 250, 250), outline=(200, 200, 200), width=8)
+    for _ in range(12):
+        x, y = aleatorio.uniform(0.25, 0.7) * lado, aleatorio.uniform(0.25, 0.7) * lado
+        raio = aleatorio.uniform(0.05, 0.12) * lado
+        cor = tuple(aleatorio.randint(40, 230) for _ in range(3))
+        desenho.ellipse((x, y, x + raio, y + raio), fill=cor)
+
+    saida = io.BytesIO()
+    imagem.save(saida, format="JPEG", quality=90)
+    return saida.getvalue()
+
+class _ServidorImagens(BaseHTTPRequestHandler):
+    # GET /imagem/<semente>.jpg
+    def do_GET(self):
+        try:
+            semente = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+        except ValueError:
+            self.send_error(404)
+            return
+
+        corpo = gerar_imagem(semente)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+def iniciar_servidor_imagens(porta: int) -> ThreadingHTTPServer:
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _ServidorImagens)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+def iniciar_api(porta: int) -> subprocess.Popen:
+    processo = subprocess.Popen([sys.executable, "-m", "benchmarks.servidor", "--porta", str(porta)])
+
+    prazo = time.monotonic() + 60
+    while time.monotonic() < prazo:
+        if processo.poll() is not None:
+            raise RuntimeError("A API terminou antes de ficar pronta (confira DATABASE_URL).")
+        try:
+            if httpx.get(f"http://127.0.0.1:{porta}/", timeout=1).status_code == 200:
+                return processo
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+
+    processo.kill()
+    raise RuntimeError("A API não respondeu em 60s.")
+
+def parar_api(processo: subprocess.Popen) -> int:
+    """Encerra a API e retorna o pico de memória residente dela (KB, Linux)."""
+    processo.send_signal(signal.SIGINT)
+    try:
+        processo.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+def criar_usuario_de_teste() -> int:
+    from app.database import SessionLocal
+    from app.models import models
+
+    db = SessionLocal()
+    try:
+        usuario = models.Usuario(nome="Benchmark", email=f"benchmark-{uuid.uuid4()}@teste.local", senha_hash="-")
+        usuario.usuario_comum = models.UsuarioComum()
+        db.add(usuario)
+        db.commit()
+        return usuario.usuario_comum.id
+    finally:
+        db.close()
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))    # Nearest-rank
+    return ordenados[indice]
+
+async def executar_cenario(cliente: httpx.AsyncClient, requisicao, total: int, concorrencia: int) -> dict:
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias = []
+    status = Counter()
+
+    async def _uma(numero: int):
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                resposta = await requisicao(cliente, numero)
+                status[resposta.status_code] += 1
+            except httpx.HTTPError as e:
+                status[type(e).__name__] += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_uma(n) for n in range(total)))
+    duracao = time.perf_counter() - inicio
+
+    sucessos = sum(q for s, q in status.items() if isinstance(s, int) and s < 400)
+    return {
+        "requisicoes": total,
+        "sucessos": sucessos,
+        "status": {str(s): q for s, q in sorted(status.items(), key=lambda item: str(item[0]))},
+        "duracao_s": round(duracao, 3),
+        "vazao_rps": round(total / duracao, 2) if duracao else 0.0,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+        "max_ms": round(max(latencias) * 1000, 1) if latencias else 0.0,
+    }
+
+def montar_requisicoes(args, usuario_id: int, relatorio_id: int) -> dict:
+    def _semente(numero: int) -> int:
+        return args.semente_base + numero if args.imagens_distintas else numero % IMAGENS_REPETIDAS
+
+    imagens = {}
+
+    async def upload(cliente, numero):
+        semente = _semente(numero)
+        if semente not in imagens:
+            imagens[semente] = await asyncio.to_thread(gerar_imagem, semente)
+        arquivos = {"file": (f"refeicao-{semente}.jpg", imagens[semente], "image/jpeg")}
+        return await cliente.post(f"/refeicoes/analisar-imagem/{usuario_id}", files=arquivos)
+
+    async def url(cliente, numero):
+        image_url = f"http://127.0.0.1:{args.porta_imagens}/imagem/{_semente(numero) + 1_000_000}.jpg"
+        return await cliente.post(f"/refeicoes/analisar-url/{usuario_id}", json={"image_url": image_url})
+
+    async def relatorio(cliente, numero):
+        return await cliente.get(f"/relatorios/{usuario_id}")
+
+    async def sugestao(cliente, numero):
+        return await cliente.get(f"/relatorios/{relatorio_id}/sugestao-ia", params={"regenerar": "true"})
+
+    return {"upload": upload, "url": url, "relatorio": relatorio, "sugestao": sugestao}
+
+async def executar(args) -> dict:
+    base_url = f"http://127.0.0.1:{args.porta}"
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limites) as cliente:
+        usuario_id = args.usuario or await asyncio.to_thread(criar_usuario_de_teste)
+
+        relatorio_id = None
+        requisicoes = montar_requisicoes(args, usuario_id, relatorio_id)
+        resultados = {}
+
+        for cenario in args.cenarios:
+            if cenario == "sugestao" and relatorio_id is None:
+                # Criado só agora, para o resumo já incluir as refeições dos cenários anteriores
+                resposta = await cliente.get(f"/relatorios/{usuario_id}")
+                resposta.raise_for_status()
+                relatorio_id = resposta.json()["id"]
+                requisicoes = montar_requisicoes(args, usuario_id, relatorio_id)
+
+            print(f"▶️  Cenário '{cenario}': {args.requisicoes} requisições, concorrência {args.concorrencia}...")
+            resultados[cenario] = await executar_cenario(cliente, requisicoes[cenario], args.requisicoes, args.concorrencia)
+
+    return {"usuario_id": usuario_id, "cenarios": resultados}
+
+def imprimir(resultado: dict):
+    print()
+    print(f"{'cenário':<10} {'req':>6} {'ok':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}  status")
+    for cenario, r in resultado["cenarios"].items():
+        print(
+            f"{cenario:<10} {r['requisicoes']:>6} {r['sucessos']:>6} {r['vazao_rps']:>8} "
+            f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}  {r['status']}"
+        )
+    print(f"\nPico de memória da API: {resultado['pico_memoria_api_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da API com Gemini falso.")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS), help=f"Lista separada por vírgulas: {', '.join(CENARIOS)}")
+    parser.add_argument("--requisicoes", type=int, default=100, help="Requisições por cenário")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Requisições simultâneas")
+    parser.add_argument("--imagens-distintas", action="store_true", help="Uma imagem nova por requisição (sem acertos de cache)")
+    parser.add_argument("--semente-base", type=int, default=int(time.time()), help="Início das sementes com --imagens-distintas")
+    parser.add_argument("--usuario", type=int, default=None, help="usuario_comum_id existente (padrão: cria um novo)")
+    parser.add_argument("--porta", type=int, default=8100)
+    parser.add_argument("--porta-imagens", type=int, default=8101)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--saida", default=None, help="Grava o resultado em JSON neste arquivo")
+    args = parser.parse_args()
+
+    args.cenarios = [c.strip() for c in args.cenarios.split(",") if c.strip()]
+    desconhecidos = set(args.cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"Cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    servidor_imagens = iniciar_servidor_imagens(args.porta_imagens)
+    api = iniciar_api(args.porta)
+    try:
+        resultado = asyncio.run(executar(args))
+    finally:
+        pico_kb = parar_api(api)
+        servidor_imagens.shutdown()
+
+    resultado["pico_memoria_api_mb"] = round(pico_kb / 1024, 1)
+    resultado["configuracao"] = {
+        "requisicoes": args.requisicoes,
+        "concorrencia": args.concorrencia,
+        "imagens_distintas": args.imagens_distintas,
+        "gemini_latencia_ms": float(os.getenv("BENCH_GEMINI_LATENCIA_MS", "1500")),
+        "gemini_variacao_ms": float(os.getenv("BENCH_GEMINI_VARIACAO_MS", "300")),
+        "gemini_taxa_erro": float(os.getenv("BENCH_GEMINI_TAXA_ERRO", "0")),
+    }
+
+    imprimir(resultado)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
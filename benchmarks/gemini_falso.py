@@ -0,0 +1,115 @@
+"""
+Gemini falso para benchmarks: responde localmente, com latência e taxa de erro
+configuráveis, no mesmo formato que analise_service e relatorio_service esperam.
+
+Variáveis de ambiente:
+    BENCH_GEMINI_LATENCIA_MS   latência média de cada chamada (padrão 1500)
+    BENCH_GEMINI_VARIACAO_MS   desvio padrão da latência (padrão 300)
+    BENCH_GEMINI_TAXA_ERRO     fração de chamadas que falham com 429 (padrão 0)
+"""
+import os
+import json
+import time
+import random
+
+from types import SimpleNamespace
+from google.api_core import exceptions as google_exceptions
+
+REFEICOES = [
+    {"food": [
+        {"name": "Arroz branco", "amount": 150, "calories": 195, "carbohydrates": 42.0, "proteins": 3.8, "fats": 0.4},
+        {"name": "Feijão carioca", "amount": 100, "calories": 76, "carbohydrates": 13.6, "proteins": 4.8, "fats": 0.5},
+        {"name": "Bife grelhado", "amount": 120, "calories": 262, "carbohydrates": 0.0, "proteins": 38.4, "fats": 11.0},
+    ]},
+    {"food": [
+        {"name": "Pão francês", "amount": 50, "calories": 150, "carbohydrates": 29.3, "proteins": 4.0, "fats": 1.5},
+        {"name": "Café com leite", "amount": 200, "calories": 86, "carbohydrates": 9.4, "proteins": 6.2, "fats": 2.8},
+    ]},
+    {"food": [
+        {"name": "Salada de alface e tomate", "amount": 80, "calories": 14, "carbohydrates": 2.6, "proteins": 0.9, "fats": 0.2},
+        {"name": "Peito de frango", "amount": 130, "calories": 208, "carbohydrates": 0.0, "proteins": 41.6, "fats": 4.7},
+    ]},
+    {"food": []},
+]
+
+SUGESTAO = (
+    "Bom trabalho mantendo uma boa ingestão de proteínas ao longo do período. "
+    "Tente incluir mais verduras e legumes nas refeições principais e reduzir "
+    "os alimentos ultraprocessados nos lanches. Beba água ao longo do dia."
+)
+
+class RespostaFalsa:
+    def __init__(self, texto: str, tokens: int):
+        self.text = texto
+        self.prompt_feedback = "(gemini falso)"
+        self.usage_metadata = SimpleNamespace(total_token_count=tokens)
+
+class ModeloFalso:
+    """
+    Substitui genai.GenerativeModel. Imagem na entrada -> JSON de alimentos;
+    só texto -> JSON (pedido de correção) ou a sugestão do nutricionista.
+    """
+
+    def __init__(self, latencia_ms: float, variacao_ms: float, taxa_erro: float):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_erro = taxa_erro
+
+    @classmethod
+    def do_ambiente(cls) -> "ModeloFalso":
+        return cls(
+            latencia_ms=float(os.getenv("BENCH_GEMINI_LATENCIA_MS", "1500")),
+            variacao_ms=float(os.getenv("BENCH_GEMINI_VARIACAO_MS", "300")),
+            taxa_erro=float(os.getenv("BENCH_GEMINI_TAXA_ERRO", "0")),
+        )
+
+    def _esperar(self, fracao: float = 1.0):
+        latencia = max(0.0, random.gauss(self.latencia_ms, self.variacao_ms)) * fracao
+        time.sleep(latencia / 1000)
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        if random.random() < self.taxa_erro:
+            self._esperar(0.1)
+            raise google_exceptions.ResourceExhausted("429 Resource exhausted (gemini falso)")
+
+        partes = contents if isinstance(contents, list) else [contents]
+        tem_imagem = any(isinstance(parte, dict) and "data" in parte for parte in partes)
+        texto_entrada = " ".join(parte for parte in partes if isinstance(parte, str))
+
+        if tem_imagem or "'food'" in texto_entrada:
+            texto = json.dumps(random.choice(REFEICOES), ensure_ascii=False)
+        else:
+            texto = SUGESTAO
+
+        tokens = len(texto_entrada) // 4 + len(texto) // 4 + (258 if tem_imagem else 0)
+
+        if stream:
+            return self._em_partes(texto, tokens)
+
+        self._esperar()
+        return RespostaFalsa(texto, tokens)
+
+    def count_tokens(self, contents):
+        return SimpleNamespace(total_tokens=len(str(contents)) // 4)
+
+    def _em_partes(self, texto: str, tokens: int):
+        # Primeira parte demora como uma chamada normal; as seguintes chegam aos poucos
+        palavras = texto.split(" ")
+        tamanho = 8
+        self._esperar(0.3)
+        for inicio in range(0, len(palavras), tamanho):
+            if inicio:
+                self._esperar(0.05)
+            trecho = " ".join(palavras[inicio:inicio + tamanho])
+            yield RespostaFalsa(trecho + (" " if inicio + tamanho < len(palavras) else ""), tokens)
+
+def instalar(modelo: ModeloFalso = None) -> ModeloFalso:
+    """
+    Troca os modelos do Gemini dos serviços pelo falso (chamar antes de servir a API).
+    """
+    from app.services import provedor_llm
+
+    modelo = modelo or ModeloFalso.do_ambiente()
+    provedor_llm.substituir(modelo)
+    print(f"🧪 Gemini falso instalado (latência {modelo.latencia_ms:.0f}±{modelo.variacao_ms:.0f} ms, erro {modelo.taxa_erro:.0%}).")
+    return modelo
@@ -0,0 +1,25 @@
+"""
+Sobe a API com o Gemini falso instalado (usado por benchmarks/executar.py).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.servidor --porta 8100
+"""
+import argparse
+import uvicorn
+
+from . import gemini_falso
+
+def main():
+    parser = argparse.ArgumentParser(description="API com Gemini falso, para benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8100)
+    args = parser.parse_args()
+
+    gemini_falso.instalar()
+
+    from app.main import app                                        # Depois de instalar o falso
+
+    uvicorn.run(app, host=args.host, port=args.porta, log_level="warning")
+
+if __name__ == "__main__":
+    main()
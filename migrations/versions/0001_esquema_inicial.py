@@ -0,0 +1,107 @@
+"""Esquema inicial (tabelas originais da aplicação, criadas pelo create_all)
+
+Bancos já existentes, criados pelo create_all da aplicação, devem ser
+marcados com 'alembic stamp 0001' antes do primeiro 'alembic upgrade head'.
+O cache de análises e a fila de jobs vêm na revisão seguinte (0001a).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+sexo_enum = sa.Enum("MASCULINO", "FEMININO", "OUTRO", name="sexoenum")
+status_relatorio_enum = sa.Enum("PENDENTE", "REVISADO", "APROVADO", name="statusrelatorioenum")
+
+def upgrade():
+    op.create_table(
+        "usuarios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("nome", sa.String(), nullable=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("senha_hash", sa.String(), nullable=False),
+        sa.Column("telefone", sa.String(), nullable=True),
+        sa.Column("data_nascimento", sa.Date(), nullable=True),
+        sa.Column("data_cadastro", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_usuarios_id", "usuarios", ["id"])
+    op.create_index("ix_usuarios_nome", "usuarios", ["nome"])
+    op.create_index("ix_usuarios_email", "usuarios", ["email"], unique=True)
+
+    op.create_table(
+        "usuarios_comuns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=True),
+        sa.Column("sexo", sexo_enum, nullable=True),
+        sa.Column("altura", sa.Float(), nullable=True),
+        sa.Column("peso", sa.Float(), nullable=True),
+    )
+    op.create_index("ix_usuarios_comuns_id", "usuarios_comuns", ["id"])
+
+    op.create_table(
+        "nutricionistas",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=True),
+        sa.Column("cpf", sa.String(), nullable=True),
+        sa.Column("crn", sa.String(), nullable=True),
+    )
+    op.create_index("ix_nutricionistas_id", "nutricionistas", ["id"])
+    op.create_index("ix_nutricionistas_cpf", "nutricionistas", ["cpf"], unique=True)
+    op.create_index("ix_nutricionistas_crn", "nutricionistas", ["crn"], unique=True)
+
+    op.create_table(
+        "relatorios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_comum_id", sa.Integer(), sa.ForeignKey("usuarios_comuns.id"), nullable=True),
+        sa.Column("nutricionista_id", sa.Integer(), sa.ForeignKey("nutricionistas.id"), nullable=True),
+        sa.Column("periodo_inicio", sa.Date(), nullable=False),
+        sa.Column("periodo_fim", sa.Date(), nullable=False),
+        sa.Column("resumo_automatico", sa.Text(), nullable=True),
+        sa.Column("comentarios_nutricionista", sa.Text(), nullable=True),
+        sa.Column("status", status_relatorio_enum, nullable=True),
+        sa.Column("data_criacao", sa.DateTime(), nullable=True),
+        sa.Column("data_aprovacao", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_relatorios_id", "relatorios", ["id"])
+
+    op.create_table(
+        "refeicoes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("usuario_comum_id", sa.Integer(), sa.ForeignKey("usuarios_comuns.id"), nullable=True),
+        sa.Column("data_hora", sa.DateTime(), nullable=True),
+        sa.Column("imagem_url", sa.String(), nullable=True),
+        sa.Column("llm_raw_response", postgresql.JSONB(), nullable=True),
+    )
+    op.create_index("ix_refeicoes_id", "refeicoes", ["id"])
+
+    op.create_table(
+        "refeicao_itens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("refeicao_id", sa.Integer(), sa.ForeignKey("refeicoes.id"), nullable=True),
+        sa.Column("nome_alimento", sa.String(), nullable=True),
+        sa.Column("quantidade", sa.Float(), nullable=True),
+        sa.Column("calorias", sa.Float(), nullable=True),
+        sa.Column("proteinas", sa.Float(), nullable=True),
+        sa.Column("carboidratos", sa.Float(), nullable=True),
+        sa.Column("gordura", sa.Float(), nullable=True),
+    )
+    op.create_index("ix_refeicao_itens_id", "refeicao_itens", ["id"])
+    op.create_index("ix_refeicao_itens_nome_alimento", "refeicao_itens", ["nome_alimento"])
+
+def downgrade():
+    op.drop_table("refeicao_itens")
+    op.drop_table("refeicoes")
+    op.drop_table("relatorios")
+    op.drop_table("nutricionistas")
+    op.drop_table("usuarios_comuns")
+    op.drop_table("usuarios")
+
+    status_relatorio_enum.drop(op.get_bind(), checkfirst=True)
+    sexo_enum.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,62 @@
+"""Cache de análises e fila de jobs de análise
+
+Tabelas que o create_all passou a criar depois do esquema inicial. Um banco
+marcado com 'alembic stamp 0001' pode já tê-las (se o create_all rodou com os
+modelos novos) ou não: só são criadas as que faltam.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+status_job_enum = sa.Enum("PENDENTE", "PROCESSANDO", "CONCLUIDO", "ERRO", name="statusjobenum")
+
+def upgrade():
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "analises_cache" not in existentes:
+        op.create_table(
+            "analises_cache",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("hash_conteudo", sa.String(length=64), nullable=False),
+            sa.Column("hash_perceptual", sa.String(length=16), nullable=True),
+            sa.Column("imagem_url", sa.String(), nullable=True),
+            sa.Column("llm_raw_response", postgresql.JSONB(), nullable=False),
+            sa.Column("acessos", sa.Integer(), nullable=True),
+            sa.Column("data_criacao", sa.DateTime(), nullable=True),
+            sa.Column("ultimo_acesso", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_analises_cache_id", "analises_cache", ["id"])
+        op.create_index("ix_analises_cache_hash_conteudo", "analises_cache", ["hash_conteudo"], unique=True)
+        op.create_index("ix_analises_cache_hash_perceptual", "analises_cache", ["hash_perceptual"])
+
+    if "analise_jobs" not in existentes:
+        op.create_table(
+            "analise_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_comum_id", sa.Integer(), sa.ForeignKey("usuarios_comuns.id"), nullable=True),
+            sa.Column("arquivo", postgresql.JSONB(), nullable=False),
+            sa.Column("status", status_job_enum, nullable=True),
+            sa.Column("tentativas", sa.Integer(), nullable=True),
+            sa.Column("erro", sa.Text(), nullable=True),
+            sa.Column("refeicao_id", sa.Integer(), sa.ForeignKey("refeicoes.id"), nullable=True),
+            sa.Column("data_criacao", sa.DateTime(), nullable=True),
+            sa.Column("data_inicio", sa.DateTime(), nullable=True),
+            sa.Column("data_conclusao", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_analise_jobs_id", "analise_jobs", ["id"])
+        op.create_index("ix_analise_jobs_status", "analise_jobs", ["status"])
+
+def downgrade():
+    op.drop_table("analise_jobs")
+    op.drop_table("analises_cache")
+
+    status_job_enum.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,33 @@
+"""Índices compostos para as consultas mais frequentes
+
+Os índices são criados com CREATE INDEX CONCURRENTLY para não bloquear
+escritas em tabelas já populadas (por isso rodam fora da transação).
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+INDICES = [
+    # (nome, tabela, colunas)
+    ("ix_refeicoes_usuario_data_hora", "refeicoes", ["usuario_comum_id", "data_hora"]),
+    ("ix_relatorios_usuario_periodo_status", "relatorios", ["usuario_comum_id", "periodo_inicio", "periodo_fim", "status"]),
+    ("ix_relatorios_usuario_status_aprovacao", "relatorios", ["usuario_comum_id", "status", "data_aprovacao"]),
+    ("ix_refeicao_itens_refeicao_id", "refeicao_itens", ["refeicao_id"]),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, colunas in INDICES:
+            op.create_index(nome, tabela, colunas, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nome, tabela, _ in reversed(INDICES):
+            op.drop_index(nome, table_name=tabela, postgresql_concurrently=True, if_exists=True)
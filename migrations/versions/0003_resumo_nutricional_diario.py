@@ -0,0 +1,32 @@
+"""Resumo nutricional diário por usuário (tabela de rollup)
+
+Depois de aplicar, popule a tabela com:
+    python -m app.comandos.resumo_diario reconstruir
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "resumos_nutricionais_diarios",
+        sa.Column("usuario_comum_id", sa.Integer(), sa.ForeignKey("usuarios_comuns.id"), primary_key=True),
+        sa.Column("dia", sa.Date(), primary_key=True),
+        sa.Column("refeicoes", sa.Integer(), nullable=False),
+        sa.Column("calorias", sa.Float(), nullable=False),
+        sa.Column("proteinas", sa.Float(), nullable=False),
+        sa.Column("carboidratos", sa.Float(), nullable=False),
+        sa.Column("gordura", sa.Float(), nullable=False),
+        sa.Column("atualizado_em", sa.DateTime(), nullable=True),
+    )
+
+def downgrade():
+    op.drop_table("resumos_nutricionais_diarios")
@@ -0,0 +1,23 @@
+"""Sugestão da IA guardada no relatório
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("relatorios", sa.Column("sugestao_ia", sa.Text(), nullable=True))
+    op.add_column("relatorios", sa.Column("sugestao_ia_chave", sa.String(length=64), nullable=True))
+    op.add_column("relatorios", sa.Column("sugestao_ia_gerada_em", sa.DateTime(), nullable=True))
+
+def downgrade():
+    op.drop_column("relatorios", "sugestao_ia_gerada_em")
+    op.drop_column("relatorios", "sugestao_ia_chave")
+    op.drop_column("relatorios", "sugestao_ia")
@@ -0,0 +1,30 @@
+"""Índice por dia no resumo nutricional diário
+
+Usado pelo pré-cálculo de relatórios (app.comandos.relatorios_pendentes),
+que lê um período de todos os usuários de uma vez. A chave primária começa
+por usuario_comum_id e não ajuda nessa consulta.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_resumos_nutricionais_diarios_dia", "resumos_nutricionais_diarios", ["dia"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_resumos_nutricionais_diarios_dia", table_name="resumos_nutricionais_diarios",
+            postgresql_concurrently=True, if_exists=True
+        )
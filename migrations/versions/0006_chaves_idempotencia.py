@@ -0,0 +1,31 @@
+"""Chaves de idempotência dos POSTs de análise
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "chaves_idempotencia",
+        sa.Column("usuario_comum_id", sa.Integer(), primary_key=True),
+        sa.Column("rota", sa.String(length=64), primary_key=True),
+        sa.Column("chave", sa.String(length=255), primary_key=True),
+        sa.Column("impressao", sa.String(length=64), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("resposta", postgresql.JSONB(), nullable=True),
+        sa.Column("data_criacao", sa.DateTime(), nullable=True),
+        sa.Column("expira_em", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_chaves_idempotencia_expira_em", "chaves_idempotencia", ["expira_em"])
+
+def downgrade():
+    op.drop_table("chaves_idempotencia")
@@ -0,0 +1,24 @@
+"""Referência da tabela de composição nos itens de refeição
+
+Para recalcular os nutrientes das refeições antigas pela tabela:
+    python -m app.comandos.recalcular_nutrientes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("refeicao_itens", sa.Column("alimento_referencia", sa.String(), nullable=True))
+    op.add_column("refeicao_itens", sa.Column("divergencia_ia", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+def downgrade():
+    op.drop_column("refeicao_itens", "divergencia_ia")
+    op.drop_column("refeicao_itens", "alimento_referencia")
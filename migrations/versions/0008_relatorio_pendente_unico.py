@@ -0,0 +1,43 @@
+"""Um único relatório PENDENTE por usuário e período
+
+Remove os PENDENTE duplicados já existentes (fica o mais antigo de cada
+usuário/período) e cria o índice único parcial que criar_relatorio e o
+pré-cálculo usam no INSERT ... ON CONFLICT DO NOTHING.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("""
+        DELETE FROM relatorios r
+        USING relatorios mais_antigo
+        WHERE r.status = 'PENDENTE'
+          AND mais_antigo.status = 'PENDENTE'
+          AND mais_antigo.usuario_comum_id = r.usuario_comum_id
+          AND mais_antigo.periodo_inicio = r.periodo_inicio
+          AND mais_antigo.periodo_fim = r.periodo_fim
+          AND mais_antigo.id < r.id
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "uq_relatorios_pendente_usuario_periodo", "relatorios", ["usuario_comum_id", "periodo_inicio", "periodo_fim"],
+            unique=True, postgresql_where=sa.text("status = 'PENDENTE'"),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "uq_relatorios_pendente_usuario_periodo", table_name="relatorios",
+            postgresql_concurrently=True, if_exists=True
+        )
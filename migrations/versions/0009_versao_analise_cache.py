@@ -0,0 +1,29 @@
+"""Versão da análise (prompt/formato/modelo) no cache de análises
+
+As respostas já guardadas não têm versão e foram geradas com prompts e formatos
+antigos (antes da saída com esquema e da tabela de composição): são removidas,
+em vez de continuarem sendo reaproveitadas.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("DELETE FROM analises_cache")
+    op.add_column("analises_cache", sa.Column("versao_analise", sa.String(length=16), nullable=False))
+    op.drop_index("ix_analises_cache_hash_conteudo", table_name="analises_cache")
+    op.create_index("uq_analises_cache_hash_versao", "analises_cache", ["hash_conteudo", "versao_analise"], unique=True)
+
+def downgrade():
+    op.execute("DELETE FROM analises_cache")
+    op.drop_index("uq_analises_cache_hash_versao", table_name="analises_cache")
+    op.create_index("ix_analises_cache_hash_conteudo", "analises_cache", ["hash_conteudo"], unique=True)
+    op.drop_column("analises_cache", "versao_analise")
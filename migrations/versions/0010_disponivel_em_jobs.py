@@ -0,0 +1,22 @@
+"""Backoff entre as tentativas dos jobs de análise
+
+Um job que falha por erro temporário volta para PENDENTE com 'disponivel_em'
+no futuro; os workers só o pegam de novo a partir dessa hora.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("analise_jobs", sa.Column("disponivel_em", sa.DateTime(), nullable=True))
+
+def downgrade():
+    op.drop_column("analise_jobs", "disponivel_em")
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import analise_service, limitador_llm, provedor_llm
+
+RESPOSTA = '{"food": [{"name": "Arroz", "amount": 150, "calories": 190, "proteins": 4, "carbohydrates": 42, "fats": 0.3}]}'
+
+@pytest.fixture
+def correcao_da_ia(monkeypatch):
+    # Substitui a chamada de correção ao Gemini; guarda os prompts recebidos
+    chamadas = []
+
+    def configurar(texto=None, erro=None):
+        def executar(funcao, prompt, **kwargs):
+            chamadas.append(prompt)
+            if erro:
+                raise erro
+            return SimpleNamespace(text=texto)
+
+        monkeypatch.setattr(provedor_llm, "obter_modelo", lambda nome: SimpleNamespace(generate_content=None))
+        monkeypatch.setattr(limitador_llm, "executar", executar)
+        return chamadas
+
+    return configurar
+
+def test_resposta_valida_nao_chama_a_ia(correcao_da_ia):
+    chamadas = correcao_da_ia(erro=AssertionError("não deveria chamar a IA"))
+
+    dados = analise_service._interpretar_resposta(RESPOSTA)
+
+    assert dados["food"][0]["name"] == "Arroz"
+    assert dados["food"][0]["calories"] == 190
+    assert chamadas == []
+
+@pytest.mark.parametrize("texto", [
+    f"```json\n{RESPOSTA}\n```",
+    f"Aqui está a análise: {RESPOSTA} Espero ter ajudado!",
+    '{"food": [{"name": "Arroz", "amount": 150,},],}',
+])
+def test_conserto_local(correcao_da_ia, texto):
+    chamadas = correcao_da_ia(erro=AssertionError("não deveria chamar a IA"))
+
+    assert analise_service._interpretar_resposta(texto)["food"][0]["name"] == "Arroz"
+    assert chamadas == []
+
+def test_lista_solta_e_numeros_em_texto():
+    dados = analise_service._interpretar_resposta('[{"name": "Feijão", "amount": "80 g", "calories": "61,5", "fats": null}]')
+
+    assert dados["food"][0]["amount"] == 80
+    assert dados["food"][0]["calories"] == 61.5
+    assert dados["food"][0]["fats"] == 0
+
+def test_pede_correcao_a_ia_uma_unica_vez(correcao_da_ia):
+    chamadas = correcao_da_ia(texto=RESPOSTA)
+
+    dados = analise_service._interpretar_resposta('{"food": [{"amount": 150}]}')    # Falta 'name'
+
+    assert dados["food"][0]["name"] == "Arroz"
+    assert len(chamadas) == 1
+
+def test_correcao_invalida_responde_500(correcao_da_ia):
+    correcao_da_ia(texto="continua sem JSON")
+
+    with pytest.raises(HTTPException) as erro:
+        analise_service._interpretar_resposta("sem JSON nenhum")
+    assert erro.value.status_code == 500
+
+def test_cota_esgotada_na_correcao_responde_429(correcao_da_ia):
+    correcao_da_ia(erro=limitador_llm.FilaLLMEsgotada())
+
+    with pytest.raises(HTTPException) as erro:
+        analise_service._interpretar_resposta("sem JSON nenhum")
+    assert erro.value.status_code == 429
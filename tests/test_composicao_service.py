@@ -0,0 +1,52 @@
+from app.services import composicao_service
+from app.services.composicao_service import IndiceComposicao, normalizar
+
+ALIMENTOS = [
+    {"nome": "Arroz, tipo 1, cozido", "apelidos": ["arroz branco", "arroz"], "calorias": 128, "proteinas": 2.5, "carboidratos": 28.1, "gordura": 0.2},
+    {"nome": "Arroz, integral, cozido", "apelidos": ["arroz integral"], "calorias": 124, "proteinas": 2.6, "carboidratos": 25.8, "gordura": 1.0},
+    {"nome": "Feijão, carioca, cozido", "apelidos": ["feijão", "feijão carioca"], "calorias": 76, "proteinas": 4.8, "carboidratos": 13.6, "gordura": 0.5},
+    {"nome": "Ovo, de galinha, inteiro, cozido", "apelidos": ["ovo cozido", "ovo"], "calorias": 146, "proteinas": 13.3, "carboidratos": 0.6, "gordura": 9.5},
+    {"nome": "Café, infusão 10%", "apelidos": ["café"], "calorias": 9, "proteinas": 0.7, "carboidratos": 1.5, "gordura": 0.1},
+    {"nome": "Leite, de vaca, integral", "apelidos": ["leite"], "calorias": 61, "proteinas": 2.9, "carboidratos": 4.3, "gordura": 3.2},
+]
+
+def _indice():
+    return IndiceComposicao(ALIMENTOS)
+
+def test_normalizar_remove_acentos_pontuacao_e_palavras_vazias():
+    assert normalizar("Feijão Carioca (cozido)") == ("feijao", "carioca", "cozido")
+    assert normalizar("Porção de Arroz") == ("arroz",)
+    assert normalizar("") == ()
+
+def test_busca_exata_pelo_nome_e_pelo_apelido():
+    indice = _indice()
+    assert indice.buscar("Arroz, tipo 1, cozido") == (ALIMENTOS[0], True)
+    assert indice.buscar("ARROZ BRANCO") == (ALIMENTOS[0], True)
+    assert indice.buscar("feijao") == (ALIMENTOS[2], True)
+
+def test_busca_aproximada_tolera_plural_e_erro_de_digitacao():
+    indice = _indice()
+    assert indice.buscar("ovos cozidos") == (ALIMENTOS[3], False)
+    assert indice.buscar("arros integral") == (ALIMENTOS[1], False)
+
+def test_busca_aproximada_exige_todas_as_palavras():
+    indice = _indice()
+    # Uma palavra a mais não pode cair no alimento que só tem o prefixo
+    assert indice.buscar("arroz doce") == (None, False)
+    assert indice.buscar("café com leite") == (None, False)
+    assert indice.buscar("feijão tropeiro") == (None, False)
+
+def test_busca_sem_palavras_uteis_nao_encontra():
+    assert _indice().buscar("porção de") == (None, False)
+
+def test_calcular_nutrientes_usa_a_tabela_so_no_acerto_exato(monkeypatch):
+    monkeypatch.setattr(composicao_service, "_indice", _indice())
+    monkeypatch.setattr(composicao_service, "COMPOSICAO_MODO", "tabela")
+    estimativa = {"calorias": 250, "proteinas": 5, "carboidratos": 56, "gordura": 0.4}
+
+    exato = composicao_service.calcular_nutrientes("arroz branco", 200, estimativa)
+    assert exato["calorias"] == 256
+    assert exato["alimento_referencia"] == ALIMENTOS[0]["nome"]
+
+    aproximado = composicao_service.calcular_nutrientes("arros branco", 200, estimativa)
+    assert aproximado["calorias"] == 250
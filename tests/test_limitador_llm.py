@@ -0,0 +1,39 @@
+import pytest
+
+from app.services.limitador_llm import BaldeDeFichas
+
+def test_balde_comeca_cheio_e_repoe_por_minuto():
+    balde = BaldeDeFichas(60)                                           # 1 ficha por segundo
+    agora = balde._atualizado_em
+
+    assert balde.disponiveis(agora) == 60
+    balde.consumir(60)
+    assert balde.disponiveis(agora) == 0
+    assert balde.disponiveis(agora + 10) == pytest.approx(10)
+
+def test_balde_nao_passa_da_capacidade():
+    balde = BaldeDeFichas(60)
+    assert balde.disponiveis(balde._atualizado_em + 3600) == 60
+
+def test_tempo_ate_ter_fichas_suficientes():
+    balde = BaldeDeFichas(60)
+    agora = balde._atualizado_em
+    balde.consumir(60)
+
+    assert balde.tempo_ate(5, agora) == pytest.approx(5)
+    assert balde.tempo_ate(5, agora + 5) == pytest.approx(0)
+
+def test_pedido_maior_que_a_capacidade_espera_so_o_balde_encher():
+    balde = BaldeDeFichas(60)
+    agora = balde._atualizado_em
+    balde.consumir(60)
+
+    assert balde.tempo_ate(1000, agora) == pytest.approx(60)
+
+def test_consumo_acima_do_estimado_deixa_divida():
+    balde = BaldeDeFichas(60)
+    agora = balde._atualizado_em
+    balde.consumir(90)
+
+    assert balde.disponiveis(agora) == -30
+    assert balde.tempo_ate(1, agora) == pytest.approx(31)
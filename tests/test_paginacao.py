@@ -0,0 +1,23 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.paginacao import codificar_cursor, decodificar_cursor
+
+def test_cursor_ida_e_volta():
+    momento = datetime(2026, 3, 14, 12, 30, 45, 123456)
+    cursor = codificar_cursor(momento, 42)
+
+    assert "=" not in cursor                                            # Seguro em query string
+    assert decodificar_cursor(cursor) == (momento, 42)
+
+def test_cursor_sem_microssegundos():
+    momento = datetime(2026, 1, 1)
+    assert decodificar_cursor(codificar_cursor(momento, 1)) == (momento, 1)
+
+@pytest.mark.parametrize("cursor", ["", "nao-e-base64!", "YWJj", codificar_cursor(datetime(2026, 1, 1), 1)[:-4]])
+def test_cursor_invalido_responde_400(cursor):
+    with pytest.raises(HTTPException) as erro:
+        decodificar_cursor(cursor)
+    assert erro.value.status_code == 400